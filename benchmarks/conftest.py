@@ -0,0 +1,176 @@
+"""Synthetic meshes and reporting for the benchmarks
+
+Run with:
+
+    pytest benchmarks
+
+By default, every benchmark runs on a regular grid and on an irregular TIN of
+each size in `DEFAULT_MESH_SIZES`. Choose other sizes with `--mesh-sizes`, for
+example `pytest benchmarks --mesh-sizes=1000,16000`. Use pytest-benchmark's
+`--benchmark-autosave` and `--benchmark-compare` options to compare commits.
+
+Each benchmark records its throughput in vertices per second and the peak
+memory allocated through Python and NumPy during one call, which are listed
+after the timings. Memory allocated directly by the Cython kernels isn't
+traced.
+"""
+import tracemalloc
+from functools import lru_cache
+from typing import Any, Callable, List, Tuple
+
+import attr
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder.ecef import to_ecef
+from quantized_mesh_encoder.optimize import optimize_mesh
+
+DEFAULT_MESH_SIZES = (1_000, 16_000, 130_000, 1_000_000, 2_000_000)
+MESH_KINDS = ('grid', 'tin')
+BOUNDS = (10.0, 45.0, 10.5, 45.25)
+
+# (name, vertices, vertices per second, peak memory in bytes) of each benchmark
+RESULTS: List[Tuple[str, int, float, int]] = []
+
+
+@attr.s(frozen=True, kw_only=True)
+class Mesh:
+    """A synthetic mesh, in first use order
+
+    Attributes:
+        - kind: `'grid'` or `'tin'`
+        - positions: longitude, latitude and height of each vertex, of dtype
+          np.float32
+        - indices: triangles, of shape (-1, 3) and dtype np.uint32
+        - cartesian_positions: positions in earth-centered, earth-fixed
+          coordinates
+        - bounds: `[minx, miny, maxx, maxy]` of the mesh
+    """
+
+    kind: str = attr.ib()
+    positions: np.ndarray = attr.ib()
+    indices: np.ndarray = attr.ib()
+    cartesian_positions: np.ndarray = attr.ib()
+    bounds: Tuple[float, float, float, float] = attr.ib()
+
+    @property
+    def n_vertices(self) -> int:
+        return len(self.positions)
+
+
+@lru_cache(maxsize=None)
+def make_mesh(kind: str, n_vertices: int) -> Mesh:
+    """Create a mesh of about n_vertices vertices
+
+    A grid has two triangles per cell. A TIN is the same grid with interior
+    vertices moved randomly by up to 40% of a cell, and triangles in random
+    order, so that neither positions nor triangles follow a regular pattern.
+    """
+    side = max(2, int(round(np.sqrt(n_vertices))))
+    rng = np.random.default_rng(side)
+
+    minx, miny, maxx, maxy = BOUNDS
+    lat, lon = np.meshgrid(
+        np.linspace(maxy, miny, side), np.linspace(minx, maxx, side), indexing='ij'
+    )
+    heights = 1000 + 500 * np.sin(lon * 20) * np.cos(lat * 30)
+    heights += rng.normal(0, 10, heights.shape)
+
+    if kind == 'tin':
+        dx, dy = (maxx - minx) / (side - 1), (maxy - miny) / (side - 1)
+        lon[1:-1, 1:-1] += rng.uniform(-0.4, 0.4, (side - 2, side - 2)) * dx
+        lat[1:-1, 1:-1] += rng.uniform(-0.4, 0.4, (side - 2, side - 2)) * dy
+
+    positions = np.column_stack([lon.ravel(), lat.ravel(), heights.ravel()])
+
+    grid = np.arange(side * side, dtype=np.uint32).reshape(side, side)
+    nw, ne = grid[:-1, :-1].ravel(), grid[:-1, 1:].ravel()
+    sw, se = grid[1:, :-1].ravel(), grid[1:, 1:].ravel()
+    indices = np.concatenate(
+        [np.column_stack([sw, se, ne]), np.column_stack([sw, ne, nw])]
+    )
+    if kind == 'tin':
+        indices = indices[rng.permutation(len(indices))]
+
+    positions, indices = optimize_mesh(positions.astype(np.float32), indices)
+    for arr in (positions, indices):
+        arr.flags.writeable = False
+
+    cartesian_positions = to_ecef(positions)
+    cartesian_positions.flags.writeable = False
+
+    return Mesh(
+        kind=kind,
+        positions=positions,
+        indices=indices,
+        cartesian_positions=cartesian_positions,
+        bounds=BOUNDS,
+    )
+
+
+def pytest_addoption(parser):
+    parser.addoption(
+        '--mesh-sizes',
+        default=','.join(map(str, DEFAULT_MESH_SIZES)),
+        help='comma-separated numbers of vertices of the benchmark meshes',
+    )
+
+
+def pytest_generate_tests(metafunc):
+    if 'mesh' not in metafunc.fixturenames:
+        return
+
+    sizes = [int(s) for s in metafunc.config.getoption('mesh_sizes').split(',')]
+    params = [(kind, n) for n in sizes for kind in MESH_KINDS]
+    ids = [f'{kind}-{n}' for kind, n in params]
+    metafunc.parametrize('mesh', params, ids=ids, indirect=True)
+
+
+@pytest.fixture
+def mesh(request) -> Mesh:
+    return make_mesh(*request.param)
+
+
+@pytest.fixture
+def run(benchmark, request) -> Callable[..., Any]:
+    """Benchmark a function, recording throughput and peak memory
+
+    Call as `run(n_vertices, func, *args, **kwargs)`.
+    """
+
+    def run(n_vertices: int, func: Callable[..., Any], *args, **kwargs) -> Any:
+        tracemalloc.start()
+        try:
+            func(*args, **kwargs)
+            _, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+
+        result = benchmark(func, *args, **kwargs)
+
+        benchmark.extra_info['vertices'] = n_vertices
+        benchmark.extra_info['peak_memory'] = peak
+        if benchmark.stats is not None:
+            throughput = n_vertices / benchmark.stats.stats.median
+            benchmark.extra_info['vertices_per_second'] = throughput
+            RESULTS.append((request.node.name, n_vertices, throughput, peak))
+
+        return result
+
+    return run
+
+
+def pytest_terminal_summary(terminalreporter):
+    if not RESULTS:
+        return
+
+    terminalreporter.section('throughput and peak memory')
+    width = max(len(name) for name, *_ in RESULTS)
+    terminalreporter.write_line(
+        f'{"Name":<{width}}  {"Vertices":>10}  {"Mvertex/s":>10}  {"Peak MB":>9}'
+    )
+    for name, n_vertices, throughput, peak in sorted(RESULTS):
+        terminalreporter.write_line(
+            f'{name:<{width}}  {n_vertices:>10}  {throughput / 1e6:>10.2f}  '
+            f'{peak / 1e6:>9.2f}'
+        )
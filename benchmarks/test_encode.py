@@ -0,0 +1,49 @@
+"""Benchmarks of encoding whole meshes, compared with quantized-mesh-tile"""
+from io import BytesIO
+
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.encode import encode
+
+# quantized-mesh-tile is written in pure Python, and too slow for large meshes
+QUANTIZED_MESH_TILE_MAX_VERTICES = 20_000
+
+
+def test_encode(run, mesh):
+    def encode_mesh():
+        encode(BytesIO(), mesh.positions, mesh.indices, bounds=mesh.bounds)
+
+    run(mesh.n_vertices, encode_mesh)
+
+
+def test_encode_vertex_normals(run, mesh):
+    def encode_mesh():
+        normals = extensions.VertexNormalsExtension(
+            positions=mesh.positions, indices=mesh.indices
+        )
+        encode(
+            BytesIO(),
+            mesh.positions,
+            mesh.indices,
+            bounds=mesh.bounds,
+            extensions=[normals],
+        )
+
+    run(mesh.n_vertices, encode_mesh)
+
+
+def test_quantized_mesh_tile(run, mesh):
+    qmt = pytest.importorskip('quantized_mesh_tile')
+    if mesh.n_vertices > QUANTIZED_MESH_TILE_MAX_VERTICES:
+        pytest.skip('too slow for quantized-mesh-tile')
+
+    triangles = mesh.positions[mesh.indices].tolist()
+
+    def encode_mesh():
+        topology = qmt.TerrainTopology(geometries=triangles)
+        tile = qmt.TerrainTile()
+        tile.fromTerrainTopology(topology, bounds=mesh.bounds)
+        tile.toBytesIO()
+
+    run(mesh.n_vertices, encode_mesh)
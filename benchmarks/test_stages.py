@@ -0,0 +1,86 @@
+"""Benchmarks of each stage of encoding a mesh"""
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder.bounding_sphere import bounding_sphere
+from quantized_mesh_encoder.ecef import to_ecef
+from quantized_mesh_encoder.encode import (
+    interp_positions,
+    quantization_range,
+    write_edge_indices,
+    write_vertices,
+)
+from quantized_mesh_encoder.normals import compute_vertex_normals, oct_encode
+from quantized_mesh_encoder.occlusion import (
+    occlusion_point,
+    occlusion_point_from_bounds,
+)
+from quantized_mesh_encoder.util_cy import encode_indices, encode_vertices
+
+SPHERE_METHODS = ['bounding_box', 'naive', 'ritter', 'epos', 'welzl', None]
+
+
+def test_to_ecef(run, mesh):
+    run(mesh.n_vertices, to_ecef, mesh.positions)
+
+
+@pytest.mark.parametrize('method', SPHERE_METHODS, ids=str)
+def test_bounding_sphere(run, mesh, method):
+    run(mesh.n_vertices, bounding_sphere, mesh.cartesian_positions, method=method)
+
+
+def test_occlusion_point(run, mesh):
+    center, _ = bounding_sphere(mesh.cartesian_positions)
+    run(mesh.n_vertices, occlusion_point, mesh.cartesian_positions, center)
+
+
+def test_occlusion_point_from_bounds(run, mesh):
+    center, _ = bounding_sphere(mesh.cartesian_positions)
+    max_height = mesh.positions[:, 2].max()
+    run(mesh.n_vertices, occlusion_point_from_bounds, mesh.bounds, max_height, center)
+
+
+def test_interp_positions(run, mesh):
+    run(mesh.n_vertices, interp_positions, mesh.positions, mesh.bounds)
+
+
+def test_encode_vertices(run, mesh):
+    quant_range = quantization_range(mesh.positions, mesh.bounds)
+    out = np.empty((3, mesh.n_vertices), dtype=np.uint16)
+    run(mesh.n_vertices, encode_vertices, mesh.positions, *quant_range, out=out)
+
+
+def test_write_vertices(run, mesh):
+    quant_range = quantization_range(mesh.positions, mesh.bounds)
+    vertices = np.empty((3, mesh.n_vertices), dtype=np.uint16)
+    encode_vertices(mesh.positions, *quant_range, out=vertices)
+    buf = bytearray(4 + vertices.nbytes)
+    run(mesh.n_vertices, write_vertices, buf, 0, vertices)
+
+
+def test_encode_indices(run, mesh):
+    indices = mesh.indices.ravel()
+    run(mesh.n_vertices, encode_indices, indices)
+
+
+def test_write_edge_indices(run, mesh):
+    quant_range = quantization_range(mesh.positions, mesh.bounds)
+    edges = encode_vertices(mesh.positions, *quant_range)
+    buf = bytearray(sum(4 + 4 * len(edge) for edge in edges))
+    run(mesh.n_vertices, write_edge_indices, buf, 0, edges, mesh.n_vertices)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64], ids=['float32', 'float64'])
+def test_compute_vertex_normals(run, mesh, dtype):
+    run(
+        mesh.n_vertices,
+        compute_vertex_normals,
+        mesh.cartesian_positions,
+        mesh.indices,
+        dtype=dtype,
+    )
+
+
+def test_oct_encode(run, mesh):
+    normals = compute_vertex_normals(mesh.cartesian_positions, mesh.indices)
+    run(mesh.n_vertices, oct_encode, normals)
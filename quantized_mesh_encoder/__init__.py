@@ -4,7 +4,15 @@ __author__ = """Kyle Barron"""
 __email__ = "kylebarron2@gmail.com"
 __version__ = "0.5.0"
 
+from .aio import AsyncEncoder, encode_async, encode_many_async
+from .batch import encode_many
 from .constants import WGS84
+from .decode import decode
 from .ellipsoid import Ellipsoid
-from .encode import encode
+from .encode import encode, encode_into, encoded_size
 from .extensions import MetadataExtension, VertexNormalsExtension, WaterMaskExtension
+from .heightmap import encode_heightmap
+from .optimize import optimize_mesh
+from .rtin import simplify_heightmap
+from .stats import EncodeStats
+from .water_mask import water_mask_from_mesh, water_mask_from_raster
@@ -0,0 +1,253 @@
+"""Encode meshes from asyncio code
+
+Calling `encode` in a coroutine blocks the event loop for as long as the tile
+takes to encode. `AsyncEncoder` runs `encode` in a thread pool instead, and
+awaits the result. The Cython kernels release the GIL, so tiles encode in
+parallel while the event loop keeps serving requests.
+
+The number of meshes submitted to the pool at once is bounded. Further calls
+wait for a slot before submitting, so that a burst of requests queues in the
+event loop instead of piling up arrays in the pool's queue.
+"""
+import asyncio
+import os
+from collections import deque
+from collections.abc import AsyncIterable as AsyncIterableABC
+from concurrent.futures import Executor, Future, ThreadPoolExecutor
+from typing import (
+    Any,
+    AsyncIterable,
+    AsyncIterator,
+    Deque,
+    Iterable,
+    Optional,
+    Tuple,
+    Union,
+)
+
+import numpy as np
+
+from .batch import Job, _encode_arrays, _unpack_job
+
+
+class AsyncEncoder:
+    """Encode meshes in a managed executor, bounding the work in flight
+
+    Use as an async context manager, or call `aclose`, to shut down the
+    executor it creates.
+
+    Kwargs:
+        - max_workers: number of worker threads. Default: the default of
+          `ThreadPoolExecutor`.
+        - max_pending: maximum number of meshes submitted to the executor at
+          once. Default: twice `max_workers`, or twice the number of CPUs.
+        - executor: an existing executor to submit work to, which isn't shut
+          down. With a `ProcessPoolExecutor`, arrays and extensions are pickled
+          for every mesh. If provided, `max_workers` is ignored.
+    """
+
+    def __init__(
+        self,
+        *,
+        max_workers: Optional[int] = None,
+        max_pending: Optional[int] = None,
+        executor: Optional[Executor] = None,
+    ):
+        self._own_executor = executor is None
+        if executor is None:
+            executor = ThreadPoolExecutor(max_workers=max_workers)
+        self.executor = executor
+
+        if max_pending is None:
+            max_pending = 2 * (max_workers or os.cpu_count() or 1)
+        msg = 'max_pending must be positive.'
+        assert max_pending > 0, msg
+        self.max_pending = max_pending
+
+        # Created in the running event loop on first use
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def __aenter__(self) -> 'AsyncEncoder':
+        return self
+
+    async def __aexit__(self, *exc_info: Any) -> None:
+        await self.aclose()
+
+    async def encode(
+        self, positions: np.ndarray, indices: np.ndarray, **kwargs: Any
+    ) -> bytes:
+        """Encode a mesh without blocking the event loop
+
+        Waits for a free slot if `max_pending` meshes are already submitted.
+        If the calling task is cancelled before the mesh starts encoding, the
+        mesh is removed from the executor's queue.
+
+        Args:
+            - positions, indices: see `encode()`
+
+        Kwargs:
+            passed to `encode()`
+
+        Returns:
+            Encoded quantized mesh bytes
+        """
+        loop = asyncio.get_running_loop()
+        slots = self._semaphore(loop)
+        await slots.acquire()
+        try:
+            future = self.executor.submit(_encode_arrays, positions, indices, **kwargs)
+        except BaseException:
+            slots.release()
+            raise
+
+        # Release the slot when the work is done, not when the awaiting task
+        # is cancelled, so that the bound holds for work still running
+        def release(_: Future) -> None:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(slots.release)
+
+        future.add_done_callback(release)
+        return await asyncio.wrap_future(future)
+
+    async def encode_many(
+        self,
+        jobs: Union[Iterable[Job], AsyncIterable[Job]],
+        *,
+        ordered: bool = True,
+        **kwargs: Any,
+    ) -> AsyncIterator[Any]:
+        """Encode many meshes, yielding results as they complete
+
+        Jobs are read lazily, and at most `max_pending` are in flight, so
+        `jobs` may be an endless stream.
+
+        Args:
+            - jobs: an iterable or async iterable of `(positions, indices,
+              bounds, extensions)` tuples, as for `encode_many`
+
+        Kwargs:
+            - ordered: if `True` (the default), yield encoded bytes in the same
+              order as `jobs`. If `False`, yield `(index, bytes)` tuples as
+              soon as each job completes.
+            - other keyword arguments are passed to `encode()`
+
+        Yields:
+            Encoded quantized mesh bytes, or `(index, bytes)` tuples when
+            `ordered` is `False`.
+        """
+        pending: Deque[Tuple[int, asyncio.Future]] = deque()
+        try:
+            i = 0
+            async for job in _aiter(jobs):
+                while len(pending) >= self.max_pending:
+                    async for result in _drain(pending, ordered):
+                        yield result
+
+                positions, indices, bounds, extensions = _unpack_job(job)
+                task = asyncio.ensure_future(
+                    self.encode(
+                        positions,
+                        indices,
+                        bounds=bounds,
+                        extensions=extensions,
+                        **kwargs,
+                    )
+                )
+                pending.append((i, task))
+                i += 1
+
+            while pending:
+                async for result in _drain(pending, ordered):
+                    yield result
+
+        finally:
+            # Only reached with jobs pending if the generator is closed early or
+            # a job raised
+            for _, task in pending:
+                task.cancel()
+
+    async def aclose(self) -> None:
+        """Shut down the executor, if created by this encoder, waiting for
+        running work to finish in a separate thread"""
+        if self._own_executor:
+            await asyncio.get_running_loop().run_in_executor(
+                None, self.executor.shutdown
+            )
+
+    def _semaphore(self, loop: asyncio.AbstractEventLoop) -> asyncio.Semaphore:
+        if self._slots is None or self._loop is not loop:
+            self._loop = loop
+            self._slots = asyncio.Semaphore(self.max_pending)
+
+        return self._slots
+
+
+_default_encoder: Optional[AsyncEncoder] = None
+
+
+def default_encoder() -> AsyncEncoder:
+    """Shared `AsyncEncoder` used by `encode_async` and `encode_many_async`"""
+    global _default_encoder
+    if _default_encoder is None:
+        _default_encoder = AsyncEncoder()
+
+    return _default_encoder
+
+
+async def encode_async(
+    positions: np.ndarray, indices: np.ndarray, **kwargs: Any
+) -> bytes:
+    """Encode a mesh in a shared thread pool without blocking the event loop
+
+    Args:
+        - positions, indices: see `encode()`
+
+    Kwargs:
+        passed to `encode()`
+
+    Returns:
+        Encoded quantized mesh bytes
+    """
+    return await default_encoder().encode(positions, indices, **kwargs)
+
+
+def encode_many_async(
+    jobs: Union[Iterable[Job], AsyncIterable[Job]],
+    *,
+    ordered: bool = True,
+    **kwargs: Any,
+) -> AsyncIterator[Any]:
+    """Encode many meshes in a shared thread pool, see `AsyncEncoder.encode_many`
+
+    Use `async for data in encode_many_async(jobs)`.
+    """
+    return default_encoder().encode_many(jobs, ordered=ordered, **kwargs)
+
+
+async def _aiter(jobs: Union[Iterable[Job], AsyncIterable[Job]]) -> AsyncIterator[Job]:
+    if isinstance(jobs, AsyncIterableABC):
+        async for job in jobs:
+            yield job
+    else:
+        for job in jobs:
+            yield job
+
+
+async def _drain(
+    pending: Deque[Tuple[int, asyncio.Future]], ordered: bool
+) -> AsyncIterator[Any]:
+    """Wait for the next job, or the next completed jobs, and yield results"""
+    if ordered:
+        _, task = pending[0]
+        data = await task
+        pending.popleft()
+        yield data
+        return
+
+    done, _ = await asyncio.wait(
+        [task for _, task in pending], return_when=asyncio.FIRST_COMPLETED
+    )
+    for item in [item for item in pending if item[1] in done]:
+        pending.remove(item)
+        yield item[0], item[1].result()
@@ -0,0 +1,333 @@
+"""Single-file tile archive, read through a memory map
+
+An archive packs the encoded tiles of a layer into one file, with a sorted
+directory of tiles, so that a server maps the file once and returns tiles as
+`memoryview` slices of the map, without opening files, copying or parsing.
+
+The file has four sections, in little-endian byte order:
+
+- a header of `ARCHIVE_HEADER.size` bytes: magic bytes `b'QMTA'`, the format
+  version, the compression of tiles, the number of tiles, and the offsets of
+  the directory and metadata
+- the tile data, with identical tiles stored once
+- the directory, aligned to 8 bytes: the sorted `uint64` keys of all tiles,
+  then their `uint64` offsets in the file, then their `uint32` lengths
+- the metadata, as JSON
+
+A tile's key is its zoom level in the top 8 bits and the Morton code of its `x`
+and `y` in the low 56 bits, so that tiles of a level are sorted along a Z-order
+curve and nearby tiles are stored near each other. Tiles are found with a
+binary search of the keys.
+"""
+import hashlib
+import json
+import mmap
+import os
+import sys
+from bisect import bisect_left
+from pathlib import Path
+from struct import Struct
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    Iterator,
+    List,
+    Mapping,
+    Optional,
+    Sequence,
+    Tuple,
+)
+
+import numpy as np
+
+from .availability import morton_code, morton_decode, morton_encode
+from .compression import COMPRESSION_METHODS, compress
+from .mbtiles import PathLike
+
+ARCHIVE_MAGIC = b'QMTA'
+ARCHIVE_VERSION = 1
+
+# magic, version, compression, reserved, number of tiles, directory offset,
+# metadata offset, metadata length
+ARCHIVE_HEADER = Struct('<4sBBHQQQQ')
+
+# Tile coordinates must fit in the 56 bits of the Morton code of a key
+MAX_ZOOM = 27
+
+# Compression methods by their code in the header. 0 is uncompressed.
+_COMPRESSION_CODES = (None,) + COMPRESSION_METHODS
+
+_KEY_SHIFT = 56
+
+
+def tile_keys(x: Any, y: Any, z: Any) -> np.ndarray:
+    """Directory keys of tiles
+
+    Args:
+        - x, y, z: tile coordinates, as integers or arrays that broadcast
+          together
+
+    Returns:
+        ndarray of dtype np.uint64
+    """
+    z = np.asarray(z, dtype=np.uint64)
+    return (z << np.uint64(_KEY_SHIFT)) | morton_encode(x, y)
+
+
+class TileArchiveWriter:
+    """Write encoded tiles to an archive
+
+    Tile data is written to the file as tiles are added, and the directory when
+    the writer is closed. Use as a context manager, or call `close`.
+
+    Args:
+        - path: path of the archive. An existing file is replaced.
+
+    Kwargs:
+        - compression: if provided, `'gzip'` or `'brotli'`, compress tiles
+          before storing them, and record the method in the header.
+        - compression_level: passed to `compress`.
+        - metadata: JSON-serializable metadata, e.g. the output of `layer_json`
+
+    Attributes:
+        - n_tiles: number of tiles written. A tile written twice replaces the
+          first one.
+        - n_unique: number of distinct tile contents stored
+    """
+
+    def __init__(
+        self,
+        path: PathLike,
+        *,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None,
+        metadata: Optional[Mapping[str, Any]] = None,
+    ):
+        if compression is not None:
+            msg = f'compression must be one of {COMPRESSION_METHODS}.'
+            assert compression in COMPRESSION_METHODS, msg
+
+        self.compression = compression
+        self.compression_level = compression_level
+        self.metadata = dict(metadata or {})
+        self.n_tiles = 0
+        self.n_unique = 0
+
+        self._keys: List[int] = []
+        self._offsets: List[int] = []
+        self._lengths: List[int] = []
+        self._stored: Dict[bytes, int] = {}
+
+        self.f: BinaryIO = open(os.fspath(path), 'wb')
+        self.f.write(bytes(ARCHIVE_HEADER.size))
+        self._offset = ARCHIVE_HEADER.size
+        self._closed = False
+
+    def __enter__(self) -> 'TileArchiveWriter':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(
+        self, x: int, y: int, z: int, data: bytes, *, compressed: bool = False
+    ) -> None:
+        """Add a tile
+
+        Args:
+            - x, y, z: tile coordinates
+            - data: encoded tile, e.g. written by `encode()` to a `BytesIO`
+
+        Kwargs:
+            - compressed: if `True`, `data` is already compressed with the
+              writer's `compression`, e.g. by `encode_many`, and is stored as
+              it is. Default: `False`.
+        """
+        msg = f'z must be between 0 and {MAX_ZOOM}.'
+        assert 0 <= z <= MAX_ZOOM, msg
+
+        if self.compression is not None and not compressed:
+            data = compress(data, self.compression, self.compression_level)
+
+        digest = hashlib.blake2b(data, digest_size=16).digest()
+        offset = self._stored.get(digest)
+        if offset is None:
+            offset = self._stored[digest] = self._offset
+            self.f.write(data)
+            self._offset += len(data)
+            self.n_unique += 1
+
+        self._keys.append((int(z) << _KEY_SHIFT) | morton_code(int(x), int(y)))
+        self._offsets.append(offset)
+        self._lengths.append(len(data))
+
+    def close(self) -> None:
+        """Write the directory, metadata and header, and close the file"""
+        if self._closed:
+            return
+
+        keys = np.array(self._keys, dtype='<u8')
+        offsets = np.array(self._offsets, dtype='<u8')
+        lengths = np.array(self._lengths, dtype='<u4')
+
+        # Sort by key, keeping the last write of each tile
+        keys, index = np.unique(keys[::-1], return_index=True)
+        index = len(self._keys) - 1 - index
+        offsets, lengths = offsets[index], lengths[index]
+        self.n_tiles = keys.size
+
+        directory_offset = self._offset + (-self._offset % 8)
+        self.f.write(bytes(directory_offset - self._offset))
+        for arr in (keys, offsets, lengths):
+            self.f.write(arr.tobytes())
+
+        metadata = json.dumps(self.metadata, separators=(',', ':')).encode()
+        metadata_offset = directory_offset + keys.size * 20
+        self.f.write(metadata)
+
+        self.f.seek(0)
+        self.f.write(
+            ARCHIVE_HEADER.pack(
+                ARCHIVE_MAGIC,
+                ARCHIVE_VERSION,
+                _COMPRESSION_CODES.index(self.compression),
+                0,
+                keys.size,
+                directory_offset,
+                metadata_offset,
+                len(metadata),
+            )
+        )
+        self.f.close()
+        self._closed = True
+
+
+class TileArchiveReader:
+    """Read tiles from an archive through a memory map
+
+    Lookups are a binary search of the directory, and tiles are returned as
+    `memoryview` slices of the map, so a reader can be shared by the threads of
+    a server. Slices stay valid until the reader is closed; close it only once
+    no slices are in use.
+
+    Args:
+        - path: path of the archive
+
+    Attributes:
+        - metadata: metadata of the archive
+        - compression: compression of stored tiles, e.g. `'gzip'` to serve them
+          with a `Content-Encoding: gzip` header, or None
+    """
+
+    def __init__(self, path: PathLike):
+        with open(os.fspath(path), 'rb') as f:
+            self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        self._view = memoryview(self._mmap)
+        (
+            magic,
+            version,
+            compression,
+            _,
+            n_tiles,
+            directory_offset,
+            metadata_offset,
+            metadata_length,
+        ) = ARCHIVE_HEADER.unpack_from(self._view, 0)
+
+        msg = f'{Path(path).name} is not a tile archive.'
+        assert magic == ARCHIVE_MAGIC, msg
+        msg = f'unsupported archive version {version}.'
+        assert version == ARCHIVE_VERSION, msg
+
+        self.compression: Optional[str] = _COMPRESSION_CODES[compression]
+        self.keys = np.frombuffer(self._view, '<u8', n_tiles, directory_offset)
+        self.offsets = np.frombuffer(
+            self._view, '<u8', n_tiles, directory_offset + 8 * n_tiles
+        )
+        self.lengths = np.frombuffer(
+            self._view, '<u4', n_tiles, directory_offset + 16 * n_tiles
+        )
+        metadata = self._view[metadata_offset : metadata_offset + metadata_length]
+        self.metadata: Dict[str, Any] = json.loads(bytes(metadata))
+
+        # Lookups index native memoryviews of the directory, which is faster
+        # than indexing arrays, except on big-endian machines
+        self._directory: Tuple[Sequence[int], Sequence[int], Sequence[int]]
+        if sys.byteorder == 'little':
+            start = directory_offset
+            self._directory = (
+                self._view[start : start + 8 * n_tiles].cast('Q'),
+                self._view[start + 8 * n_tiles : start + 16 * n_tiles].cast('Q'),
+                self._view[start + 16 * n_tiles : start + 20 * n_tiles].cast('I'),
+            )
+        else:
+            self._directory = (self.keys, self.offsets, self.lengths)
+
+    def __enter__(self) -> 'TileArchiveReader':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def __len__(self) -> int:
+        return self.keys.size
+
+    def get(self, x: int, y: int, z: int) -> Optional[memoryview]:
+        """Stored bytes of a tile, or None if it doesn't exist
+
+        Returns:
+            a read-only `memoryview` on the memory map
+        """
+        if not 0 <= z <= MAX_ZOOM:
+            return None
+
+        keys, offsets, lengths = self._directory
+        key = (int(z) << _KEY_SHIFT) | morton_code(int(x), int(y))
+        i = bisect_left(keys, key)
+        if i == len(keys) or keys[i] != key:
+            return None
+
+        offset = int(offsets[i])
+        return self._view[offset : offset + int(lengths[i])]
+
+    def __contains__(self, tile: Tuple[int, int, int]) -> bool:
+        x, y, z = tile
+        return self.get(x, y, z) is not None
+
+    def tiles(self) -> Iterator[Tuple[int, int, int, memoryview]]:
+        """Iterate over all tiles, as `(x, y, z, data)` tuples, in key order"""
+        x, y = morton_decode(self.keys & np.uint64((1 << _KEY_SHIFT) - 1))
+        z = self.keys >> np.uint64(_KEY_SHIFT)
+        for i, (tx, ty, tz) in enumerate(zip(x.tolist(), y.tolist(), z.tolist())):
+            offset = int(self.offsets[i])
+            yield tx, ty, tz, self._view[offset : offset + int(self.lengths[i])]
+
+    def available(self) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """Tiles of each zoom level
+
+        Returns:
+            mapping from zoom level to the `x` and `y` arrays of its tiles, as
+            the `available` argument of `layer_json` and
+            `AvailabilityIndex.from_tiles`
+        """
+        z = (self.keys >> np.uint64(_KEY_SHIFT)).astype(np.int64)
+        x, y = morton_decode(self.keys & np.uint64((1 << _KEY_SHIFT) - 1))
+        return {int(level): (x[z == level], y[z == level]) for level in np.unique(z)}
+
+    def close(self) -> None:
+        """Release the memory map
+
+        Raises `BufferError` if tiles returned by `get` are still referenced.
+        Call `close` again once they are released.
+        """
+        for view in self._directory:
+            if isinstance(view, memoryview):
+                view.release()
+
+        self._directory = ((), (), ())
+        self.keys = self.offsets = np.empty(0, dtype='<u8')
+        self.lengths = np.empty(0, dtype='<u4')
+        self._view.release()
+        self._mmap.close()
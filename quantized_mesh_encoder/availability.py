@@ -0,0 +1,259 @@
+"""Index of available tiles, for availability metadata
+
+Cesium terrain layers can list the tiles that exist in the `metadata` extension
+of tiles instead of in `layer.json`: a tile at a level that is a multiple of
+`metadataAvailability` lists the available ranges of its descendants for the
+next levels.
+
+`AvailabilityIndex` stores the tiles of each level as a sorted array of Morton
+codes, i.e. a linear quadtree where the bits of `x` and `y` are interleaved.
+The descendants of a tile at any level below it are then a contiguous slice of
+the codes of that level, found with two binary searches, and compacted into
+ranges with NumPy.
+
+Resources:
+https://github.com/CesiumGS/quantized-mesh#metadata
+https://en.wikipedia.org/wiki/Z-order_curve
+"""
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import attr
+import numpy as np
+
+from .tiling import ArrayLike, compact_ranges
+
+# Tile coordinates must fit in 32 bits to be interleaved into 64 bit codes
+MAX_ZOOM = 31
+
+_NO_CODES = np.empty(0, dtype=np.uint64)
+
+
+def morton_encode(x: ArrayLike, y: ArrayLike) -> np.ndarray:
+    """Interleave the bits of tile coordinates into Morton codes
+
+    Bit `i` of `x` is bit `2i` of the code, and bit `i` of `y` is bit `2i + 1`,
+    so the codes of the descendants of a tile `k` levels below it are the codes
+    in `[code << 2k, (code + 1) << 2k)`.
+
+    Args:
+        - x, y: tile coordinates, of at most 32 bits, as integers or arrays
+          that broadcast together
+
+    Returns:
+        ndarray of dtype np.uint64
+    """
+    return _spread_bits(x) | (_spread_bits(y) << 1)
+
+
+def morton_decode(code: ArrayLike) -> Tuple[np.ndarray, np.ndarray]:
+    """Split Morton codes into tile coordinates
+
+    Returns:
+        x, y: arrays of dtype np.int64
+    """
+    code = np.asarray(code, dtype=np.uint64)
+    x = _compact_bits(code)
+    y = _compact_bits(code >> 1)
+    return x.astype(np.int64), y.astype(np.int64)
+
+
+def morton_code(x: int, y: int) -> int:
+    """Morton code of a single tile, as `morton_encode` on Python integers"""
+    code = 0
+    for i, v in enumerate((x & 0xFFFFFFFF, y & 0xFFFFFFFF)):
+        v = (v | (v << 16)) & 0x0000FFFF0000FFFF
+        v = (v | (v << 8)) & 0x00FF00FF00FF00FF
+        v = (v | (v << 4)) & 0x0F0F0F0F0F0F0F0F
+        v = (v | (v << 2)) & 0x3333333333333333
+        v = (v | (v << 1)) & 0x5555555555555555
+        code |= v << i
+    return code
+
+
+@attr.s(frozen=True)
+class AvailabilityIndex:
+    """Tiles that exist in a terrain layer
+
+    Build the index with `from_tiles`, then call `metadata` for the data of
+    each tile's `MetadataExtension`.
+
+    Attributes:
+        - codes: mapping from zoom level to the sorted, unique Morton codes of
+          the tiles at that level
+    """
+
+    codes: Dict[int, np.ndarray] = attr.ib(factory=dict)
+
+    @classmethod
+    def from_tiles(
+        cls, available: Mapping[int, Tuple[ArrayLike, ArrayLike]]
+    ) -> 'AvailabilityIndex':
+        """Build an index from the tiles of each level
+
+        Args:
+            - available: mapping from zoom level to the `x` and `y` arrays of
+              the tiles that exist at that level, as passed to `layer_json`.
+              Duplicate tiles are allowed.
+        """
+        codes = {}
+        for z, (x, y) in available.items():
+            msg = f'zoom levels must be between 0 and {MAX_ZOOM}.'
+            assert 0 <= z <= MAX_ZOOM, msg
+
+            x, y = np.asarray(x, dtype=np.int64), np.asarray(y, dtype=np.int64)
+            msg = 'tile coordinates must be non-negative.'
+            assert x.size == 0 or (x.min() >= 0 and y.min() >= 0), msg
+
+            codes[int(z)] = np.unique(morton_encode(x, y).ravel())
+
+        return cls(codes)
+
+    @property
+    def max_zoom(self) -> int:
+        """Highest level with tiles, or -1 if the index is empty"""
+        return max((z for z, codes in self.codes.items() if codes.size), default=-1)
+
+    def tiles(self, z: int) -> Tuple[np.ndarray, np.ndarray]:
+        """List the tiles of a level
+
+        Returns:
+            x, y: arrays of dtype np.int64, in Morton order
+        """
+        return morton_decode(self.codes.get(z, _NO_CODES))
+
+    def contains(self, x: ArrayLike, y: ArrayLike, z: int) -> np.ndarray:
+        """Check whether tiles of a level exist
+
+        Args:
+            - x, y: tile coordinates, as integers or arrays that broadcast
+              together
+            - z: zoom level
+
+        Returns:
+            ndarray of dtype bool, of the broadcast shape of `x` and `y`
+        """
+        target = morton_encode(x, y)
+        codes = self.codes.get(z)
+        if codes is None or codes.size == 0:
+            return np.zeros(target.shape, dtype=bool)
+
+        i = np.searchsorted(codes, target)
+        return codes[np.minimum(i, codes.size - 1)] == target
+
+    def descendants(
+        self, x: int, y: int, z: int, level: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """List the tiles of a level that are descendants of a tile
+
+        Args:
+            - x, y, z: coordinates of the tile
+            - level: zoom level of the descendants, at or below `z`
+
+        Returns:
+            x, y: arrays of dtype np.int64, in Morton order
+        """
+        start, stop = self._slice(morton_code(int(x), int(y)), z, level)
+        codes = self.codes.get(level, _NO_CODES)
+        return morton_decode(codes[start:stop])
+
+    def available(self, x: int, y: int, z: int, levels: int) -> List[List[Dict]]:
+        """Compact the available descendants of a tile into ranges
+
+        Args:
+            - x, y, z: coordinates of the tile
+            - levels: number of levels below `z` to list
+
+        Returns:
+            list of lists of `{'startX', 'startY', 'endX', 'endY'}` inclusive
+            ranges, for levels `z + 1` to `z + levels`. Levels past `MAX_ZOOM`
+            can't have tiles, and are left out.
+        """
+        msg = f'z must be between 0 and {MAX_ZOOM}.'
+        assert 0 <= z <= MAX_ZOOM, msg
+
+        x, y = int(x), int(y)
+        code = morton_code(x, y)
+        result = []
+        for level in range(z + 1, min(z + levels, MAX_ZOOM) + 1):
+            start, stop = self._slice(code, z, level)
+            shift = level - z
+
+            if stop - start == 1 << (2 * shift):
+                # Every descendant exists, which is the common case
+                x0, y0 = x << shift, y << shift
+                size = (1 << shift) - 1
+                ranges = [
+                    {'startX': x0, 'startY': y0, 'endX': x0 + size, 'endY': y0 + size}
+                ]
+            elif stop > start:
+                ranges = compact_ranges(*morton_decode(self.codes[level][start:stop]))
+            else:
+                ranges = []
+
+            result.append(ranges)
+
+        return result
+
+    def metadata(self, x: int, y: int, z: int, levels: int) -> Dict[str, Any]:
+        """Availability of the descendants of a tile, for `MetadataExtension`
+
+        Args:
+            - x, y, z: coordinates of the tile
+            - levels: number of levels below `z` to list, usually the
+              `metadata_availability` of `layer_json`
+
+        Returns:
+            `{'available': ...}`, as returned by `available`, to pass as the
+            `data` of `MetadataExtension`
+        """
+        return {'available': self.available(x, y, z, levels)}
+
+    def as_mapping(
+        self, max_zoom: Optional[int] = None
+    ) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """Tiles of each level, as the `available` argument of `layer_json`
+
+        Args:
+            - max_zoom: highest level to include. Default: all levels.
+        """
+        return {
+            z: self.tiles(z)
+            for z in sorted(self.codes)
+            if max_zoom is None or z <= max_zoom
+        }
+
+    def _slice(self, code: int, z: int, level: int) -> Tuple[int, int]:
+        """Range of the codes of `level` below the tile of `code` at `z`"""
+        msg = 'level must be at or below z.'
+        assert z <= level <= MAX_ZOOM, msg
+
+        codes = self.codes.get(level)
+        if codes is None:
+            return 0, 0
+
+        shift = 2 * (level - z)
+        start = int(codes.searchsorted(np.uint64(code << shift)))
+        stop = int(codes.searchsorted(np.uint64((code + 1) << shift)))
+        return start, stop
+
+
+def _spread_bits(v: ArrayLike) -> np.ndarray:
+    """Move the low 32 bits of v to the even bits of a uint64"""
+    v = np.asarray(v, dtype=np.uint64) & np.uint64(0xFFFFFFFF)
+    v = (v | (v << np.uint64(16))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v << np.uint64(8))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v << np.uint64(4))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v << np.uint64(2))) & np.uint64(0x3333333333333333)
+    v = (v | (v << np.uint64(1))) & np.uint64(0x5555555555555555)
+    return v
+
+
+def _compact_bits(v: np.ndarray) -> np.ndarray:
+    """Inverse of `_spread_bits`, keeping the even bits of a uint64"""
+    v = v & np.uint64(0x5555555555555555)
+    v = (v | (v >> np.uint64(1))) & np.uint64(0x3333333333333333)
+    v = (v | (v >> np.uint64(2))) & np.uint64(0x0F0F0F0F0F0F0F0F)
+    v = (v | (v >> np.uint64(4))) & np.uint64(0x00FF00FF00FF00FF)
+    v = (v | (v >> np.uint64(8))) & np.uint64(0x0000FFFF0000FFFF)
+    v = (v | (v >> np.uint64(16))) & np.uint64(0x00000000FFFFFFFF)
+    return v
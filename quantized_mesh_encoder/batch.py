@@ -0,0 +1,277 @@
+"""Encode many meshes in parallel
+
+With the process backend, positions and indices are copied once into a
+`multiprocessing.shared_memory` block per job, so that worker processes read
+them in place instead of unpickling a copy of every array.
+
+With the thread backend, arrays are passed to worker threads as they are. The
+Cython kernels release the GIL, so threads encode in parallel, and scale further
+on free-threaded Python builds.
+"""
+import os
+from collections import deque
+from concurrent.futures import (
+    FIRST_COMPLETED,
+    Executor,
+    Future,
+    ProcessPoolExecutor,
+    ThreadPoolExecutor,
+    wait,
+)
+from io import BytesIO
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Deque, Iterable, Iterator, Optional, Sequence, Set, Tuple, Union
+
+import numpy as np
+
+from .constants import WGS84
+from .ellipsoid import Ellipsoid
+from .encode import Bounds, encode
+from .extensions import ExtensionBase
+
+Job = Union[
+    Tuple[np.ndarray, np.ndarray],
+    Tuple[np.ndarray, np.ndarray, Optional[Bounds]],
+    Tuple[np.ndarray, np.ndarray, Optional[Bounds], Sequence[ExtensionBase]],
+]
+
+BACKENDS = ('process', 'thread')
+
+
+def encode_many(
+    jobs: Iterable[Job],
+    *,
+    max_workers: Optional[int] = None,
+    ordered: bool = True,
+    backend: str = 'process',
+    sphere_method: Optional[str] = None,
+    occlusion_method: str = 'exact',
+    ellipsoid: Ellipsoid = WGS84,
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    executor: Optional[Executor] = None,
+) -> Iterator[Any]:
+    """Encode many meshes in parallel using a process or thread pool
+
+    Args:
+        - jobs: an iterable of `(positions, indices, bounds, extensions)`
+          tuples. `bounds` and `extensions` may be omitted. Each job is
+          encoded exactly as `encode()` would encode it. The iterable is
+          consumed lazily, so it may be a generator over millions of tiles.
+
+    Kwargs:
+        - max_workers: number of worker processes or threads. Default: the
+          number of CPUs on the machine.
+        - ordered: if `True` (the default), yield encoded bytes in the same
+          order as `jobs`. If `False`, yield `(index, bytes)` tuples as soon as
+          each job completes, where `index` is the position of the job in
+          `jobs`.
+        - backend: `'process'` (the default) to encode in worker processes, or
+          `'thread'` to encode in worker threads. Threads share the arrays of
+          each job without copying them and don't pickle extensions, which
+          suits meshes that are already in memory, such as in a tile server.
+          Processes scale better when much of the time is spent in Python.
+        - sphere_method: passed to `encode()`.
+        - occlusion_method: passed to `encode()`.
+        - ellipsoid: passed to `encode()`.
+        - compression: passed to `encode()`. Tiles are compressed in the
+          workers.
+        - compression_level: passed to `encode()`.
+        - executor: an existing `ProcessPoolExecutor`, or `ThreadPoolExecutor`
+          with the thread backend, to submit work to, so that its workers can
+          be reused across calls. If provided, `max_workers` is ignored and the
+          executor is not shut down.
+
+    Yields:
+        Encoded quantized mesh bytes, or `(index, bytes)` tuples when `ordered`
+        is `False`.
+    """
+    msg = f'backend must be one of {BACKENDS}.'
+    assert backend in BACKENDS, msg
+
+    own_executor = executor is None
+    if executor is None and backend == 'thread':
+        executor = ThreadPoolExecutor(max_workers=max_workers)
+    elif executor is None:
+        executor = ProcessPoolExecutor(max_workers=max_workers)
+
+    kwargs = {
+        'sphere_method': sphere_method,
+        'occlusion_method': occlusion_method,
+        'ellipsoid': ellipsoid,
+        'compression': compression,
+        'compression_level': compression_level,
+    }
+
+    # Bound the number of jobs in flight, so that shared memory use doesn't
+    # grow with the length of `jobs`
+    max_pending = 2 * (max_workers or os.cpu_count() or 1)
+
+    pending: Deque[Tuple[int, Future, Optional[SharedMemory]]] = deque()
+    try:
+        for i, job in enumerate(jobs):
+            if len(pending) >= max_pending:
+                yield from _drain(pending, ordered, until=max_pending - 1)
+
+            positions, indices, bounds, extensions = _unpack_job(job)
+            if backend == 'thread':
+                future = executor.submit(
+                    _encode_arrays,
+                    positions,
+                    indices,
+                    bounds=bounds,
+                    extensions=extensions,
+                    **kwargs,
+                )
+                pending.append((i, future, None))
+                continue
+
+            shm, shapes = _to_shared_memory(positions, indices)
+            future = executor.submit(
+                _encode_shared,
+                shm.name,
+                shapes,
+                bounds=bounds,
+                extensions=extensions,
+                **kwargs,
+            )
+            pending.append((i, future, shm))
+
+        yield from _drain(pending, ordered, until=0)
+
+    finally:
+        # Only reached with jobs pending if the generator is closed early or a
+        # job raised
+        for _, future, _ in pending:
+            future.cancel()
+        for _, future, shm in pending:
+            if not future.cancelled():
+                wait([future])
+            _release(shm)
+
+        if own_executor:
+            executor.shutdown()
+
+
+def _drain(
+    pending: Deque[Tuple[int, Future, Optional[SharedMemory]]],
+    ordered: bool,
+    *,
+    until: int,
+) -> Iterator[Any]:
+    """Yield results until at most `until` jobs are pending"""
+    while len(pending) > until:
+        if ordered:
+            i, future, shm = pending.popleft()
+            try:
+                data = future.result()
+            finally:
+                _release(shm)
+            yield data
+            continue
+
+        done: Set[Future] = wait(
+            [future for _, future, _ in pending], return_when=FIRST_COMPLETED
+        )[0]
+        for item in [item for item in pending if item[1] in done]:
+            pending.remove(item)
+            i, future, shm = item
+            try:
+                data = future.result()
+            finally:
+                _release(shm)
+            yield i, data
+
+
+def _unpack_job(
+    job: Job,
+) -> Tuple[np.ndarray, np.ndarray, Optional[Bounds], Sequence[ExtensionBase]]:
+    msg = 'each job must be a tuple of (positions, indices, bounds, extensions).'
+    assert 2 <= len(job) <= 4, msg
+
+    positions, indices = job[0], job[1]
+    bounds = job[2] if len(job) > 2 else None
+    extensions = job[3] if len(job) > 3 else ()  # type: ignore
+    return positions, indices, bounds, extensions
+
+
+def _to_shared_memory(
+    positions: np.ndarray, indices: np.ndarray
+) -> Tuple[SharedMemory, Tuple[int, int]]:
+    """Copy positions and indices into a new shared memory block
+
+    The arrays are cast to the dtypes `encode()` uses while copying, so no
+    intermediate array is created.
+    """
+    positions = np.asarray(positions).reshape(-1, 3)
+    indices = np.asarray(indices).reshape(-1, 3)
+    shapes = (positions.shape[0], indices.shape[0])
+
+    positions_nbytes = positions.shape[0] * 3 * 4
+    indices_nbytes = indices.shape[0] * 3 * 4
+
+    # Zero-length shared memory blocks are not allowed
+    shm = SharedMemory(create=True, size=max(positions_nbytes + indices_nbytes, 1))
+    try:
+        _shared_arrays(shm, shapes, positions, indices)
+    except BaseException:
+        _release(shm)
+        raise
+
+    return shm, shapes
+
+
+def _shared_arrays(
+    shm: SharedMemory,
+    shapes: Tuple[int, int],
+    positions: np.ndarray,
+    indices: np.ndarray,
+) -> None:
+    n_vertices, n_triangles = shapes
+    shm_positions = np.ndarray((n_vertices, 3), dtype=np.float32, buffer=shm.buf)
+    shm_indices = np.ndarray(
+        (n_triangles, 3),
+        dtype=np.uint32,
+        buffer=shm.buf,
+        offset=shm_positions.nbytes,
+    )
+    shm_positions[:] = positions
+    shm_indices[:] = indices
+
+
+def _encode_arrays(positions: np.ndarray, indices: np.ndarray, **kwargs: Any) -> bytes:
+    """Encode a mesh. Runs in a worker thread."""
+    with BytesIO() as f:
+        encode(f, positions, indices, **kwargs)
+        return f.getvalue()
+
+
+def _encode_shared(name: str, shapes: Tuple[int, int], **kwargs: Any) -> bytes:
+    """Encode a mesh stored in shared memory. Runs in a worker process."""
+    shm = SharedMemory(name=name)
+    try:
+        return _encode_buffer(shm, shapes, **kwargs)
+    finally:
+        shm.close()
+
+
+def _encode_buffer(shm: SharedMemory, shapes: Tuple[int, int], **kwargs: Any) -> bytes:
+    # Views on the shared memory must not outlive this function, otherwise
+    # closing the block fails
+    n_vertices, n_triangles = shapes
+    positions = np.ndarray((n_vertices, 3), dtype=np.float32, buffer=shm.buf)
+    indices = np.ndarray(
+        (n_triangles, 3), dtype=np.uint32, buffer=shm.buf, offset=positions.nbytes
+    )
+    return _encode_arrays(positions, indices, **kwargs)
+
+
+def _release(shm: Optional[SharedMemory]) -> None:
+    if shm is None:
+        return
+
+    shm.close()
+    try:
+        shm.unlink()
+    except FileNotFoundError:
+        pass
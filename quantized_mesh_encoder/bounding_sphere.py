@@ -15,11 +15,28 @@ from typing import Tuple
 
 import numpy as np
 
-from .util_cy import ritter_second_pass
+from .util_cy import extremal_points, grow_sphere, min_sphere, ritter_second_pass
+
+# Approximate cost per vertex in seconds of each method, used by the `auto`
+# method, from tightest to loosest sphere
+METHOD_COSTS = (
+    ('welzl', 30e-9),
+    ('epos', 12e-9),
+    ('ritter', 6e-9),
+    ('bounding_box', 2e-9),
+)
+
+# Default time budget in seconds of the `auto` method, about the time taken by
+# the default method for a 65x65 grid
+AUTO_TIME_BUDGET = 500e-6
 
 
 def bounding_sphere(
-    positions: np.ndarray, *, method: str = None
+    positions: np.ndarray,
+    *,
+    method: str = None,
+    num_threads: int = 1,
+    time_budget: float = AUTO_TIME_BUDGET,
 ) -> Tuple[np.ndarray, float]:
     """Create bounding sphere from positions
 
@@ -30,7 +47,7 @@ def bounding_sphere(
     Kwargs:
         - method: a string designating the algorithm to use for creating the
           bounding sphere. Must be one of `'bounding_box'`, `'naive'`,
-          `'ritter'` or `None`.
+          `'ritter'`, `'epos'`, `'welzl'`, `'auto'` or `None`.
 
           - bounding_box: Finds the bounding box of all positions, then defines
             the center of the sphere as the center of the bounding box, and
@@ -53,6 +70,21 @@ def bounding_sphere(
           - None: Runs both the naive and the ritter methods, then returns the
             smaller of the two. Since this runs both algorithms, it takes around
             500 µs on my computer
+          - epos: Finds the points with the smallest and largest projection
+            on 7 directions, computes the exact smallest sphere containing
+            them, then enlarges it to contain every point as in the ritter
+            method. Usually within a few percent of the smallest sphere, and
+            faster than `None`.
+          - welzl: Computes the exact smallest sphere containing all positions
+            with Welzl's algorithm. This is the tightest sphere, but the
+            slowest method.
+          - auto: Uses the tightest of the `welzl`, `epos`, `ritter` and
+            `bounding_box` methods expected to take less than `time_budget`
+            for the number of positions.
+        - num_threads: number of threads used by the ritter method. The result
+          is the same for any number of threads. Default: 1.
+        - time_budget: time budget in seconds of the `auto` method. Default:
+          500 µs.
 
     Returns:
         center, radius: where center is a Numpy array of length 3 representing
@@ -66,12 +98,24 @@ def bounding_sphere(
         return bounding_sphere_naive(positions)
 
     if method == 'ritter':
-        return bounding_sphere_ritter(positions)
+        return bounding_sphere_ritter(positions, num_threads=num_threads)
+
+    if method == 'epos':
+        return bounding_sphere_epos(positions)
+
+    if method == 'welzl':
+        return bounding_sphere_welzl(positions)
+
+    if method == 'auto':
+        method = auto_method(len(positions), time_budget)
+        return bounding_sphere(positions, method=method, num_threads=num_threads)
 
     # Defaults to both ritter and naive, and choosing the one with smaller
     # radius
     naive_center, naive_radius = bounding_sphere_naive(positions)
-    ritter_center, ritter_radius = bounding_sphere_ritter(positions)
+    ritter_center, ritter_radius = bounding_sphere_ritter(
+        positions, num_threads=num_threads
+    )
 
     if naive_radius < ritter_radius:
         return naive_center, naive_radius
@@ -79,7 +123,9 @@ def bounding_sphere(
     return ritter_center, ritter_radius
 
 
-def bounding_sphere_ritter(positions: np.ndarray) -> Tuple[np.ndarray, float]:
+def bounding_sphere_ritter(
+    positions: np.ndarray, *, num_threads: int = 1
+) -> Tuple[np.ndarray, float]:
     """
     Implements Ritter's algorithm
 
@@ -127,7 +173,37 @@ def bounding_sphere_ritter(positions: np.ndarray) -> Tuple[np.ndarray, float]:
     center = (min_pt + max_pt) / 2
     radius = np.linalg.norm(max_pt - center)
 
-    return ritter_second_pass(positions, center, radius)
+    return ritter_second_pass(positions, center, radius, num_threads)
+
+
+def bounding_sphere_epos(positions: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Extremal points optimal sphere
+
+    1. Find the points with the smallest and largest projection on each of the
+       7 directions of the EPOS-14 algorithm: the coordinate axes and the
+       diagonals of a cube
+    2. Compute the exact smallest sphere containing these points
+    3. Enlarge the sphere to contain every point, as in Ritter's algorithm
+
+    Larsson, T. (2008). Fast and tight fitting bounding spheres.
+    """
+    extremal = np.unique(extremal_points(positions))
+    center, radius = min_sphere(positions, extremal)
+    return grow_sphere(positions, center, radius)
+
+
+def bounding_sphere_welzl(positions: np.ndarray) -> Tuple[np.ndarray, float]:
+    """Exact smallest bounding sphere with Welzl's algorithm"""
+    return min_sphere(positions)
+
+
+def auto_method(n_vertices: int, time_budget: float = AUTO_TIME_BUDGET) -> str:
+    """Tightest bounding sphere method expected to run within the time budget"""
+    for method, cost in METHOD_COSTS:
+        if n_vertices * cost <= time_budget:
+            return method
+
+    return METHOD_COSTS[-1][0]
 
 
 def bounding_sphere_from_bounding_box(
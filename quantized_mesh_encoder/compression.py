@@ -0,0 +1,55 @@
+"""Compress encoded tiles
+
+Quantized mesh tiles are usually served gzipped, with a
+`Content-Encoding: gzip` header. Each tile is compressed in a single call over
+its contiguous encoded buffer.
+"""
+import zlib
+from typing import Optional, Union
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+COMPRESSION_METHODS = ('gzip', 'brotli')
+
+# wbits value for zlib that writes a gzip header and trailer
+GZIP_WBITS = 16 + zlib.MAX_WBITS
+
+
+def compress(
+    data: Union[bytes, bytearray, memoryview],
+    method: str,
+    level: Optional[int] = None,
+) -> bytes:
+    """Compress encoded bytes
+
+    The gzip header doesn't include a modification time, so the same input
+    always creates the same output.
+
+    Args:
+        - data: bytes to compress
+        - method: one of `'gzip'` or `'brotli'`. Brotli requires the `brotli`
+          package to be installed.
+        - level: compression level. For gzip, an integer from 0 to 9, default
+          6. For brotli, an integer from 0 to 11, default 11.
+    """
+    msg = f'compression must be one of {COMPRESSION_METHODS}.'
+    assert method in COMPRESSION_METHODS, msg
+
+    if method == 'gzip':
+        compressor = zlib.compressobj(
+            zlib.Z_DEFAULT_COMPRESSION if level is None else level,
+            zlib.DEFLATED,
+            GZIP_WBITS,
+        )
+        return compressor.compress(data) + compressor.flush()
+
+    if brotli is None:
+        raise ImportError('brotli compression requires the brotli package.')
+
+    if level is None:
+        return brotli.compress(data)
+
+    return brotli.compress(data, quality=level)
@@ -56,3 +56,8 @@ EDGE_INDICES32 = {
 }
 
 EXTENSION_HEADER = {'extensionId': '<B', 'extensionLength': '<I'}
+
+# Water masks are 256 x 256 cells, from 0 for land to 255 for water
+WATER_MASK_SIZE = 256
+WATER_MASK_LAND = 0
+WATER_MASK_WATER = 255
@@ -0,0 +1,205 @@
+"""Decode quantized mesh tiles
+
+Fixed-size sections are read with `struct`, and every array is created with
+`np.frombuffer` on the input, so undecoded data such as edge indices, oct
+encoded normals and the water mask are views on the input buffer rather than
+copies.
+
+https://github.com/CesiumGS/quantized-mesh
+"""
+import json
+from struct import unpack_from
+from typing import Any, Dict, Optional, Tuple, Union
+
+import attr
+import numpy as np
+
+from .constants import HEADER, NP_STRUCT_TYPES, VERTEX_DATA
+from .encode import HEADER_STRUCT, Bounds
+from .extensions import EXTENSION_HEADER_SIZE, EXTENSION_HEADER_STRUCT, ExtensionId
+from .normals import oct_decode
+from .util import zig_zag_decode
+
+ReadableBuffer = Union[bytes, bytearray, memoryview]
+
+
+@attr.s(kw_only=True)
+class DecodedTile:
+    """A decoded quantized mesh tile
+
+    Attributes:
+        - header: dict of header data, with the keys of `constants.HEADER`
+        - u, v, height: quantized vertex positions in the range 0-32767, as
+          arrays of dtype np.uint16
+        - indices: triangle indices, as an array of shape (-1, 3) and dtype
+          np.uint32
+        - west, south, east, north: indices of vertices on each edge. Views on
+          the input buffer.
+        - extensions: dict from extension id to a view on the raw extension
+          data, as an array of dtype np.uint8
+    """
+
+    header: Dict[str, float] = attr.ib()
+    u: np.ndarray = attr.ib()
+    v: np.ndarray = attr.ib()
+    height: np.ndarray = attr.ib()
+    indices: np.ndarray = attr.ib()
+    west: np.ndarray = attr.ib()
+    south: np.ndarray = attr.ib()
+    east: np.ndarray = attr.ib()
+    north: np.ndarray = attr.ib()
+    extensions: Dict[int, np.ndarray] = attr.ib(factory=dict)
+
+    @property
+    def vertex_normals(self) -> Optional[np.ndarray]:
+        """Oct-encoded vertex normals of shape (-1, 2), if present
+
+        Use `normals.oct_decode` to decode to unit vectors.
+        """
+        data = self.extensions.get(ExtensionId.VERTEX_NORMALS)
+        if data is None:
+            return None
+
+        return data.reshape(-1, 2)
+
+    @property
+    def water_mask(self) -> Optional[np.ndarray]:
+        """Water mask of shape (256, 256), or a single byte for a uniform mask"""
+        data = self.extensions.get(ExtensionId.WATER_MASK)
+        if data is None or len(data) == 1:
+            return data
+
+        return data.reshape(256, 256)
+
+    @property
+    def metadata(self) -> Optional[Dict[str, Any]]:
+        """Parsed metadata JSON, if present"""
+        data = self.extensions.get(ExtensionId.METADATA)
+        if data is None:
+            return None
+
+        # The spec prefixes the JSON with its length, but older versions of
+        # this library wrote the JSON alone
+        if len(data) >= 4:
+            (json_length,) = unpack_from('<I', data, 0)
+            if json_length == len(data) - 4:
+                data = data[4:]
+
+        return json.loads(data.tobytes())
+
+    def positions(self, bounds: Bounds) -> np.ndarray:
+        """Rescale vertices to positions
+
+        Args:
+            - bounds: the bounds passed when encoding, `[minx, miny, maxx, maxy]`
+
+        Returns:
+            ndarray of shape (-1, 3) and dtype np.float64
+        """
+        minx, miny, maxx, maxy = bounds
+        minh = self.header['minimumHeight']
+        maxh = self.header['maximumHeight']
+
+        positions = np.empty((len(self.u), 3), dtype=np.float64)
+        positions[:, 0] = minx + self.u / 32767 * (maxx - minx)
+        positions[:, 1] = miny + self.v / 32767 * (maxy - miny)
+        positions[:, 2] = minh + self.height / 32767 * (maxh - minh)
+        return positions
+
+    def normals(self) -> Optional[np.ndarray]:
+        """Decoded unit vertex normals of shape (-1, 3), if present"""
+        encoded = self.vertex_normals
+        if encoded is None:
+            return None
+
+        return oct_decode(encoded)
+
+
+def decode(buf: ReadableBuffer) -> DecodedTile:
+    """Decode a quantized mesh tile
+
+    Args:
+        - buf: the encoded, uncompressed tile. Any object supporting the buffer
+          protocol, such as `bytes`, a `memoryview` or an `mmap.mmap`. Gzipped
+          tiles aren't detected, as any bytes can start a valid tile, and must
+          be decompressed first, e.g. with `gzip.decompress`.
+
+    Returns:
+        DecodedTile
+    """
+    view = memoryview(buf).cast('B')
+
+    header = dict(zip(HEADER.keys(), HEADER_STRUCT.unpack_from(view, 0)))
+    offset = HEADER_STRUCT.size
+
+    (n_vertices,) = unpack_from(VERTEX_DATA['vertexCount'], view, offset)
+    offset += 4
+
+    vertices = np.frombuffer(view, dtype='<u2', count=3 * n_vertices, offset=offset)
+    offset += vertices.nbytes
+    u, v, height = (zig_zag_decode(arr) for arr in vertices.reshape(3, -1))
+
+    # If more than 65536 vertices, index data is uint32
+    index_32 = n_vertices > 65536
+    index_size = 4 if index_32 else 2
+    dtype = '<u4' if index_32 else '<u2'
+
+    # Skip padding before index data
+    offset += -offset % index_size
+
+    (n_triangles,) = unpack_from(NP_STRUCT_TYPES[np.uint32], view, offset)
+    offset += 4
+
+    codes = np.frombuffer(view, dtype=dtype, count=3 * n_triangles, offset=offset)
+    offset += codes.nbytes
+    indices = high_water_mark_decode(codes).reshape(-1, 3)
+
+    edges = []
+    for _ in range(4):
+        edge, offset = _read_edge(view, offset, dtype)
+        edges.append(edge)
+
+    extensions = {}
+    while offset < len(view):
+        ext_id, length = EXTENSION_HEADER_STRUCT.unpack_from(view, offset)
+        offset += EXTENSION_HEADER_SIZE
+        extensions[ext_id] = np.frombuffer(
+            view, dtype=np.uint8, count=length, offset=offset
+        )
+        offset += length
+
+    west, south, east, north = edges
+    return DecodedTile(
+        header=header,
+        u=u,
+        v=v,
+        height=height,
+        indices=indices,
+        west=west,
+        south=south,
+        east=east,
+        north=north,
+        extensions=extensions,
+    )
+
+
+def _read_edge(view: memoryview, offset: int, dtype: str) -> Tuple[np.ndarray, int]:
+    (count,) = unpack_from(NP_STRUCT_TYPES[np.uint32], view, offset)
+    offset += 4
+    edge = np.frombuffer(view, dtype=dtype, count=count, offset=offset)
+    return edge, offset + edge.nbytes
+
+
+def high_water_mark_decode(codes: np.ndarray) -> np.ndarray:
+    """Decode high-water mark encoded indices
+
+    Each index is the highest index seen so far minus its code, where every
+    code of 0 introduces a new highest index.
+
+    Returns:
+        ndarray of dtype np.uint32
+    """
+    is_new = codes == 0
+    # Highest index before each element
+    highest = np.cumsum(is_new, dtype=np.int64) - is_new
+    return (highest - codes).astype(np.uint32)
@@ -1,18 +1,37 @@
-from struct import pack
-from typing import Any, BinaryIO, Dict, Optional, Sequence, Tuple
+from mmap import mmap
+from struct import Struct, pack_into
+from typing import (
+    Any,
+    BinaryIO,
+    Dict,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
 
 import numpy as np
 
 from .bounding_sphere import bounding_sphere
+from .compression import compress
 from .constants import HEADER, NP_STRUCT_TYPES, VERTEX_DATA, WGS84
 from .ecef import to_ecef
 from .ellipsoid import Ellipsoid
-from .extensions import ExtensionBase
-from .occlusion import occlusion_point
-from .util import zig_zag_encode
-from .util_cy import encode_indices
+from .extensions import EncodeContext, ExtensionBase
+from .occlusion import OCCLUSION_METHODS, occlusion_point, occlusion_point_from_bounds
+from .stats import EncodeStats, stage
+from .util import resolve_num_threads
+from .util_cy import encode_indices, encode_vertices
 
 Bounds = Tuple[float, float, float, float]
+WritableBuffer = Union[bytearray, memoryview, mmap]
+
+# All header fields are contiguous, without padding
+HEADER_STRUCT = Struct('<' + ''.join(fmt.lstrip('<') for fmt in HEADER.values()))
+
+_NO_EDGE = np.empty(0, dtype=np.uint32)
 
 
 def encode(
@@ -22,8 +41,14 @@ def encode(
     *,
     bounds: Optional[Bounds] = None,
     sphere_method: Optional[str] = None,
+    occlusion_method: str = 'exact',
     ellipsoid: Ellipsoid = WGS84,
-    extensions: Sequence[ExtensionBase] = ()
+    extensions: Sequence[ExtensionBase] = (),
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    cartesian_positions: Optional[np.ndarray] = None,
+    num_threads: Optional[int] = 1,
+    stats: Optional[EncodeStats] = None,
 ) -> None:
     """Create bounding sphere from positions
 
@@ -37,6 +62,8 @@ def encode(
           are `0`, `1`, `2`, then that defines a triangle formed by the first 9
           values in `positions`, three for the first vertex (index `0`), three
           for the second vertex, and three for the third vertex.
+          Vertices must be numbered in the order they are first used by
+          `indices`; see `optimize_mesh`.
 
     Kwargs:
         - bounds (List[float], optional): a list of bounds, `[minx, miny, maxx,
@@ -44,7 +71,7 @@ def encode(
           `positions`.
         - sphere_method: a string designating the algorithm to use for creating
           the bounding sphere. Must be one of `'bounding_box'`, `'naive'`,
-          `'ritter'` or `None`.
+          `'ritter'`, `'epos'`, `'welzl'`, `'auto'` or `None`.
 
           - bounding_box: Finds the bounding box of all positions, then defines
             the center of the sphere as the center of the bounding box, and
@@ -67,10 +94,205 @@ def encode(
           - None: Runs both the naive and the ritter methods, then returns the
             smaller of the two. Since this runs both algorithms, it takes around
             500 µs on my computer
+          - epos: Finds the points with the smallest and largest projection on
+            7 directions, computes the exact smallest sphere containing them,
+            then enlarges it to contain every point. Usually as tight as
+            `welzl`, in about the time of `None`.
+          - welzl: Computes the exact smallest sphere containing all positions.
+            The tightest sphere, but slower than `epos` for large meshes.
+          - auto: Uses the tightest of the `welzl`, `epos`, `ritter` and
+            `bounding_box` methods expected to take less than 500 µs for the
+            number of positions.
+        - occlusion_method: the algorithm used to compute the horizon occlusion
+          point. Must be one of:
+
+          - exact: Finds the point needed to occlude every position. This is
+            the default.
+          - bounds: Computes a conservative point from points along the edges
+            of `bounds` at the maximum height of the tile, in constant time
+            regardless of the number of positions. The point is slightly
+            farther out than the exact one, so tiles are culled a little less
+            often. Falls back to `exact` for tiles spanning about a
+            hemisphere, which can't be occluded from every side.
         - ellipsoid: (`Ellipsoid`): ellipsoid defined by its semi-major `a`
           and semi-minor `b` axes. Default: WGS84 ellipsoid.
         - extensions: list of instances of the ExtensionBase class.
+        - compression: if provided, compress the encoded tile before writing.
+          Must be one of `'gzip'`, `'brotli'` or `None`. Brotli requires the
+          `brotli` package to be installed.
+        - compression_level: compression level passed to gzip or brotli. By
+          default, uses the default level of each library.
+        - cartesian_positions (ndarray[float], optional): `positions` already
+          converted to earth-centered, earth-fixed coordinates with
+          `ellipsoid`, as an array of shape (-1, 3). By default, computed once
+          from `positions` and shared by the header computations and by
+          extensions created from the same `positions`, such as
+          `VertexNormalsExtension`.
+        - num_threads: number of threads used to compute the bounding sphere,
+          the horizon occlusion point and vertex normals of a single mesh, or
+          None for one thread per CPU. Only worthwhile for meshes with hundreds
+          of thousands of vertices. The output is the same for any number of
+          threads. Default: 1.
+        - stats: an `EncodeStats` instance in which to record the wall time,
+          bytes written and memory allocated by each stage of encoding. Any
+          previous measurements are cleared. Default: None.
+    """
+    if stats is not None:
+        stats.reset()
+
+    sections = _prepare(
+        positions,
+        indices,
+        bounds=bounds,
+        sphere_method=sphere_method,
+        occlusion_method=occlusion_method,
+        ellipsoid=ellipsoid,
+        extensions=extensions,
+        cartesian_positions=cartesian_positions,
+        num_threads=num_threads,
+        stats=stats,
+    )
+
+    # Write the whole tile with a single call
+    buf = bytearray(_sections_size(sections))
+    _write_sections(buf, 0, sections, stats=stats)
+
+    if compression is not None:
+        with stage(stats, 'compress') as record:
+            buf = compress(buf, compression, compression_level)
+            record.nbytes = len(buf)
+
+    with stage(stats, 'write') as record:
+        f.write(buf)
+        record.nbytes = len(buf)
+
+    if stats is not None:
+        stats.nbytes = len(buf)
+
+
+def encode_into(
+    buffer: Union[bytearray, memoryview, mmap],
+    positions: np.ndarray,
+    indices: np.ndarray,
+    *,
+    offset: int = 0,
+    bounds: Optional[Bounds] = None,
+    sphere_method: Optional[str] = None,
+    occlusion_method: str = 'exact',
+    ellipsoid: Ellipsoid = WGS84,
+    extensions: Sequence[ExtensionBase] = (),
+    cartesian_positions: Optional[np.ndarray] = None,
+    num_threads: Optional[int] = 1,
+    stats: Optional[EncodeStats] = None,
+) -> int:
+    """Encode a mesh directly into a preallocated, writable buffer
+
+    Every section is written in place, without creating intermediate bytes
+    objects, so many tiles can be packed into a single arena. Use
+    `encoded_size` to find the number of bytes required.
+
+    Args:
+        - buffer: a writable buffer, such as a `bytearray`, a writable
+          `memoryview` or an `mmap.mmap`.
+        - positions, indices: see `encode`.
+
+    Kwargs:
+        - offset: byte offset in `buffer` at which to start writing.
+        - bounds, sphere_method, occlusion_method, ellipsoid, extensions,
+          cartesian_positions, num_threads, stats: see `encode`.
+
+    Returns:
+        The number of bytes written.
+    """
+    view = memoryview(buffer).cast('B')
+    assert not view.readonly, 'buffer must be writable.'
+
+    # Fail before computing anything if the buffer can't hold the tile without
+    # edge indices and extensions
+    n_vertices, n_triangles = np.size(positions) // 3, np.size(indices) // 3
+    size = _fixed_size(n_vertices, n_triangles, (_NO_EDGE,) * 4)
+    msg = f'buffer too small: at least {size} bytes required from offset {offset}.'
+    assert offset >= 0 and len(view) - offset >= size, msg
+
+    if stats is not None:
+        stats.reset()
+
+    sections = _prepare(
+        positions,
+        indices,
+        bounds=bounds,
+        sphere_method=sphere_method,
+        occlusion_method=occlusion_method,
+        ellipsoid=ellipsoid,
+        extensions=extensions,
+        cartesian_positions=cartesian_positions,
+        num_threads=num_threads,
+        stats=stats,
+    )
+
+    size = _sections_size(sections)
+    msg = f'buffer too small: {size} bytes required from offset {offset}.'
+    assert offset >= 0 and len(view) - offset >= size, msg
+
+    nbytes = _write_sections(view, offset, sections, stats=stats) - offset
+    if stats is not None:
+        stats.nbytes = nbytes
+
+    return nbytes
+
+
+def encoded_size(
+    positions: np.ndarray,
+    indices: np.ndarray,
+    *,
+    bounds: Optional[Bounds] = None,
+    extensions: Sequence[ExtensionBase] = (),
+) -> int:
+    """Compute the exact length in bytes of an encoded mesh
+
+    The header is not computed, but the number of vertices on each edge depends
+    on the quantized positions, so those are.
+
+    Args:
+        - positions, indices: see `encode`.
+
+    Kwargs:
+        - bounds, extensions: see `encode`. Must match the values passed to
+          `encode` or `encode_into`.
     """
+    positions = positions.reshape(-1, 3).astype(np.float32)
+    indices = indices.reshape(-1, 3)
+    edges = encode_vertices(positions, *quantization_range(positions, bounds))
+
+    return _fixed_size(positions.shape[0], indices.shape[0], edges) + sum(
+        ext.encoded_size() for ext in extensions
+    )
+
+
+class _Sections(NamedTuple):
+    header: Dict[str, Any]
+    vertices: np.ndarray
+    indices: np.ndarray
+    edges: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]
+    extensions: List[bytes]
+
+
+def _prepare(
+    positions: np.ndarray,
+    indices: np.ndarray,
+    *,
+    bounds: Optional[Bounds],
+    sphere_method: Optional[str],
+    occlusion_method: str,
+    ellipsoid: Ellipsoid,
+    extensions: Sequence[ExtensionBase],
+    cartesian_positions: Optional[np.ndarray] = None,
+    num_threads: Optional[int] = 1,
+    stats: Optional[EncodeStats] = None,
+) -> _Sections:
+    """Compute everything that needs to be written for a mesh"""
+    original_positions = positions
+
     # Convert to ndarray
     positions = positions.reshape(-1, 3).astype(np.float32)
     indices = indices.reshape(-1, 3).astype(np.uint32)
@@ -84,51 +306,221 @@ def encode(
     msg = 'extensions must have unique ids.'
     assert len({ext.id for ext in extensions}) == len(extensions), msg
 
-    header = compute_header(positions, sphere_method, ellipsoid=ellipsoid)
-    encode_header(f, header)
+    num_threads = resolve_num_threads(num_threads)
+
+    if stats is not None:
+        stats.n_vertices = positions.shape[0]
+        stats.n_triangles = indices.shape[0]
+
+    # Convert to earth-centered, earth-fixed coordinates once, for the header
+    # and for any extension created from the same positions. float64 positions
+    # are converted in double precision, as extensions would convert them.
+    if cartesian_positions is None:
+        with stage(stats, 'to_ecef'):
+            if original_positions.dtype == np.float64:
+                cartesian_positions = to_ecef(
+                    original_positions.reshape(-1, 3), ellipsoid=ellipsoid
+                )
+            else:
+                cartesian_positions = to_ecef(positions, ellipsoid=ellipsoid)
+    else:
+        cartesian_positions = cartesian_positions.reshape(-1, 3)
+
+    msg = 'cartesian_positions must have the same shape as positions.'
+    assert cartesian_positions.shape == positions.shape, msg
+
+    header = compute_header(
+        positions,
+        sphere_method,
+        occlusion_method=occlusion_method,
+        bounds=bounds,
+        ellipsoid=ellipsoid,
+        cartesian_positions=cartesian_positions.astype(np.float32, copy=False),
+        num_threads=num_threads,
+        stats=stats,
+    )
+
+    context = EncodeContext(
+        positions=original_positions,
+        cartesian_positions=cartesian_positions,
+        ellipsoid=ellipsoid,
+        num_threads=num_threads,
+    )
+
+    # Linear interpolation to range u, v, h from 0-32767, then delta and zig zag
+    # encoding, in one pass that also finds the vertices on each edge
+    with stage(stats, 'encode_vertices'):
+        vertices = np.empty((3, positions.shape[0]), dtype=np.uint16)
+        quant_range = quantization_range(positions, bounds)
+        edges = encode_vertices(positions, *quant_range, out=vertices)
+
+    encoded_exts = []
+    for ext in extensions:
+        with stage(stats, f'extension:{ext.id.name.lower()}') as record:
+            encoded = ext.with_context(context).encode()
+            record.nbytes = len(encoded)
+        encoded_exts.append(encoded)
 
-    # Linear interpolation to range u, v, h from 0-32767
-    positions = interp_positions(positions, bounds=bounds)
+    return _Sections(
+        header=header,
+        vertices=vertices,
+        indices=indices,
+        edges=edges,
+        extensions=encoded_exts,
+    )
 
-    n_vertices = positions.shape[0]
-    write_vertices(f, positions, n_vertices)
 
-    write_indices(f, indices, n_vertices)
+def _fixed_size(
+    n_vertices: int,
+    n_triangles: int,
+    edges: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+) -> int:
+    """Size in bytes of everything but the extensions"""
+    index_size = 4 if n_vertices > 65536 else 2
 
-    write_edge_indices(f, positions, n_vertices)
+    # Header, then vertex count and u, v, height arrays
+    size = HEADER_STRUCT.size + 4 + 3 * 2 * n_vertices
+    size += _padding(size, index_size)
 
-    for ext in extensions:
-        f.write(ext.encode())
+    # Triangle count and indices
+    size += 4 + 3 * n_triangles * index_size
+
+    # Count and indices for each edge
+    size += sum(4 + len(edge) * index_size for edge in edges)
+    return size
+
+
+def _sections_size(sections: _Sections) -> int:
+    size = _fixed_size(
+        sections.vertices.shape[1], sections.indices.shape[0], sections.edges
+    )
+    return size + sum(len(ext) for ext in sections.extensions)
+
+
+def _padding(offset: int, alignment: int) -> int:
+    """Number of bytes needed to align `offset`"""
+    return -offset % alignment
+
+
+def _write_sections(
+    buf: WritableBuffer,
+    offset: int,
+    sections: _Sections,
+    *,
+    stats: Optional[EncodeStats] = None,
+) -> int:
+    """Write all sections into buf, returning the offset after the last byte"""
+    start = offset
+    n_vertices = sections.vertices.shape[1]
+
+    with stage(stats, 'write_header') as record:
+        offset = write_header(buf, offset, sections.header)
+        record.nbytes = HEADER_STRUCT.size
+
+    with stage(stats, 'write_vertices') as record:
+        end = write_vertices(buf, offset, sections.vertices)
+        record.nbytes, offset = end - offset, end
+
+    # Includes the padding before index data
+    with stage(stats, 'write_indices') as record:
+        end = write_indices(buf, offset, sections.indices, n_vertices, start=start)
+        record.nbytes, offset = end - offset, end
+
+    with stage(stats, 'write_edge_indices') as record:
+        end = write_edge_indices(buf, offset, sections.edges, n_vertices)
+        record.nbytes, offset = end - offset, end
+
+    with stage(stats, 'write_extensions') as record:
+        for ext in sections.extensions:
+            buf[offset : offset + len(ext)] = ext
+            offset += len(ext)
+            record.nbytes += len(ext)
+
+    return offset
 
 
 def compute_header(
-    positions: np.ndarray, sphere_method: Optional[str], *, ellipsoid: Ellipsoid = WGS84
+    positions: np.ndarray,
+    sphere_method: Optional[str],
+    *,
+    occlusion_method: str = 'exact',
+    bounds: Optional[Bounds] = None,
+    ellipsoid: Ellipsoid = WGS84,
+    cartesian_positions: Optional[np.ndarray] = None,
+    num_threads: int = 1,
+    stats: Optional[EncodeStats] = None,
 ) -> Dict[str, Any]:
-    header = {}
-
-    cartesian_positions = to_ecef(positions, ellipsoid=ellipsoid)
+    """Compute header data
 
-    ecef_min_x = cartesian_positions[:, 0].min()
-    ecef_min_y = cartesian_positions[:, 1].min()
-    ecef_min_z = cartesian_positions[:, 2].min()
-    ecef_max_x = cartesian_positions[:, 0].max()
-    ecef_max_y = cartesian_positions[:, 1].max()
-    ecef_max_z = cartesian_positions[:, 2].max()
+    Args:
+        - positions: array of shape (-1, 3)
+        - sphere_method: see `encode`
 
-    header['centerX'] = (ecef_min_x + ecef_max_x) / 2
-    header['centerY'] = (ecef_min_y + ecef_max_y) / 2
-    header['centerZ'] = (ecef_min_z + ecef_max_z) / 2
+    Kwargs:
+        - occlusion_method, bounds: see `encode`. `bounds` is only used by the
+          `'bounds'` occlusion method.
+        - ellipsoid: see `encode`
+        - cartesian_positions: `positions` converted to earth-centered,
+          earth-fixed coordinates with `ellipsoid`. Computed if not provided.
+          Not modified.
+        - num_threads: number of threads. Default: 1.
+        - stats: an `EncodeStats` instance in which to record the
+          `compute_header`, `bounding_sphere` and `occlusion_point` stages.
+          Default: None.
+    """
+    msg = f'occlusion_method must be one of {OCCLUSION_METHODS}.'
+    assert occlusion_method in OCCLUSION_METHODS, msg
 
-    header['minimumHeight'] = positions[:, 2].min()
-    header['maximumHeight'] = positions[:, 2].max()
+    header = {}
 
-    center, radius = bounding_sphere(cartesian_positions, method=sphere_method)
+    if cartesian_positions is None:
+        with stage(stats, 'to_ecef'):
+            cartesian_positions = to_ecef(positions, ellipsoid=ellipsoid)
+
+    with stage(stats, 'compute_header'):
+        ecef_min_x = cartesian_positions[:, 0].min()
+        ecef_min_y = cartesian_positions[:, 1].min()
+        ecef_min_z = cartesian_positions[:, 2].min()
+        ecef_max_x = cartesian_positions[:, 0].max()
+        ecef_max_y = cartesian_positions[:, 1].max()
+        ecef_max_z = cartesian_positions[:, 2].max()
+
+        header['centerX'] = (ecef_min_x + ecef_max_x) / 2
+        header['centerY'] = (ecef_min_y + ecef_max_y) / 2
+        header['centerZ'] = (ecef_min_z + ecef_max_z) / 2
+
+        header['minimumHeight'] = positions[:, 2].min()
+        header['maximumHeight'] = positions[:, 2].max()
+
+    with stage(stats, 'bounding_sphere'):
+        center, radius = bounding_sphere(
+            cartesian_positions, method=sphere_method, num_threads=num_threads
+        )
     header['boundingSphereCenterX'] = center[0]
     header['boundingSphereCenterY'] = center[1]
     header['boundingSphereCenterZ'] = center[2]
     header['boundingSphereRadius'] = radius
 
-    occl_pt = occlusion_point(cartesian_positions, center, ellipsoid=ellipsoid)
+    with stage(stats, 'occlusion_point'):
+        occl_pt = None
+        if occlusion_method == 'bounds':
+            if not bounds:
+                minx, miny, _, maxx, maxy, _ = quantization_range(positions)
+                bounds = (minx, miny, maxx, maxy)
+            occl_pt = occlusion_point_from_bounds(
+                bounds, header['maximumHeight'], center, ellipsoid=ellipsoid
+            )
+
+        # Exact point, also used when the tile is too large for the bounds
+        # method
+        if occl_pt is None:
+            occl_pt = occlusion_point(
+                cartesian_positions,
+                center,
+                ellipsoid=ellipsoid,
+                num_threads=num_threads,
+            )
+
     header['horizonOcclusionPointX'] = occl_pt[0]
     header['horizonOcclusionPointY'] = occl_pt[1]
     header['horizonOcclusionPointZ'] = occl_pt[2]
@@ -143,21 +535,13 @@ def encode_header(f: BinaryIO, data: Dict[str, Any]) -> None:
         - f: Opened file descriptor for writing
         - data: dict of header data
     """
-    f.write(pack(HEADER['centerX'], data['centerX']))
-    f.write(pack(HEADER['centerY'], data['centerY']))
-    f.write(pack(HEADER['centerZ'], data['centerZ']))
-
-    f.write(pack(HEADER['minimumHeight'], data['minimumHeight']))
-    f.write(pack(HEADER['maximumHeight'], data['maximumHeight']))
+    f.write(HEADER_STRUCT.pack(*(data[key] for key in HEADER)))
 
-    f.write(pack(HEADER['boundingSphereCenterX'], data['boundingSphereCenterX']))
-    f.write(pack(HEADER['boundingSphereCenterY'], data['boundingSphereCenterY']))
-    f.write(pack(HEADER['boundingSphereCenterZ'], data['boundingSphereCenterZ']))
-    f.write(pack(HEADER['boundingSphereRadius'], data['boundingSphereRadius']))
 
-    f.write(pack(HEADER['horizonOcclusionPointX'], data['horizonOcclusionPointX']))
-    f.write(pack(HEADER['horizonOcclusionPointY'], data['horizonOcclusionPointY']))
-    f.write(pack(HEADER['horizonOcclusionPointZ'], data['horizonOcclusionPointZ']))
+def write_header(buf: WritableBuffer, offset: int, data: Dict[str, Any]) -> int:
+    """Write header data into buf at offset, returning the new offset"""
+    HEADER_STRUCT.pack_into(buf, offset, *(data[key] for key in HEADER))
+    return offset + HEADER_STRUCT.size
 
 
 def interp_positions(
@@ -174,6 +558,28 @@ def interp_positions(
     Returns:
         ndarray of shape (-1, 3) and dtype np.int16
     """
+    minx, miny, minh, maxx, maxy, maxh = quantization_range(positions, bounds)
+
+    u = np.interp(positions[:, 0], (minx, maxx), (0, 32767)).astype(np.int16)
+    v = np.interp(positions[:, 1], (miny, maxy), (0, 32767)).astype(np.int16)
+    h = np.interp(positions[:, 2], (minh, maxh), (0, 32767)).astype(np.int16)
+
+    return np.vstack([u, v, h]).T
+
+
+def quantization_range(
+    positions: np.ndarray, bounds: Optional[Bounds] = None
+) -> Tuple[float, float, float, float, float, float]:
+    """Find the range to rescale positions from
+
+    Args:
+        - positions
+        - bounds: If provided should be [minx, miny, maxx, maxy]
+
+    Returns:
+        minx, miny, minh, maxx, maxy, maxh
+    """
+    # Reducing each column separately is much faster than reducing along axis 0
     if bounds:
         minx, miny, maxx, maxy = bounds
     else:
@@ -185,119 +591,91 @@ def interp_positions(
     minh = positions[:, 2].min()
     maxh = positions[:, 2].max()
 
-    u = np.interp(positions[:, 0], (minx, maxx), (0, 32767)).astype(np.int16)
-    v = np.interp(positions[:, 1], (miny, maxy), (0, 32767)).astype(np.int16)
-    h = np.interp(positions[:, 2], (minh, maxh), (0, 32767)).astype(np.int16)
+    return minx, miny, minh, maxx, maxy, maxh
 
-    return np.vstack([u, v, h]).T
 
+def write_vertices(buf: WritableBuffer, offset: int, vertices: np.ndarray) -> int:
+    """Write vertex data into buf at offset, returning the new offset
 
-def write_vertices(f: BinaryIO, positions: np.ndarray, n_vertices: int) -> None:
-    assert positions.ndim == 2, 'positions must be 2 dimensions'
+    Args:
+        - buf: writable buffer
+        - offset: byte offset at which to write
+        - vertices: zig zag encoded u, v and height arrays, as an array of shape
+          (3, -1) and dtype np.uint16, as created by `encode_vertices`
+    """
+    assert vertices.ndim == 2, 'vertices must be 2 dimensions'
+    n_vertices = vertices.shape[1]
 
     # Write vertex count
-    f.write(pack(VERTEX_DATA['vertexCount'], n_vertices))
-
-    u = positions[:, 0]
-    v = positions[:, 1]
-    h = positions[:, 2]
+    pack_into(VERTEX_DATA['vertexCount'], buf, offset, n_vertices)
+    offset += 4
 
-    u_diff = u[1:] - u[:-1]
-    v_diff = v[1:] - v[:-1]
-    h_diff = h[1:] - h[:-1]
+    # The u, v and height arrays are contiguous. Must be uint16
+    out = np.ndarray(vertices.shape, dtype='<u2', buffer=buf, offset=offset)
+    out[:] = vertices
 
-    # Zig zag encode
-    u_zz = zig_zag_encode(u_diff).astype(np.uint16)
-    v_zz = zig_zag_encode(v_diff).astype(np.uint16)
-    h_zz = zig_zag_encode(h_diff).astype(np.uint16)
+    return offset + out.nbytes
 
-    # Write first value
-    f.write(pack(VERTEX_DATA['uVertexCount'], zig_zag_encode(u[0])))
-    # Write array. Must be uint16
-    f.write(u_zz.tobytes())
-
-    # Write first value
-    f.write(pack(VERTEX_DATA['vVertexCount'], zig_zag_encode(v[0])))
-    # Write array. Must be uint16
-    f.write(v_zz.tobytes())
-
-    # Write first value
-    f.write(pack(VERTEX_DATA['heightVertexCount'], zig_zag_encode(h[0])))
-    # Write array. Must be uint16
-    f.write(h_zz.tobytes())
 
+def write_indices(
+    buf: WritableBuffer,
+    offset: int,
+    indices: np.ndarray,
+    n_vertices: int,
+    *,
+    start: int = 0,
+) -> int:
+    """Write indices into buf at offset, returning the new offset
 
-def write_indices(f: BinaryIO, indices: np.ndarray, n_vertices: int) -> None:
-    """Write indices to file"""
+    Args:
+        - buf: writable buffer
+        - offset: byte offset at which to write
+        - indices: array of shape (-1, 3) and dtype np.uint32
+        - n_vertices: number of vertices in the mesh
+        - start: byte offset of the start of the tile, for alignment
+    """
     # If more than 65536 vertices, index data must be uint32
     index_32 = n_vertices > 65536
 
     # Enforce proper byte alignment
     # > padding is added before the IndexData to ensure 2 byte alignment for
     # > IndexData16 and 4 byte alignment for IndexData32.
-    required_offset = 4 if index_32 else 2
-    remainder = f.tell() % required_offset
-    if remainder:
-        # number of bytes to add
-        n_bytes = required_offset - remainder
-        # Write required number of bytes
-        # Not sure the best way to write empty bytes, so I'll just pad with
-        # ascii letters for now
-        b = ('a' * n_bytes).encode('ascii')
-        assert len(b) == n_bytes, 'Wrong number of bytes to pad'
-        f.write(b)
-
-    # Write number of triangles to file
+    n_bytes = _padding(offset - start, 4 if index_32 else 2)
+    buf[offset : offset + n_bytes] = bytes(n_bytes)
+    offset += n_bytes
+
+    # Write number of triangles
     n_triangles = indices.shape[0]
-    f.write(pack(NP_STRUCT_TYPES[np.uint32], n_triangles))
+    pack_into(NP_STRUCT_TYPES[np.uint32], buf, offset, n_triangles)
+    offset += 4
 
     # Encode indices using high water mark encoding
-    encoded_ind = encode_indices(indices.flatten())
-
-    # Write array. Must be either uint16 or uint32, depending on length of
-    # vertices
-    dtype = np.uint32 if index_32 else np.uint16
-    encoded_ind = encoded_ind.astype(dtype)
-    f.write(encoded_ind.tobytes())
-
+    # Must be either uint16 or uint32, depending on length of vertices
+    dtype = '<u4' if index_32 else '<u2'
+    out = np.ndarray(n_triangles * 3, dtype=dtype, buffer=buf, offset=offset)
+    out[:] = encode_indices(indices.flatten())
 
-def find_edge_indices(
-    positions: np.ndarray,
-) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
-    u = positions[:, 0]
-    v = positions[:, 1]
-
-    # np.where returns a tuple for each dimension
-    # Here we only care about the first
-    left = np.where(u == 0)[0]
-    bottom = np.where(v == 0)[0]
-    right = np.where(u == 32767)[0]
-    top = np.where(v == 32767)[0]
-
-    return left, bottom, right, top
+    return offset + out.nbytes
 
 
-def write_edge_indices(f: BinaryIO, positions: np.ndarray, n_vertices: int) -> None:
-    left, bottom, right, top = find_edge_indices(positions)
-
+def write_edge_indices(
+    buf: WritableBuffer,
+    offset: int,
+    edges: Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray],
+    n_vertices: int,
+) -> int:
+    """Write west, south, east and north edge indices, returning the new offset"""
     # If more than 65536 vertices, index data must be uint32
     index_32 = n_vertices > 65536
-    dtype = np.uint32 if index_32 else np.uint16
+    dtype = '<u4' if index_32 else '<u2'
 
     # No high-water mark encoding on edge indices
-    left = left.astype(dtype)
-    bottom = bottom.astype(dtype)
-    right = right.astype(dtype)
-    top = top.astype(dtype)
-
-    f.write(pack(NP_STRUCT_TYPES[np.uint32], len(left)))
-    f.write(left.tobytes())
-
-    f.write(pack(NP_STRUCT_TYPES[np.uint32], len(bottom)))
-    f.write(bottom.tobytes())
+    for edge in edges:
+        pack_into(NP_STRUCT_TYPES[np.uint32], buf, offset, len(edge))
+        offset += 4
 
-    f.write(pack(NP_STRUCT_TYPES[np.uint32], len(right)))
-    f.write(right.tobytes())
+        out = np.ndarray(len(edge), dtype=dtype, buffer=buf, offset=offset)
+        out[:] = edge
+        offset += out.nbytes
 
-    f.write(pack(NP_STRUCT_TYPES[np.uint32], len(top)))
-    f.write(top.tobytes())
+    return offset
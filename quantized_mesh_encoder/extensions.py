@@ -1,16 +1,32 @@
 import abc
 import json
+import pickle
+import threading
+from collections import OrderedDict
 from enum import IntEnum
-from struct import pack
-from typing import Dict, Union
+from struct import Struct, pack
+from typing import Any, Callable, Dict, Hashable, Optional, Union
 
 import attr
 import numpy as np
+from numpy.typing import DTypeLike
 
-from .constants import EXTENSION_HEADER, WGS84
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from .constants import EXTENSION_HEADER, WATER_MASK_LAND, WATER_MASK_WATER, WGS84
 from .ecef import to_ecef
 from .ellipsoid import Ellipsoid
-from .normals import compute_vertex_normals, oct_encode
+from .normals import compute_oct_vertex_normals
+
+EXTENSION_HEADER_STRUCT = Struct(
+    '<' + ''.join(fmt.lstrip('<') for fmt in EXTENSION_HEADER.values())
+)
+EXTENSION_HEADER_SIZE = EXTENSION_HEADER_STRUCT.size
+
+JSON_BACKENDS = ('json', 'orjson')
 
 
 class ExtensionId(IntEnum):
@@ -19,6 +35,24 @@ class ExtensionId(IntEnum):
     METADATA = 4
 
 
+@attr.s(frozen=True, kw_only=True)
+class EncodeContext:
+    """Data computed by `encode` that extensions can reuse
+
+    Attributes:
+        - positions: positions of the mesh, as passed to `encode`
+        - cartesian_positions: `positions` converted to earth-centered,
+          earth-fixed coordinates with `ellipsoid`, of shape (-1, 3)
+        - ellipsoid: ellipsoid passed to `encode`
+        - num_threads: number of threads passed to `encode`
+    """
+
+    positions: np.ndarray = attr.ib()
+    cartesian_positions: np.ndarray = attr.ib()
+    ellipsoid: Ellipsoid = attr.ib()
+    num_threads: int = attr.ib(1)
+
+
 @attr.s(kw_only=True)
 class ExtensionBase(metaclass=abc.ABCMeta):
     id: ExtensionId = attr.ib(validator=attr.validators.instance_of(ExtensionId))
@@ -28,6 +62,20 @@ class ExtensionBase(metaclass=abc.ABCMeta):
         """Return the encoded extension data"""
         ...
 
+    def encoded_size(self) -> int:
+        """Return the length in bytes of the encoded extension data"""
+        return len(self.encode())
+
+    def with_context(self, context: EncodeContext) -> 'ExtensionBase':
+        """Return an extension that reuses data computed by `encode`
+
+        `encode` calls this before encoding each extension. Extensions derived
+        from the same positions can, for example, use the earth-centered,
+        earth-fixed positions in `context` instead of converting them again. By
+        default, returns the extension unchanged.
+        """
+        return self
+
 
 @attr.s(kw_only=True)
 class VertexNormalsExtension(ExtensionBase):
@@ -37,6 +85,16 @@ class VertexNormalsExtension(ExtensionBase):
         indices: mesh indices
         positions: mesh positions
         ellipsoid: instance of Ellipsoid class
+        cartesian_positions: optional, mesh positions already converted to
+            earth-centered, earth-fixed coordinates with `ellipsoid`. Set by
+            `encode` when the extension is created from the encoded positions.
+        num_threads: optional, number of threads used to compute normals. By
+            default, the number of threads passed to `encode`, or 1 when
+            encoding the extension on its own.
+        dtype: np.float32 or np.float64, the precision in which normals are
+            summed before oct encoding. np.float32 halves the memory used, but
+            may change the encoding of a few normals by one unit. Default:
+            np.float64.
     """
 
     id: ExtensionId = attr.ib(
@@ -47,13 +105,30 @@ class VertexNormalsExtension(ExtensionBase):
     ellipsoid: Ellipsoid = attr.ib(
         WGS84, validator=attr.validators.instance_of(Ellipsoid)
     )
+    cartesian_positions: Optional[np.ndarray] = attr.ib(
+        None,
+        validator=attr.validators.optional(attr.validators.instance_of(np.ndarray)),
+    )
+    num_threads: Optional[int] = attr.ib(
+        None, validator=attr.validators.optional(attr.validators.instance_of(int))
+    )
+    dtype: DTypeLike = attr.ib(
+        np.float64, validator=attr.validators.in_((np.float32, np.float64))
+    )
 
     def encode(self) -> bytes:
         """Return encoded extension data"""
-        positions = self.positions.reshape(-1, 3)
-        cartesian_positions = to_ecef(positions, ellipsoid=self.ellipsoid)
-        normals = compute_vertex_normals(cartesian_positions, self.indices)
-        encoded = oct_encode(normals).tobytes('C')
+        cartesian_positions = self.cartesian_positions
+        if cartesian_positions is None:
+            positions = self.positions.reshape(-1, 3)
+            cartesian_positions = to_ecef(positions, ellipsoid=self.ellipsoid)
+
+        encoded = compute_oct_vertex_normals(
+            cartesian_positions,
+            self.indices,
+            num_threads=self.num_threads or 1,
+            dtype=self.dtype,
+        ).tobytes('C')
 
         buf = b''
         buf += pack(EXTENSION_HEADER['extensionId'], self.id.value)
@@ -62,13 +137,41 @@ class VertexNormalsExtension(ExtensionBase):
 
         return buf
 
+    def encoded_size(self) -> int:
+        """Return the length in bytes of the encoded extension data"""
+        # Two bytes per vertex
+        return EXTENSION_HEADER_SIZE + 2 * (self.positions.size // 3)
+
+    def with_context(self, context: EncodeContext) -> 'VertexNormalsExtension':
+        """Share ECEF positions and the number of threads of `encode`
+
+        Positions are only shared if they are the same array, of the same dtype
+        as `context.cartesian_positions`, converted with the same ellipsoid, so
+        that the encoded normals are unchanged.
+        """
+        changes = {}
+        if (
+            self.cartesian_positions is None
+            and self.positions is context.positions
+            and self.positions.dtype == context.cartesian_positions.dtype
+            and self.ellipsoid == context.ellipsoid
+        ):
+            changes['cartesian_positions'] = context.cartesian_positions
+
+        if self.num_threads is None:
+            changes['num_threads'] = context.num_threads
+
+        return attr.evolve(self, **changes) if changes else self
+
 
 @attr.s(kw_only=True)
 class WaterMaskExtension(ExtensionBase):
     """Water Mask Extension
 
     Kwargs:
-        data: Either a numpy ndarray or an integer between 0 and 255
+        data: Either a numpy ndarray or an integer between 0 and 255. An array
+            whose cells are all land (0) or all water (255) is encoded as a
+            single byte.
     """
 
     id: ExtensionId = attr.ib(
@@ -81,8 +184,12 @@ class WaterMaskExtension(ExtensionBase):
     def encode(self) -> bytes:
         encoded: bytes
         if isinstance(self.data, np.ndarray):
-            # Minify output
-            encoded = self.data.astype(np.uint8).tobytes('C')
+            mask = self.data.astype(np.uint8, copy=False)
+            value = _uniform_mask_value(mask)
+            if value is not None:
+                encoded = np.uint8(value).tobytes('C')
+            else:
+                encoded = mask.tobytes('C')
         elif isinstance(self.data, (np.uint8, int)):
             encoded = np.uint8(self.data).tobytes('C')
 
@@ -93,6 +200,15 @@ class WaterMaskExtension(ExtensionBase):
 
         return buf
 
+    def encoded_size(self) -> int:
+        """Return the length in bytes of the encoded extension data"""
+        if isinstance(self.data, np.ndarray):
+            mask = self.data.astype(np.uint8, copy=False)
+            if _uniform_mask_value(mask) is None:
+                return EXTENSION_HEADER_SIZE + mask.size
+
+        return EXTENSION_HEADER_SIZE + 1
+
 
 @attr.s(kw_only=True)
 class MetadataExtension(ExtensionBase):
@@ -100,6 +216,15 @@ class MetadataExtension(ExtensionBase):
 
     Kwargs:
         data: Either a dictionary or bytes. If a dictionary, json.dumps will be called to create bytes in UTF-8 encoding.
+        json_backend: `'json'` to serialize dictionaries with the standard
+            library, or `'orjson'` to use the faster `orjson` package, which
+            must be installed. orjson writes non-ASCII characters as UTF-8
+            rather than escaping them, and doesn't accept non-string keys.
+            Default: `'json'`.
+        cache: if `True`, look up the encoded bytes of dictionaries by content
+            in `METADATA_CACHE`, so that metadata shared by many tiles is only
+            serialized once. Not used with orjson, which serializes faster
+            than the content can be looked up. Default: `True`.
     """
 
     id: ExtensionId = attr.ib(
@@ -108,12 +233,31 @@ class MetadataExtension(ExtensionBase):
     data: Union[Dict, bytes] = attr.ib(
         validator=attr.validators.instance_of((dict, bytes))
     )
+    json_backend: str = attr.ib('json', validator=attr.validators.in_(JSON_BACKENDS))
+    cache: bool = attr.ib(True, validator=attr.validators.instance_of(bool))
 
     def encode(self) -> bytes:
+        if (
+            isinstance(self.data, bytes)
+            or not self.cache
+            or self.json_backend == 'orjson'
+        ):
+            return self._encode()
+
+        # Pickling is much faster than serializing with the json module, and
+        # gives the same bytes for dictionaries with the same content
+        try:
+            content = pickle.dumps(self.data, protocol=pickle.HIGHEST_PROTOCOL)
+        except (pickle.PicklingError, TypeError, AttributeError):
+            return self._encode()
+
+        # The encoded bytes start with the extension id
+        return METADATA_CACHE.get((self.id, content), self._encode)
+
+    def _encode(self) -> bytes:
         encoded: bytes
         if isinstance(self.data, dict):
-            # Minify output
-            encoded = json.dumps(self.data, separators=(',', ':')).encode()
+            encoded = _dumps_json(self.data, self.json_backend)
         elif isinstance(self.data, bytes):
             encoded = self.data
 
@@ -123,3 +267,84 @@ class MetadataExtension(ExtensionBase):
         buf += encoded
 
         return buf
+
+
+@attr.s(kw_only=True, eq=False)
+class EncodedCache:
+    """Least recently used cache of encoded extension bytes, keyed by content
+
+    Safe to use from many threads.
+
+    Kwargs:
+        maxsize: maximum number of entries. Default: 256.
+
+    Attributes:
+        - hits, misses: number of lookups that found or didn't find an entry
+    """
+
+    maxsize: int = attr.ib(256, validator=attr.validators.instance_of(int))
+    hits: int = attr.ib(0, init=False)
+    misses: int = attr.ib(0, init=False)
+    _entries: 'OrderedDict[Hashable, bytes]' = attr.ib(init=False, factory=OrderedDict)
+    _lock: threading.Lock = attr.ib(init=False, factory=threading.Lock)
+
+    def get(self, key: Hashable, encode: Callable[[], bytes]) -> bytes:
+        """Return the bytes cached for key, or cache and return `encode()`"""
+        with self._lock:
+            encoded = self._entries.get(key)
+            if encoded is not None:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return encoded
+
+            self.misses += 1
+
+        # Encode without holding the lock, so other threads aren't blocked
+        encoded = encode()
+
+        with self._lock:
+            self._entries[key] = encoded
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+        return encoded
+
+    def clear(self) -> None:
+        """Remove all entries and reset the hit and miss counts"""
+        with self._lock:
+            self._entries.clear()
+            self.hits = self.misses = 0
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+# Encoded metadata extensions, shared by all MetadataExtension instances
+METADATA_CACHE = EncodedCache()
+
+
+def _dumps_json(data: Any, backend: str) -> bytes:
+    """Serialize data to minified JSON"""
+    if backend == 'orjson':
+        if orjson is None:
+            raise ImportError('the orjson JSON backend requires the orjson package.')
+
+        return orjson.dumps(data)
+
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+def _uniform_mask_value(mask: np.ndarray) -> Optional[int]:
+    """Value of a water mask that is all land or all water, otherwise None"""
+    if mask.size == 0:
+        return None
+
+    # Most mixed masks differ at the corners, which is cheaper to check first
+    flat = mask.reshape(-1)
+    value = flat[0]
+    if value not in (WATER_MASK_LAND, WATER_MASK_WATER) or flat[-1] != value:
+        return None
+
+    return int(value) if mask.min() == mask.max() else None
@@ -0,0 +1,283 @@
+"""Encode regular grids of elevation
+
+For a grid of a given size, the triangulation, index data and edge indices are
+the same for every tile, as are the u and v arrays. They are computed once per
+grid size and cached, so that only the header and the height array are
+computed for each tile.
+"""
+from functools import lru_cache
+from typing import BinaryIO, Optional, Sequence
+
+import attr
+import numpy as np
+from numpy.typing import DTypeLike
+
+from .compression import compress
+from .constants import HEADER, WGS84
+from .ecef import to_ecef
+from .ellipsoid import Ellipsoid
+from .encode import (
+    HEADER_STRUCT,
+    Bounds,
+    _Sections,
+    _sections_size,
+    _write_sections,
+    compute_header,
+    write_header,
+)
+from .extensions import EXTENSION_HEADER_STRUCT, ExtensionBase, ExtensionId
+from .normals import oct_encode
+from .util import resolve_num_threads, zig_zag_encode
+from .util_cy import first_use_order, tipsify
+
+
+@attr.s(frozen=True, kw_only=True)
+class GridTopology:
+    """Encoded data shared by every grid of the same size
+
+    Attributes:
+        - order: index in the flattened grid of each vertex, in encoded order
+        - rows, cols: row and column of each vertex, in encoded order
+        - template: encoded tile with an empty header and height array
+    """
+
+    order: np.ndarray = attr.ib()
+    rows: np.ndarray = attr.ib()
+    cols: np.ndarray = attr.ib()
+    template: bytes = attr.ib()
+
+
+def encode_heightmap(
+    f: BinaryIO,
+    heights: np.ndarray,
+    *,
+    bounds: Bounds,
+    sphere_method: Optional[str] = None,
+    occlusion_method: str = 'exact',
+    ellipsoid: Ellipsoid = WGS84,
+    vertex_normals: bool = False,
+    extensions: Sequence[ExtensionBase] = (),
+    compression: Optional[str] = None,
+    compression_level: Optional[int] = None,
+    num_threads: Optional[int] = 1,
+) -> None:
+    """Encode a regular grid of elevations
+
+    Every grid cell is split into two triangles. Vertices are ordered for
+    vertex cache locality and high-water mark encoding.
+
+    `u` and `v` are the exact quantization of the grid, and the header is
+    computed from grid positions in double precision. `encode` rounds positions to
+    float32 first, so unless the bounds are exactly representable, its output
+    differs slightly for the same grid.
+
+    Args:
+        - f: a writable file-like object in which to write encoded bytes
+        - heights: (ndarray[float]): a 2D Numpy array of shape (rows, columns)
+          with at least two rows and two columns. The first row is the
+          northern edge of the tile and the first column is the western edge.
+
+    Kwargs:
+        - bounds (List[float]): a list of bounds, `[minx, miny, maxx, maxy]`,
+          of the outer vertices of the grid.
+        - sphere_method, occlusion_method, ellipsoid: see `encode`.
+        - vertex_normals: if `True`, include the vertex normals extension, with
+          normals computed from the grid by finite differences. Default:
+          `False`.
+        - extensions: list of instances of the ExtensionBase class.
+        - compression, compression_level, num_threads: see `encode`.
+    """
+    msg = 'heights must be a 2D array with at least two rows and columns.'
+    assert heights.ndim == 2 and min(heights.shape) >= 2, msg
+
+    msg = 'ellipsoid must be an instance of the Ellipsoid class.'
+    assert isinstance(ellipsoid, Ellipsoid), msg
+
+    msg = 'extensions must be instances of the Extension class.'
+    assert all(isinstance(ext, ExtensionBase) for ext in extensions), msg
+
+    ext_ids = [ext.id for ext in extensions]
+    if vertex_normals:
+        ext_ids.append(ExtensionId.VERTEX_NORMALS)
+
+    msg = 'extensions must have unique ids.'
+    assert len(set(ext_ids)) == len(ext_ids), msg
+
+    rows, cols = heights.shape
+    topology = grid_topology(rows, cols)
+    n_vertices = rows * cols
+
+    # Positions in double precision, to match the exact u and v of the
+    # template. Bounding spheres are computed in single precision, as in encode.
+    positions = grid_positions(heights, bounds, topology=topology, dtype=np.float64)
+    cartesian_positions = to_ecef(positions, ellipsoid=ellipsoid).astype(np.float32)
+    header = compute_header(
+        positions,
+        sphere_method,
+        occlusion_method=occlusion_method,
+        bounds=bounds,
+        ellipsoid=ellipsoid,
+        cartesian_positions=cartesian_positions,
+        num_threads=resolve_num_threads(num_threads),
+    )
+
+    encoded_exts = []
+    if vertex_normals:
+        normals = grid_vertex_normals(heights, bounds, ellipsoid=ellipsoid)
+        encoded = oct_encode(normals.reshape(-1, 3)[topology.order]).tobytes('C')
+        ext_header = EXTENSION_HEADER_STRUCT.pack(
+            ExtensionId.VERTEX_NORMALS.value, len(encoded)
+        )
+        encoded_exts.append(ext_header + encoded)
+
+    encoded_exts.extend(ext.encode() for ext in extensions)
+
+    buf = bytearray(len(topology.template) + sum(map(len, encoded_exts)))
+    buf[: len(topology.template)] = topology.template
+    write_header(buf, 0, header)
+
+    # Height array, after the vertex count, u and v arrays
+    offset = HEADER_STRUCT.size + 4 + 4 * n_vertices
+    out = np.ndarray(n_vertices, dtype='<u2', buffer=buf, offset=offset)
+    minh, maxh = header['minimumHeight'], header['maximumHeight']
+    h = np.interp(positions[:, 2], (minh, maxh), (0, 32767)).astype(np.int16)
+    out[:] = zig_zag_encode(np.diff(h, prepend=np.int16(0)))
+
+    offset = len(topology.template)
+    for ext in encoded_exts:
+        buf[offset : offset + len(ext)] = ext
+        offset += len(ext)
+
+    if compression is not None:
+        f.write(compress(buf, compression, compression_level))
+    else:
+        f.write(buf)
+
+
+@lru_cache(maxsize=16)
+def grid_topology(rows: int, cols: int) -> GridTopology:
+    """Compute and cache the encoded topology of a grid"""
+    n_vertices = rows * cols
+    grid = np.arange(n_vertices, dtype=np.uint32).reshape(rows, cols)
+
+    # Two counter-clockwise triangles per cell, with rows from north to south
+    nw, ne = grid[:-1, :-1].ravel(), grid[:-1, 1:].ravel()
+    sw, se = grid[1:, :-1].ravel(), grid[1:, 1:].ravel()
+    triangles = np.empty((2 * len(nw), 3), dtype=np.uint32)
+    triangles[0::2] = np.column_stack([sw, se, ne])
+    triangles[1::2] = np.column_stack([sw, ne, nw])
+
+    triangles = triangles[tipsify(triangles, n_vertices, 16)]
+
+    # remap is the new index of each grid vertex; order is its inverse
+    remap = first_use_order(triangles.ravel(), n_vertices)
+    order = np.argsort(remap).astype(np.uint32)
+    triangles = remap[triangles]
+
+    row, col = np.divmod(order, cols)
+    u = (col.astype(np.int64) * 32767 // (cols - 1)).astype(np.int16)
+    v = ((rows - 1 - row.astype(np.int64)) * 32767 // (rows - 1)).astype(np.int16)
+
+    vertices = np.zeros((3, n_vertices), dtype=np.uint16)
+    vertices[0] = zig_zag_encode(np.diff(u, prepend=np.int16(0)))
+    vertices[1] = zig_zag_encode(np.diff(v, prepend=np.int16(0)))
+
+    sections = _Sections(
+        header=dict.fromkeys(HEADER, 0),
+        vertices=vertices,
+        indices=triangles,
+        edges=(
+            np.flatnonzero(u == 0),
+            np.flatnonzero(v == 0),
+            np.flatnonzero(u == 32767),
+            np.flatnonzero(v == 32767),
+        ),
+        extensions=[],
+    )
+    template = bytearray(_sections_size(sections))
+    _write_sections(template, 0, sections)
+
+    for arr in (order, row, col):
+        arr.flags.writeable = False
+
+    return GridTopology(order=order, rows=row, cols=col, template=bytes(template))
+
+
+def grid_positions(
+    heights: np.ndarray,
+    bounds: Bounds,
+    *,
+    topology: Optional[GridTopology] = None,
+    dtype: DTypeLike = np.float32,
+) -> np.ndarray:
+    """Positions of each grid cell
+
+    Args:
+        - heights: 2D array of shape (rows, columns)
+        - bounds: `[minx, miny, maxx, maxy]` of the outer vertices of the grid
+        - topology: if provided, return positions in the order of its
+          vertices. Otherwise in the order of the flattened grid.
+        - dtype: dtype of the positions. Default: np.float32.
+
+    Returns:
+        ndarray of shape (-1, 3)
+    """
+    rows, cols = heights.shape
+    minx, miny, maxx, maxy = bounds
+    lon = np.linspace(minx, maxx, cols)
+    lat = np.linspace(maxy, miny, rows)
+
+    if topology is None:
+        row, col = np.divmod(np.arange(rows * cols), cols)
+        flat_heights = heights.ravel()
+    else:
+        row, col = topology.rows, topology.cols
+        flat_heights = heights.ravel()[topology.order]
+
+    positions = np.empty((rows * cols, 3), dtype=dtype)
+    positions[:, 0] = lon[col]
+    positions[:, 1] = lat[row]
+    positions[:, 2] = flat_heights
+    return positions
+
+
+def grid_vertex_normals(
+    heights: np.ndarray, bounds: Bounds, *, ellipsoid: Ellipsoid = WGS84
+) -> np.ndarray:
+    """Compute unit vertex normals of a grid by finite differences
+
+    Slopes are computed with central differences in the interior and one-sided
+    differences at the edges, in meters along the local east and north
+    directions, then rotated to earth-centered, earth-fixed coordinates.
+
+    Returns:
+        ndarray of shape (rows, cols, 3)
+    """
+    rows, cols = heights.shape
+    minx, miny, maxx, maxy = bounds
+    heights = heights.astype(np.float64)
+
+    lon = np.radians(np.linspace(minx, maxx, cols))[np.newaxis, :]
+    lat = np.radians(np.linspace(maxy, miny, rows))[:, np.newaxis]
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    sin_lon, cos_lon = np.sin(lon), np.cos(lon)
+
+    # Prime vertical and meridional radii of curvature
+    w = np.sqrt(1 - ellipsoid.e2 * sin_lat**2)
+    n_radius = ellipsoid.a / w
+    m_radius = ellipsoid.a * (1 - ellipsoid.e2) / w**3
+
+    # Grid spacing in meters. Rows go from north to south.
+    dx = np.radians(maxx - minx) / (cols - 1) * n_radius * cos_lat
+    dy = -np.radians(maxy - miny) / (rows - 1) * m_radius
+
+    d_east = np.gradient(heights, axis=1) / dx
+    d_north = np.gradient(heights, axis=0) / dy
+
+    # East, north, up components, rotated to ECEF
+    x = -d_east * -sin_lon + -d_north * -sin_lat * cos_lon + cos_lat * cos_lon
+    y = -d_east * cos_lon + -d_north * -sin_lat * sin_lon + cos_lat * sin_lon
+    z = -d_north * cos_lat + sin_lat
+
+    normals = np.stack([x, y, z], axis=-1)
+    return normals / np.linalg.norm(normals, axis=-1)[..., np.newaxis]
@@ -0,0 +1,297 @@
+"""Store encoded tiles in an MBTiles SQLite database
+
+A terrain layer of millions of tiles is a single local file instead of
+millions of small `.terrain` files. Tiles are deduplicated by a hash of their
+content, as many ocean and flat tiles are byte-identical: the `map` table maps
+tile coordinates to a `tile_id`, and the `images` table stores the bytes of
+each unique tile once. The `tiles` view joins them, as in the MBTiles schema
+used by other readers.
+
+Rows follow MBTiles, with `tile_row` the TMS `y` coordinate, which is also the
+`y` of Cesium terrain tiles.
+
+Resources:
+https://github.com/mapbox/mbtiles-spec/blob/master/1.3/spec.md
+https://www.sqlite.org/wal.html
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Mapping, Optional, Tuple, Union
+
+import numpy as np
+
+from .compression import COMPRESSION_METHODS, compress
+
+# Media type of quantized mesh tiles, stored as the `format` metadata
+MBTILES_FORMAT = 'application/vnd.quantized-mesh'
+
+PathLike = Union[str, 'os.PathLike[str]']
+Tile = Tuple[int, int, int, bytes]
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS metadata (name TEXT, value TEXT);
+CREATE UNIQUE INDEX IF NOT EXISTS metadata_name ON metadata (name);
+CREATE TABLE IF NOT EXISTS map (
+    zoom_level INTEGER, tile_column INTEGER, tile_row INTEGER, tile_id TEXT
+);
+CREATE UNIQUE INDEX IF NOT EXISTS map_index
+    ON map (zoom_level, tile_column, tile_row);
+CREATE TABLE IF NOT EXISTS images (tile_id TEXT, tile_data BLOB);
+CREATE UNIQUE INDEX IF NOT EXISTS images_id ON images (tile_id);
+CREATE VIEW IF NOT EXISTS tiles AS
+    SELECT map.zoom_level AS zoom_level, map.tile_column AS tile_column,
+        map.tile_row AS tile_row, images.tile_data AS tile_data
+    FROM map JOIN images ON images.tile_id = map.tile_id;
+"""
+
+
+class MBTilesWriter:
+    """Write encoded tiles to an MBTiles database
+
+    Tiles are buffered and inserted in one transaction per `batch_size` tiles,
+    with the database in write-ahead log mode while writing. Use as a context
+    manager, or call `close`, to write the last batch and return the database
+    to a single file that readers can open read-only.
+
+    A writer isn't thread-safe; write from one thread, e.g. the one consuming
+    `encode_many`.
+
+    Args:
+        - path: path of the database. An existing database is added to, and
+          tiles that exist are replaced.
+
+    Kwargs:
+        - batch_size: number of tiles per transaction. Default: 1000.
+        - compression: if provided, `'gzip'` or `'brotli'`, compress tiles
+          before storing them, and record the method as the `compression`
+          metadata.
+        - compression_level: passed to `compress`.
+        - metadata: values of the `metadata` table, added to `format`. Values
+          that aren't strings are stored as JSON, e.g. the output of
+          `layer_json`.
+
+    Attributes:
+        - n_tiles: number of tiles written
+        - n_unique: number of tiles whose content wasn't already stored
+    """
+
+    def __init__(
+        self,
+        path: PathLike,
+        *,
+        batch_size: int = 1000,
+        compression: Optional[str] = None,
+        compression_level: Optional[int] = None,
+        metadata: Optional[Mapping[str, Any]] = None,
+    ):
+        msg = 'batch_size must be positive.'
+        assert batch_size > 0, msg
+        if compression is not None:
+            msg = f'compression must be one of {COMPRESSION_METHODS}.'
+            assert compression in COMPRESSION_METHODS, msg
+
+        self.batch_size = batch_size
+        self.compression = compression
+        self.compression_level = compression_level
+        self.n_tiles = 0
+        self.n_unique = 0
+
+        self._rows: List[Tuple[int, int, int, str]] = []
+        self._images: Dict[str, bytes] = {}
+        self._closed = False
+
+        self.conn = sqlite3.connect(os.fspath(path), isolation_level=None)
+        self.conn.execute('PRAGMA journal_mode=WAL')
+        self.conn.execute('PRAGMA synchronous=NORMAL')
+        self.conn.executescript(_SCHEMA)
+
+        values: Dict[str, Any] = {'format': MBTILES_FORMAT}
+        if compression is not None:
+            values['compression'] = compression
+        values.update(metadata or {})
+        self.set_metadata(values)
+
+    def __enter__(self) -> 'MBTilesWriter':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def write(
+        self, x: int, y: int, z: int, data: bytes, *, compressed: bool = False
+    ) -> None:
+        """Add a tile
+
+        Args:
+            - x, y, z: tile coordinates
+            - data: encoded tile
+
+        Kwargs:
+            - compressed: if `True`, `data` is already compressed with the
+              writer's `compression`, e.g. by `encode_many`, and is stored as
+              it is. Default: `False`.
+        """
+        if self.compression is not None and not compressed:
+            data = compress(data, self.compression, self.compression_level)
+
+        tile_id = hashlib.blake2b(data, digest_size=16).hexdigest()
+        self._images[tile_id] = data
+        self._rows.append((int(z), int(x), int(y), tile_id))
+        if len(self._rows) >= self.batch_size:
+            self.flush()
+
+    def write_many(self, tiles: Iterable[Tile], *, compressed: bool = False) -> None:
+        """Add many tiles
+
+        Args:
+            - tiles: iterable of `(x, y, z, data)` tuples
+
+        Kwargs:
+            - compressed: see `write`
+        """
+        for x, y, z, data in tiles:
+            self.write(x, y, z, data, compressed=compressed)
+
+    def set_metadata(self, values: Mapping[str, Any]) -> None:
+        """Set values of the `metadata` table
+
+        Values that aren't strings are stored as JSON.
+        """
+        rows = [
+            (name, value if isinstance(value, str) else json.dumps(value))
+            for name, value in values.items()
+        ]
+        with self.conn:
+            self.conn.execute('BEGIN')
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO metadata (name, value) VALUES (?, ?)', rows
+            )
+
+    def flush(self) -> None:
+        """Insert buffered tiles in one transaction"""
+        if not self._rows:
+            return
+
+        with self.conn:
+            self.conn.execute('BEGIN')
+            cursor = self.conn.executemany(
+                'INSERT OR IGNORE INTO images (tile_id, tile_data) VALUES (?, ?)',
+                self._images.items(),
+            )
+            self.n_unique += cursor.rowcount
+            self.conn.executemany(
+                'INSERT OR REPLACE INTO map '
+                '(zoom_level, tile_column, tile_row, tile_id) VALUES (?, ?, ?, ?)',
+                self._rows,
+            )
+
+        self.n_tiles += len(self._rows)
+        self._rows = []
+        self._images = {}
+
+    def close(self) -> None:
+        """Insert buffered tiles, then leave write-ahead log mode and close"""
+        if self._closed:
+            return
+
+        self.flush()
+        self.conn.execute('PRAGMA journal_mode=DELETE')
+        self.conn.close()
+        self._closed = True
+
+
+class MBTilesReader:
+    """Read tiles from an MBTiles database
+
+    The database is opened read-only, with one connection per thread, so that
+    a reader can be shared by the threads of a tile server. Any MBTiles
+    database with a `tiles` table or view can be read.
+
+    Args:
+        - path: path of the database
+
+    Attributes:
+        - metadata: values of the `metadata` table
+        - compression: compression of stored tiles, e.g. `'gzip'` to serve them
+          with a `Content-Encoding: gzip` header, or None
+    """
+
+    def __init__(self, path: PathLike):
+        path = Path(path)
+        msg = f'{path} does not exist.'
+        assert path.exists(), msg
+
+        self.path = path
+        self._local = threading.local()
+        rows = self._conn().execute('SELECT name, value FROM metadata').fetchall()
+        self.metadata: Dict[str, str] = dict(rows)
+        self.compression: Optional[str] = self.metadata.get('compression')
+
+    def __enter__(self) -> 'MBTilesReader':
+        return self
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.close()
+
+    def get(self, x: int, y: int, z: int) -> Optional[bytes]:
+        """Stored bytes of a tile, or None if it doesn't exist"""
+        row = (
+            self._conn()
+            .execute(
+                'SELECT tile_data FROM tiles '
+                'WHERE zoom_level = ? AND tile_column = ? AND tile_row = ?',
+                (int(z), int(x), int(y)),
+            )
+            .fetchone()
+        )
+        return None if row is None else row[0]
+
+    def __contains__(self, tile: Tuple[int, int, int]) -> bool:
+        x, y, z = tile
+        return self.get(x, y, z) is not None
+
+    def tiles(self) -> Iterator[Tile]:
+        """Iterate over all tiles, as `(x, y, z, data)` tuples"""
+        cursor = self._conn().execute(
+            'SELECT tile_column, tile_row, zoom_level, tile_data FROM tiles'
+        )
+        yield from cursor
+
+    def available(self) -> Dict[int, Tuple[np.ndarray, np.ndarray]]:
+        """Tiles of each zoom level
+
+        Returns:
+            mapping from zoom level to the `x` and `y` arrays of its tiles, as
+            the `available` argument of `layer_json` and
+            `AvailabilityIndex.from_tiles`
+        """
+        rows = (
+            self._conn()
+            .execute('SELECT zoom_level, tile_column, tile_row FROM tiles')
+            .fetchall()
+        )
+        tiles = np.array(rows, dtype=np.int64).reshape(-1, 3)
+        return {
+            int(z): (tiles[tiles[:, 0] == z, 1], tiles[tiles[:, 0] == z, 2])
+            for z in np.unique(tiles[:, 0])
+        }
+
+    def close(self) -> None:
+        """Close the connection of the calling thread"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            uri = self.path.resolve().as_uri() + '?mode=ro'
+            conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+            self._local.conn = conn
+
+        return conn
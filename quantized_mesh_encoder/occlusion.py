@@ -1,7 +1,18 @@
+from typing import Optional, Tuple
+
 import numpy as np
 
 from .constants import WGS84
+from .ecef import to_ecef
 from .ellipsoid import Ellipsoid
+from .util_cy import occlusion_magnitudes, occlusion_max_magnitude
+
+OCCLUSION_METHODS = ('exact', 'bounds')
+
+# Number of points sampled along each edge of the tile by the `bounds` method
+BOUNDS_EDGE_SAMPLES = 9
+# Relative margin added to the magnitude of the `bounds` method
+BOUNDS_MARGIN = 1e-4
 
 
 def squared_norm(positions: np.ndarray) -> np.ndarray:
@@ -12,40 +23,118 @@ def squared_norm(positions: np.ndarray) -> np.ndarray:
     )
 
 
-def compute_magnitude(positions: np.ndarray, bounding_center: np.ndarray) -> np.ndarray:
-    magnitude_squared = squared_norm(positions)
-    magnitude = np.sqrt(magnitude_squared)
-
-    # Can make this cleaner by broadcasting division
-    direction = positions.copy()
-    direction[:, 0] /= magnitude
-    direction[:, 1] /= magnitude
-    direction[:, 2] /= magnitude
+def compute_magnitude(
+    positions: np.ndarray, bounding_center: np.ndarray, *, num_threads: int = 1
+) -> np.ndarray:
+    """Magnitude of the occlusion point needed to occlude each position
 
-    magnitude_squared = np.maximum(magnitude_squared, 1)
-    magnitude = np.maximum(magnitude, 1)
+    Positions and center must be scaled relative to the ellipsoid. Computed in
+    double precision, in a single pass over positions.
 
-    cos_alpha = np.dot(direction, bounding_center.T)
-    sin_alpha = np.linalg.norm(np.cross(direction, bounding_center), axis=1)
-    cos_beta = 1 / magnitude
-    sin_beta = np.sqrt(magnitude_squared - 1.0) * cos_beta
+    Returns:
+        ndarray of dtype np.float64
+    """
+    if positions.dtype not in (np.float32, np.float64):
+        positions = positions.astype(np.float64)
 
-    return 1 / (cos_alpha * cos_beta - sin_alpha * sin_beta)
+    center_x, center_y, center_z = (float(v) for v in bounding_center)
+    return occlusion_magnitudes(positions, center_x, center_y, center_z, num_threads)
 
 
 # https://cesiumjs.org/2013/05/09/Computing-the-horizon-occlusion-point/
 def occlusion_point(
-    positions: np.ndarray, bounding_center: np.ndarray, *, ellipsoid: Ellipsoid = WGS84
+    positions: np.ndarray,
+    bounding_center: np.ndarray,
+    *,
+    ellipsoid: Ellipsoid = WGS84,
+    num_threads: int = 1,
 ) -> np.ndarray:
+    """Compute the horizon occlusion point
+
+    Neither `positions` nor `bounding_center` is modified, so the same
+    earth-centered, earth-fixed positions can be shared with other computations.
+    Positions are scaled relative to the ellipsoid on the fly, in a single pass,
+    without temporary arrays.
+
+    Args:
+        - positions: earth-centered, earth-fixed positions of shape (-1, 3)
+        - bounding_center: center of the bounding sphere of `positions`
+
+    Kwargs:
+        - ellipsoid: (`Ellipsoid`): ellipsoid defined by its semi-major `a`
+          and semi-minor `b` axes. Default: WGS84 ellipsoid.
+        - num_threads: number of threads. Default: 1.
+    """
+    if positions.dtype not in (np.float32, np.float64):
+        positions = positions.astype(np.float64)
+
     cartesian_ellipsoid = np.array([ellipsoid.a, ellipsoid.a, ellipsoid.b])
-    # Scale positions relative to ellipsoid
-    positions /= cartesian_ellipsoid
+    # Scale center relative to ellipsoid, into a new array of the input dtype
+    bounding_center = np.divide(
+        bounding_center, cartesian_ellipsoid, out=np.empty_like(bounding_center)
+    )
 
-    # Scale center relative to ellipsoid
-    bounding_center /= cartesian_ellipsoid
+    # Maximum magnitude necessary for each position to not be visible
+    center_x, center_y, center_z = (float(v) for v in bounding_center)
+    magnitude = occlusion_max_magnitude(
+        positions,
+        ellipsoid.a,
+        ellipsoid.a,
+        ellipsoid.b,
+        center_x,
+        center_y,
+        center_z,
+        num_threads,
+    )
+
+    # Multiply by maximum magnitude and rescale to ellipsoid surface, in double
+    # precision even for a center of dtype np.float32
+    return bounding_center * np.float64(magnitude) * cartesian_ellipsoid
+
+
+def occlusion_point_from_bounds(
+    bounds: Tuple[float, float, float, float],
+    max_height: float,
+    bounding_center: np.ndarray,
+    *,
+    ellipsoid: Ellipsoid = WGS84,
+) -> Optional[np.ndarray]:
+    """Compute a conservative horizon occlusion point from the tile extent
+
+    The magnitude needed to occlude a position grows with its height and its
+    angle from the center of the bounding sphere, so within the tile it is
+    largest on the edges of `bounds` at `max_height`. The occlusion point is
+    computed from points sampled along those edges, in constant time, and moved
+    out by a small margin to account for the flattening of the ellipsoid.
+
+    Args:
+        - bounds: `[minx, miny, maxx, maxy]` of the tile, in degrees
+        - max_height: maximum height of the tile
+        - bounding_center: center of the bounding sphere of the tile
+
+    Kwargs:
+        - ellipsoid: (`Ellipsoid`): ellipsoid defined by its semi-major `a`
+          and semi-minor `b` axes. Default: WGS84 ellipsoid.
+
+    Returns:
+        The occlusion point, or `None` if part of the tile is beyond the horizon
+        of any point in the direction of the bounding sphere center, as for
+        tiles spanning a hemisphere.
+    """
+    minx, miny, maxx, maxy = bounds
+    x = np.linspace(minx, maxx, BOUNDS_EDGE_SAMPLES)
+    y = np.linspace(miny, maxy, BOUNDS_EDGE_SAMPLES)
+    lon = np.concatenate([x, x, np.full_like(y, minx), np.full_like(y, maxx)])
+    lat = np.concatenate([np.full_like(x, miny), np.full_like(x, maxy), y, y])
+    edges = np.column_stack([lon, lat, np.full_like(lon, max_height)])
+
+    cartesian_ellipsoid = np.array([ellipsoid.a, ellipsoid.a, ellipsoid.b])
+    scaled = to_ecef(edges, ellipsoid=ellipsoid) / cartesian_ellipsoid
+    center = np.asarray(bounding_center, dtype=np.float64) / cartesian_ellipsoid
 
-    # Find magnitudes necessary for each position to not be visible
-    magnitudes = compute_magnitude(positions, bounding_center)
+    magnitudes = compute_magnitude(scaled, center)
+    if not np.all(np.isfinite(magnitudes) & (magnitudes > 0)):
+        return None
 
-    # Multiply by maximum magnitude and rescale to ellipsoid surface
-    return bounding_center * magnitudes.max() * cartesian_ellipsoid
+    magnitude = magnitudes.max() * (1 + BOUNDS_MARGIN)
+    return center * magnitude * cartesian_ellipsoid
@@ -0,0 +1,64 @@
+"""
+Reorder meshes for smaller encoding and faster rendering
+
+Resources:
+https://gfx.cs.princeton.edu/pubs/Sander_2007_%3ETR/tipsy.pdf
+https://github.com/CesiumGS/quantized-mesh#index-data
+"""
+from typing import Tuple
+
+import numpy as np
+
+from .util_cy import first_use_order, tipsify
+
+
+def optimize_mesh(
+    positions: np.ndarray, indices: np.ndarray, *, cache_size: int = 16
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Reorder a mesh for vertex cache locality and high-water mark encoding
+
+    Triangles are first reordered with the Tipsify algorithm so that triangles
+    sharing vertices are close together, which improves GPU post-transform
+    vertex cache reuse when rendering. Vertices are then renumbered in the
+    order they are first used by the triangles. High-water mark encoding of
+    indices, as used by `encode`, is only valid and compact for meshes in this
+    order.
+
+    The mesh itself is unchanged: each output triangle has the same vertices,
+    with the same winding, as one input triangle. Vertices not used by any
+    triangle are kept, after all other vertices.
+
+    Call this before creating any extensions from `positions` and `indices`,
+    such as `VertexNormalsExtension`, so that they use the new order.
+
+    Args:
+        - positions: (ndarray[float]): either a 1D Numpy array or a 2D Numpy
+          array of shape (-1, 3) containing 3D positions.
+        - indices (ndarray[int]): either a 1D Numpy array or a 2D Numpy array of
+          shape (-1, 3) indicating triples of coordinates from `positions` to
+          make triangles.
+
+    Kwargs:
+        - cache_size: number of vertices in the target vertex cache. Default:
+          16.
+
+    Returns:
+        positions, indices: where positions is an array of shape (-1, 3) with
+        the same dtype as the input positions, and indices is an array of shape
+        (-1, 3) and dtype np.uint32.
+    """
+    positions = positions.reshape(-1, 3)
+    indices = np.ascontiguousarray(indices.reshape(-1, 3), dtype=np.uint32)
+    n_vertices = positions.shape[0]
+
+    msg = 'cache_size must be a positive integer.'
+    assert cache_size > 0, msg
+
+    triangle_order = tipsify(indices, n_vertices, cache_size)
+    indices = indices[triangle_order]
+
+    remap = first_use_order(indices.ravel(), n_vertices)
+    new_positions = np.empty_like(positions)
+    new_positions[remap] = positions
+
+    return new_positions, remap[indices]
@@ -0,0 +1,139 @@
+"""Simplify heightmaps into meshes with a bounded error
+
+A right-triangulated irregular network (RTIN) covers a square grid of
+`2^n + 1` vertices with two right triangles, and splits triangles in two
+along their hypotenuse until every grid vertex is within `max_error` of the
+mesh. Flat areas are covered by few large triangles, and rough areas by many
+small ones.
+
+Splits follow Martini, but the error of a triangle is the largest difference
+between the grid and the plane of the triangle, over every grid vertex it
+covers, rather than the error at the midpoint of its hypotenuse. `max_error`
+is then a bound on the error of the mesh at every grid vertex. Errors within
+the rounding error of the heights, relative to their magnitude, are ignored, so
+that sloped planes are merged as well as flat areas.
+
+The hierarchy of triangles only depends on the grid size, and is computed once
+per size. Errors are computed once per heightmap, in a single Cython pass, so
+that meshes for several maximum errors, e.g. for several zoom levels, only cost
+the extraction of the mesh.
+
+Resources:
+https://www.cs.ubc.ca/~will/papers/rtin.pdf
+https://github.com/mapbox/martini
+"""
+from functools import lru_cache
+from typing import Optional, Tuple
+
+import numpy as np
+
+from .encode import Bounds
+from .util_cy import rtin_coords, rtin_errors, rtin_mesh
+
+
+def heightmap_errors(heights: np.ndarray) -> np.ndarray:
+    """Compute the approximation error of each vertex of a heightmap
+
+    Args:
+        - heights: 2D array of shape (size, size), where size is `2^n + 1`
+
+    Returns:
+        ndarray of shape (size, size) and dtype np.float64, to pass as the
+        `errors` of `simplify_heightmap`
+    """
+    _check_heights(heights)
+
+    dtype = heights.dtype if heights.dtype in (np.float32, np.float64) else np.float64
+    heights = np.ascontiguousarray(heights, dtype=dtype)
+
+    size = heights.shape[0]
+    errors = np.zeros((size, size), dtype=np.float64)
+    rtin_errors(heights, triangle_coords(size), errors)
+    return errors
+
+
+def simplify_heightmap(
+    heights: np.ndarray,
+    bounds: Bounds,
+    *,
+    max_error: float = 0.0,
+    errors: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray]:
+    """Simplify a heightmap into a mesh with a bounded error
+
+    Every vertex of the grid is within `max_error` of the mesh, in height
+    units. Vertices are numbered in the order triangles first use them, so the
+    mesh is ready for `encode` without `optimize_mesh`.
+
+    Args:
+        - heights: 2D array of shape (size, size), where size is `2^n + 1`,
+          e.g. 65 or 257. The first row is the northern edge of the tile and
+          the first column is the western edge.
+        - bounds: `[minx, miny, maxx, maxy]` of the outer vertices of the grid
+
+    Kwargs:
+        - max_error: maximum difference in height between the grid and the
+          mesh. Default: 0, which only merges triangles of planar areas, up to
+          the rounding error of `heights`.
+        - errors: errors of `heightmap_errors(heights)`, to reuse them when
+          simplifying the same heightmap with several maximum errors
+
+    Returns:
+        positions, indices: where positions is an array of shape (-1, 3) and
+        dtype np.float32 of longitude, latitude and height, and indices is an
+        array of shape (-1, 3) and dtype np.uint32 of counter-clockwise
+        triangles
+    """
+    msg = 'max_error must be non-negative.'
+    assert max_error >= 0, msg
+
+    _check_heights(heights)
+    if errors is None:
+        errors = heightmap_errors(heights)
+
+    msg = 'errors must have the shape of heights.'
+    assert errors.shape == heights.shape, msg
+
+    max_error = max(max_error, rounding_error(heights))
+    order, indices = rtin_mesh(
+        np.ascontiguousarray(errors, dtype=np.float64), max_error
+    )
+
+    size = heights.shape[0]
+    minx, miny, maxx, maxy = bounds
+    row, col = np.divmod(order, size)
+
+    positions = np.empty((order.size, 3), dtype=np.float32)
+    positions[:, 0] = np.linspace(minx, maxx, size)[col]
+    positions[:, 1] = np.linspace(maxy, miny, size)[row]
+    positions[:, 2] = heights.ravel()[order]
+    return positions, indices
+
+
+def rounding_error(heights: np.ndarray) -> float:
+    """Largest error of planar areas of a heightmap due to rounding
+
+    Heights on a plane are rounded to the precision of their dtype, and their
+    errors are computed in double precision, which gives errors of a few units
+    in the last place of the largest height instead of 0.
+    """
+    dtype = heights.dtype if heights.dtype in (np.float32, np.float64) else np.float64
+    if heights.size == 0:
+        return 0.0
+
+    return 8 * float(np.finfo(dtype).eps) * float(np.abs(heights).max())
+
+
+@lru_cache(maxsize=8)
+def triangle_coords(size: int) -> np.ndarray:
+    """Compute and cache the hierarchy of triangles of a grid size"""
+    coords = rtin_coords(size)
+    coords.flags.writeable = False
+    return coords
+
+
+def _check_heights(heights: np.ndarray) -> None:
+    size = heights.shape[0] if heights.ndim == 2 else 0
+    msg = 'heights must be a square 2D array of size 2^n + 1.'
+    assert heights.shape == (size, size) and size >= 2, msg
+    assert (size - 1) & (size - 2) == 0, msg
@@ -0,0 +1,155 @@
+"""Per-stage timings of encoding a tile
+
+Pass an `EncodeStats` instance to `encode` or `encode_into` to record the wall
+time, bytes written and memory allocated by each stage of encoding, then export
+them to a metrics system, e.g. with `EncodeStats.as_dict`.
+
+Memory is measured with `tracemalloc`, and only while it is tracing, so that
+recording timings stays cheap. Start it with `tracemalloc.start()` to also
+record allocations. Stages measure the change in traced memory, and don't
+reset the peak traced by `tracemalloc`, which is global to the process and may
+be in use by the caller.
+"""
+import tracemalloc
+from time import perf_counter
+from typing import Any, ContextManager, Dict, List, Optional
+
+import attr
+
+
+@attr.s(kw_only=True)
+class StageStats:
+    """Measurements of one stage of encoding a tile
+
+    Attributes:
+        - name: name of the stage, such as `'compute_header'` or
+          `'write_vertices'`. Extensions are named `'extension:<name>'`, e.g.
+          `'extension:vertex_normals'`.
+        - seconds: wall time of the stage
+        - nbytes: number of bytes of the tile written by the stage, or 0 for
+          stages that only compute data
+        - allocated: memory allocated by Python and NumPy during the stage and
+          still held at its end, such as its output arrays, in bytes, or None
+          if `tracemalloc` isn't tracing. Negative if the stage frees more
+          than it allocates. Memory allocated directly by the Cython kernels
+          isn't traced. `tracemalloc` traces all threads, so stages running
+          concurrently in other threads, e.g. with `encode_many`, are counted
+          too.
+    """
+
+    name: str = attr.ib()
+    seconds: float = attr.ib(0.0)
+    nbytes: int = attr.ib(0)
+    allocated: Optional[int] = attr.ib(None)
+
+
+@attr.s(kw_only=True)
+class EncodeStats:
+    """Measurements of encoding a tile
+
+    Filled in by `encode` and `encode_into`. Stages are recorded in the order
+    they run, and don't overlap:
+
+    - `to_ecef`: conversion of positions to earth-centered, earth-fixed
+      coordinates, unless `cartesian_positions` is passed
+    - `compute_header`: extents and heights of the header
+    - `bounding_sphere`, `occlusion_point`: the rest of the header
+    - `encode_vertices`: quantization, delta and zig zag encoding of vertices
+    - `extension:<name>`: encoding of each extension, in `nbytes`
+    - `write_header`, `write_vertices`, `write_indices`, `write_edge_indices`,
+      `write_extensions`: writing each section of the tile
+    - `compress`: compression, with the compressed size in `nbytes`
+    - `write`: writing the tile to the file-like object, by `encode`
+
+    Attributes:
+        - n_vertices: number of vertices of the mesh
+        - n_triangles: number of triangles of the mesh
+        - nbytes: number of bytes written to the file-like object or buffer
+        - stages: list of `StageStats`
+    """
+
+    n_vertices: int = attr.ib(0)
+    n_triangles: int = attr.ib(0)
+    nbytes: int = attr.ib(0)
+    stages: List[StageStats] = attr.ib(factory=list)
+
+    @property
+    def seconds(self) -> float:
+        """Total wall time of all stages"""
+        return sum(stage.seconds for stage in self.stages)
+
+    def reset(self) -> None:
+        """Clear all measurements, so that the instance can be reused"""
+        self.n_vertices = self.n_triangles = self.nbytes = 0
+        self.stages = []
+
+    def as_dict(self) -> Dict[str, Any]:
+        """Measurements as a dict of plain Python values, keyed by stage name"""
+        return {
+            'n_vertices': self.n_vertices,
+            'n_triangles': self.n_triangles,
+            'nbytes': self.nbytes,
+            'seconds': self.seconds,
+            'stages': {
+                stage.name: {
+                    'seconds': stage.seconds,
+                    'nbytes': stage.nbytes,
+                    'allocated': stage.allocated,
+                }
+                for stage in self.stages
+            },
+        }
+
+
+class _Stage:
+    """Context manager timing a stage, returning its `StageStats`"""
+
+    __slots__ = ('stats', 'record', 'start', 'memory')
+
+    def __init__(self, stats: EncodeStats, name: str):
+        self.stats = stats
+        self.record = StageStats(name=name)
+
+    def __enter__(self) -> StageStats:
+        self.memory = None
+        if tracemalloc.is_tracing():
+            self.memory = tracemalloc.get_traced_memory()[0]
+
+        self.start = perf_counter()
+        return self.record
+
+    def __exit__(self, *exc_info: Any) -> None:
+        self.record.seconds = perf_counter() - self.start
+        if self.memory is not None and tracemalloc.is_tracing():
+            self.record.allocated = tracemalloc.get_traced_memory()[0] - self.memory
+
+        self.stats.stages.append(self.record)
+
+
+class _NullStage:
+    """Context manager for stages that aren't recorded"""
+
+    __slots__ = ()
+
+    # Shared by all unrecorded stages. Values written to it are ignored.
+    record = StageStats(name='')
+
+    def __enter__(self) -> StageStats:
+        return self.record
+
+    def __exit__(self, *exc_info: Any) -> None:
+        pass
+
+
+_NULL_STAGE = _NullStage()
+
+
+def stage(stats: Optional[EncodeStats], name: str) -> ContextManager[StageStats]:
+    """Context manager recording a stage in `stats`, if not None
+
+    Returns the `StageStats` of the stage, whose `nbytes` the caller may set.
+    """
+    if stats is None:
+        return _NULL_STAGE
+
+    return _Stage(stats, name)
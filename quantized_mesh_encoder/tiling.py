@@ -0,0 +1,334 @@
+"""Tiling schemes for terrain layers
+
+Tile coordinates follow Cesium's terrain layers: `z` is the zoom level, `x`
+increases from west to east and `y` from south to north, as in TMS. Two
+projections are supported:
+
+- `'EPSG:4326'`: the geographic tiling scheme, with two tiles of 180 by 180
+  degrees at level 0. This is the default for quantized mesh terrain.
+- `'EPSG:3857'`: the web mercator tiling scheme, with one tile at level 0.
+
+Every function accepts arrays of tiles, so that bounds of millions of tiles are
+computed in a few vectorized operations.
+
+Resources:
+https://github.com/CesiumGS/quantized-mesh#tiling-scheme-and-coordinate-system
+https://github.com/CesiumGS/cesium/blob/main/packages/engine/Source/Core/GeographicTilingScheme.js
+https://github.com/CesiumGS/cesium/blob/main/packages/engine/Source/Core/WebMercatorTilingScheme.js
+"""
+import json
+from typing import Any, Dict, List, Mapping, Optional, Sequence, TextIO, Tuple, Union
+
+import numpy as np
+
+from .encode import Bounds
+from .extensions import ExtensionBase, ExtensionId
+
+GEOGRAPHIC = 'EPSG:4326'
+WEB_MERCATOR = 'EPSG:3857'
+PROJECTIONS = (GEOGRAPHIC, WEB_MERCATOR)
+
+# Latitude at which the web mercator projection is square
+MAX_MERCATOR_LATITUDE = float(np.degrees(np.arctan(np.sinh(np.pi))))
+
+# Names of extensions in layer.json
+LAYER_EXTENSION_NAMES = {
+    ExtensionId.VERTEX_NORMALS: 'octvertexnormals',
+    ExtensionId.WATER_MASK: 'watermask',
+    ExtensionId.METADATA: 'metadata',
+}
+
+ArrayLike = Union[int, Sequence[int], np.ndarray]
+TileRange = Tuple[int, int, int, int]
+
+
+def tile_counts(z: int, *, projection: str = GEOGRAPHIC) -> Tuple[int, int]:
+    """Number of tiles along x and y at a zoom level"""
+    _check_projection(projection)
+    if projection == GEOGRAPHIC:
+        return 2 << z, 1 << z
+
+    return 1 << z, 1 << z
+
+
+def tile_bounds(
+    x: ArrayLike, y: ArrayLike, z: ArrayLike, *, projection: str = GEOGRAPHIC
+) -> np.ndarray:
+    """Compute bounds of tiles, as passed to `encode`
+
+    Args:
+        - x, y, z: tile coordinates, as integers or arrays that broadcast
+          together
+
+    Kwargs:
+        - projection: `'EPSG:4326'` or `'EPSG:3857'`. Default: `'EPSG:4326'`.
+
+    Returns:
+        ndarray of dtype np.float64 and shape `(..., 4)`, where the last axis is
+        `[minx, miny, maxx, maxy]` in degrees
+    """
+    _check_projection(projection)
+    x, y, z = np.broadcast_arrays(
+        np.asarray(x, dtype=np.int64),
+        np.asarray(y, dtype=np.int64),
+        np.asarray(z, dtype=np.int64),
+    )
+
+    bounds = np.empty(x.shape + (4,), dtype=np.float64)
+    if projection == GEOGRAPHIC:
+        size = 180.0 / np.exp2(z)
+        bounds[..., 0] = x * size - 180
+        bounds[..., 1] = y * size - 90
+        bounds[..., 2] = (x + 1) * size - 180
+        bounds[..., 3] = (y + 1) * size - 90
+        return bounds
+
+    n = np.exp2(z)
+    bounds[..., 0] = x / n * 360 - 180
+    bounds[..., 1] = _mercator_latitude(y / n)
+    bounds[..., 2] = (x + 1) / n * 360 - 180
+    bounds[..., 3] = _mercator_latitude((y + 1) / n)
+    return bounds
+
+
+def tile_range(z: int, bounds: Bounds, *, projection: str = GEOGRAPHIC) -> TileRange:
+    """Find the range of tiles at a zoom level that intersect bounds
+
+    Tiles that only touch `bounds` along an edge are not included.
+
+    Args:
+        - z: zoom level
+        - bounds: `[minx, miny, maxx, maxy]` in degrees
+
+    Kwargs:
+        - projection: `'EPSG:4326'` or `'EPSG:3857'`. Default: `'EPSG:4326'`.
+
+    Returns:
+        min_x, min_y, max_x, max_y: inclusive range of tile coordinates
+    """
+    n_x, n_y = tile_counts(z, projection=projection)
+    minx, miny, maxx, maxy = bounds
+
+    msg = 'bounds must be [minx, miny, maxx, maxy].'
+    assert minx <= maxx and miny <= maxy, msg
+
+    # Fractional tile coordinates of the bounds
+    fx = (np.array([minx, maxx]) + 180) / 360 * n_x
+    if projection == GEOGRAPHIC:
+        fy = (np.array([miny, maxy]) + 90) / 180 * n_y
+    else:
+        lat = np.radians(
+            np.clip([miny, maxy], -MAX_MERCATOR_LATITUDE, MAX_MERCATOR_LATITUDE)
+        )
+        fy = (1 + np.arcsinh(np.tan(lat)) / np.pi) / 2 * n_y
+
+    min_x, min_y = np.floor([fx[0], fy[0]]).astype(np.int64)
+    max_x, max_y = np.ceil([fx[1], fy[1]]).astype(np.int64) - 1
+
+    # Empty bounds on a tile edge still belong to one tile
+    max_x, max_y = max(max_x, min_x), max(max_y, min_y)
+
+    return (
+        int(np.clip(min_x, 0, n_x - 1)),
+        int(np.clip(min_y, 0, n_y - 1)),
+        int(np.clip(max_x, 0, n_x - 1)),
+        int(np.clip(max_y, 0, n_y - 1)),
+    )
+
+
+def tiles_in_range(
+    min_x: int, min_y: int, max_x: int, max_y: int
+) -> Tuple[np.ndarray, np.ndarray]:
+    """List every tile of an inclusive range
+
+    Returns:
+        x, y: arrays of dtype np.int64, ordered by y then x
+    """
+    xs = np.arange(min_x, max_x + 1, dtype=np.int64)
+    ys = np.arange(min_y, max_y + 1, dtype=np.int64)
+    return np.tile(xs, len(ys)), np.repeat(ys, len(xs))
+
+
+def parent_tiles(
+    x: ArrayLike, y: ArrayLike, z: ArrayLike
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find the parent of tiles
+
+    Returns:
+        x, y, z: parent tile coordinates, of the broadcast shape of the inputs
+    """
+    x, y, z = (np.asarray(arr, dtype=np.int64) for arr in (x, y, z))
+
+    msg = 'tiles at level 0 have no parent.'
+    assert np.all(z > 0), msg
+
+    return np.broadcast_arrays(x >> 1, y >> 1, z - 1)
+
+
+def child_tiles(
+    x: ArrayLike, y: ArrayLike, z: ArrayLike
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Find the four children of tiles
+
+    Returns:
+        x, y, z: child tile coordinates, of shape `(..., 4)` where `...` is the
+        broadcast shape of the inputs. Children are ordered southwest,
+        southeast, northwest, northeast.
+    """
+    x, y, z = (np.asarray(arr, dtype=np.int64)[..., np.newaxis] for arr in (x, y, z))
+    dx = np.array([0, 1, 0, 1])
+    dy = np.array([0, 0, 1, 1])
+    return np.broadcast_arrays(2 * x + dx, 2 * y + dy, z + 1)
+
+
+def compact_ranges(x: ArrayLike, y: ArrayLike) -> List[Dict[str, int]]:
+    """Compact tiles of one zoom level into rectangular ranges
+
+    Tiles on the same row with consecutive x are joined into runs, then runs
+    with the same start and end on consecutive rows are joined into rectangles.
+    The ranges cover exactly the input tiles, without overlap. Duplicate tiles
+    are allowed.
+
+    Args:
+        - x, y: arrays of tile coordinates
+
+    Returns:
+        list of `{'startX', 'startY', 'endX', 'endY'}` inclusive ranges, as in
+        the `available` field of `layer.json`
+    """
+    x = np.asarray(x, dtype=np.int64).ravel()
+    y = np.asarray(y, dtype=np.int64).ravel()
+    if x.size == 0:
+        return []
+
+    # Sort by row, then column, and drop duplicates
+    order = np.lexsort((x, y))
+    x, y = x[order], y[order]
+    keep = np.ones(x.size, dtype=bool)
+    keep[1:] = (x[1:] != x[:-1]) | (y[1:] != y[:-1])
+    x, y = x[keep], y[keep]
+
+    # Runs of consecutive x on each row
+    new_run = np.ones(x.size, dtype=bool)
+    new_run[1:] = (y[1:] != y[:-1]) | (x[1:] != x[:-1] + 1)
+    starts = np.flatnonzero(new_run)
+    ends = np.append(starts[1:], x.size) - 1
+    run_x0, run_x1, run_y = x[starts], x[ends], y[starts]
+
+    # Join runs with the same columns on consecutive rows
+    order = np.lexsort((run_y, run_x1, run_x0))
+    run_x0, run_x1, run_y = run_x0[order], run_x1[order], run_y[order]
+    new_rect = np.ones(run_y.size, dtype=bool)
+    new_rect[1:] = (
+        (run_x0[1:] != run_x0[:-1])
+        | (run_x1[1:] != run_x1[:-1])
+        | (run_y[1:] != run_y[:-1] + 1)
+    )
+    starts = np.flatnonzero(new_rect)
+    ends = np.append(starts[1:], run_y.size) - 1
+
+    rects = np.column_stack(
+        [run_x0[starts], run_y[starts], run_x1[starts], run_y[ends]]
+    )
+    rects = rects[np.lexsort((rects[:, 0], rects[:, 1]))]
+
+    return [
+        {'startX': x0, 'startY': y0, 'endX': x1, 'endY': y1}
+        for x0, y0, x1, y1 in rects.tolist()
+    ]
+
+
+def layer_json(
+    available: Mapping[int, Tuple[ArrayLike, ArrayLike]],
+    *,
+    name: str = '',
+    description: str = '',
+    version: str = '1.0.0',
+    attribution: str = '',
+    tiles: Sequence[str] = ('{z}/{x}/{y}.terrain?v={version}',),
+    bounds: Optional[Bounds] = None,
+    extensions: Sequence[Union[ExtensionBase, ExtensionId]] = (),
+    projection: str = GEOGRAPHIC,
+    metadata_availability: Optional[int] = None,
+) -> Dict[str, Any]:
+    """Create the `layer.json` metadata of a terrain layer
+
+    Args:
+        - available: mapping from zoom level to the `x` and `y` arrays of the
+          tiles that exist at that level. Levels without tiles may be omitted.
+
+    Kwargs:
+        - name, description, version, attribution: layer information
+        - tiles: URL templates of tiles, relative to `layer.json`
+        - bounds: `[minx, miny, maxx, maxy]` of the layer in degrees. Default:
+          the extent of the projection.
+        - extensions: extensions, or extension ids, included in tiles
+        - projection: `'EPSG:4326'` or `'EPSG:3857'`. Default: `'EPSG:4326'`.
+        - metadata_availability: number of levels below tiles at multiples of
+          this level whose availability is listed in the tiles' metadata
+          extension, e.g. with `AvailabilityIndex.metadata`. `available` then
+          only needs the levels up to `metadata_availability`. Default: None,
+          for layers listing all tiles in `layer.json`.
+
+    Returns:
+        dict that can be serialized with `json.dump`
+    """
+    _check_projection(projection)
+
+    if bounds is None:
+        max_lat = 90.0 if projection == GEOGRAPHIC else MAX_MERCATOR_LATITUDE
+        bounds = (-180.0, -max_lat, 180.0, max_lat)
+
+    ext_ids = [ext.id if isinstance(ext, ExtensionBase) else ext for ext in extensions]
+    max_zoom = max(available, default=0)
+
+    layer = {
+        'tilejson': '2.1.0',
+        'name': name,
+        'description': description,
+        'version': version,
+        'format': 'quantized-mesh-1.0',
+        'attribution': attribution,
+        'scheme': 'tms',
+        'extensions': [LAYER_EXTENSION_NAMES[ExtensionId(i)] for i in ext_ids],
+        'tiles': list(tiles),
+        'projection': projection,
+        'bounds': [float(v) for v in bounds],
+        'minzoom': 0,
+        'maxzoom': max_zoom,
+        'available': [
+            compact_ranges(*available[z]) if z in available else []
+            for z in range(max_zoom + 1)
+        ],
+    }
+    if metadata_availability is not None:
+        msg = 'metadata_availability must be positive.'
+        assert metadata_availability > 0, msg
+        layer['metadataAvailability'] = metadata_availability
+
+    return layer
+
+
+def write_layer_json(
+    f: TextIO, available: Mapping[int, Tuple[ArrayLike, ArrayLike]], **kwargs: Any
+) -> None:
+    """Write `layer.json` to a text file
+
+    Args:
+        - f: a writable text file-like object
+        - available: see `layer_json`
+
+    Kwargs:
+        passed to `layer_json`
+    """
+    json.dump(layer_json(available, **kwargs), f, separators=(',', ':'))
+
+
+def _check_projection(projection: str) -> None:
+    msg = f'projection must be one of {PROJECTIONS}.'
+    assert projection in PROJECTIONS, msg
+
+
+def _mercator_latitude(fy: np.ndarray) -> np.ndarray:
+    """Latitude in degrees of a fraction of the web mercator y extent"""
+    return np.degrees(np.arctan(np.sinh(np.pi * (2 * fy - 1))))
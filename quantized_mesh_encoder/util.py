@@ -1,4 +1,5 @@
-from typing import Union
+import os
+from typing import Optional, Union
 
 import numpy as np
 
@@ -21,3 +22,32 @@ def zig_zag_encode(
 
     encoded = np.bitwise_xor(np.right_shift(arr, 15), np.left_shift(arr, 1))
     return encoded.astype(np.uint16)
+
+
+def zig_zag_decode(arr: np.ndarray) -> np.ndarray:
+    """Decode a zig zag and delta encoded array of dtype np.uint16
+
+    Inverse of zig zag encoding the differences between consecutive values,
+    with the first value encoded as its difference from 0.
+
+    Returns:
+        ndarray of dtype np.uint16
+    """
+    values = arr.astype(np.int32)
+    values = (values >> 1) ^ -(values & 1)
+    np.cumsum(values, out=values)
+    return values.astype(np.uint16)
+
+
+def resolve_num_threads(num_threads: Optional[int]) -> int:
+    """Number of threads to use in parallel kernels
+
+    Args:
+        - num_threads: a positive integer, or None for one thread per CPU
+    """
+    if num_threads is None:
+        return os.cpu_count() or 1
+
+    msg = 'num_threads must be a positive integer or None.'
+    assert num_threads >= 1, msg
+    return num_threads
@@ -1,12 +1,77 @@
 # pylint: disable=unused-argument
-from typing import Tuple
+from typing import Optional, Tuple
 
 import numpy as np  # isort: skip
+from numpy.typing import DTypeLike  # isort: skip
 
 def encode_indices(indices: np.ndarray) -> np.ndarray: ...
 def ritter_second_pass(
+    positions: np.ndarray, center: np.ndarray, radius: float, num_threads: int = 1
+) -> Tuple[np.ndarray, float]: ...
+def extremal_points(positions: np.ndarray) -> np.ndarray: ...
+def grow_sphere(
     positions: np.ndarray, center: np.ndarray, radius: float
 ) -> Tuple[np.ndarray, float]: ...
+def min_sphere(
+    positions: np.ndarray, indices: Optional[np.ndarray] = None
+) -> Tuple[np.ndarray, float]: ...
 def add_vertex_normals(
     indices: np.ndarray, normals: np.ndarray, out: np.ndarray
 ) -> None: ...
+def vertex_normals(
+    positions: np.ndarray,
+    indices: np.ndarray,
+    num_threads: int = 1,
+    dtype: DTypeLike = np.float64,
+) -> np.ndarray: ...
+def oct_encode(normals: np.ndarray) -> np.ndarray: ...
+def oct_vertex_normals(
+    positions: np.ndarray,
+    indices: np.ndarray,
+    num_threads: int = 1,
+    dtype: DTypeLike = np.float64,
+) -> np.ndarray: ...
+def occlusion_magnitudes(
+    positions: np.ndarray,
+    center_x: float,
+    center_y: float,
+    center_z: float,
+    num_threads: int = 1,
+) -> np.ndarray: ...
+def occlusion_max_magnitude(
+    positions: np.ndarray,
+    radius_x: float,
+    radius_y: float,
+    radius_z: float,
+    center_x: float,
+    center_y: float,
+    center_z: float,
+    num_threads: int = 1,
+) -> float: ...
+def encode_vertices(
+    positions: np.ndarray,
+    minx: float,
+    miny: float,
+    minh: float,
+    maxx: float,
+    maxy: float,
+    maxh: float,
+    out: Optional[np.ndarray] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]: ...
+def tipsify(indices: np.ndarray, n_vertices: int, cache_size: int) -> np.ndarray: ...
+def first_use_order(indices: np.ndarray, n_vertices: int) -> np.ndarray: ...
+def rasterize_water(
+    positions: np.ndarray,
+    indices: np.ndarray,
+    minx: float,
+    miny: float,
+    maxx: float,
+    maxy: float,
+    sea_level: float,
+    out: np.ndarray,
+) -> None: ...
+def rtin_coords(grid_size: int) -> np.ndarray: ...
+def rtin_errors(heights: np.ndarray, coords: np.ndarray, out: np.ndarray) -> None: ...
+def rtin_mesh(
+    errors: np.ndarray, max_error: float
+) -> Tuple[np.ndarray, np.ndarray]: ...
@@ -1,92 +1,1635 @@
+# cython: freethreading_compatible=True
+"""Cython kernels
+
+Every kernel releases the GIL while it runs, so tiles can be encoded in
+parallel from threads. Kernels don't use any module state.
+"""
 import numpy as np
+
+cimport cython
 cimport numpy as np
+from cython.parallel cimport prange
+from libc.math cimport INFINITY, ceil, fabs, floor, sqrt
+from libc.stdlib cimport free, malloc, realloc
+from libc.string cimport memcpy
+
+
+cdef enum:
+    # Minimum number of items processed by each thread in parallel kernels
+    MIN_ITEMS_PER_THREAD = 16384
+    # Number of points tested in parallel against each Ritter sphere
+    RITTER_BLOCK_SIZE = 65536
+
+
+# Relative tolerance of sphere containment tests and degeneracy checks
+cdef double SPHERE_EPSILON = 1e-12
 
-def encode_indices(indices):
+
+cdef inline bint indices_below(
+    const np.uint32_t *indices, Py_ssize_t n, Py_ssize_t n_vertices
+) noexcept nogil:
+    """Check that all n indices are less than n_vertices"""
+    cdef Py_ssize_t i
+    for i in range(n):
+        if indices[i] >= n_vertices:
+            return False
+    return True
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def encode_indices(const np.uint32_t[:] indices):
     """High-water mark encoding
     """
-    cdef np.uint32_t[:] indices_view = indices
-    cdef np.uint32_t[:] out_view
-    cdef unsigned int highest, code
     cdef Py_ssize_t i
-    cdef unsigned short idx
+    cdef np.uint32_t highest = 0, code
 
-    out_view = np.zeros(len(indices), dtype=np.uint32)
-    highest = 0
-    for i in range(len(indices)):
-        out_view[i] = highest - indices_view[i]
-        if out_view[i] == 0:
-            highest += 1
+    out_arr = np.empty(indices.shape[0], dtype=np.uint32)
+    cdef np.uint32_t[::1] out = out_arr
 
-    return np.asarray(out_view, dtype=np.uint32)
+    with nogil:
+        for i in range(indices.shape[0]):
+            code = highest - indices[i]
+            out[i] = code
+            if code == 0:
+                highest += 1
 
+    return out_arr
 
-def ritter_second_pass(
-    np.ndarray[np.float32_t, ndim=2] positions,
-    np.ndarray[np.float32_t, ndim=1] center,
-    float radius):
 
-    cdef np.float32_t[:] dP
-    cdef float dist, dist2, mult
-    cdef Py_ssize_t i
-    cdef float radius2 = radius ** 2
+cdef inline float ritter_dist2(
+    float x, float y, float z, float cx, float cy, float cz
+) noexcept nogil:
+    cdef float dPx = x - cx
+    cdef float dPy = y - cy
+    cdef float dPz = z - cz
+    return dPx * dPx + dPy * dPy + dPz * dPz
+
+
+@cython.cdivision(True)
+cdef inline void ritter_enlarge(
+    float x, float y, float z, float dist2,
+    float *cx, float *cy, float *cz, float *radius
+) noexcept nogil:
+    """Enlarge the ball just enough to contain point i
+
+    This is done by drawing a line from the point to the current center and
+    extending it further to intersect the far side of the ball.
+    """
+    cdef float dist = <float>sqrt(<double>dist2)
+    cdef float mult
 
+    radius[0] = (radius[0] + dist) / 2
+    mult = (dist - radius[0]) / dist
+    cx[0] += mult * (x - cx[0])
+    cy[0] += mult * (y - cy[0])
+    cz[0] += mult * (z - cz[0])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def ritter_second_pass(
+    const np.float32_t[:, :] positions,
+    const np.float32_t[:] center,
+    float radius,
+    int num_threads=1):
+    """Grow a sphere until it contains all positions
+
+    Each point is tested for inclusion in the current ball, in order, and the
+    ball is enlarged for each point outside of it. With multiple threads,
+    blocks of points are tested in parallel against the current ball to find
+    the next point outside of it, so the result is the same for any number of
+    threads.
+    """
+    cdef Py_ssize_t n = positions.shape[0]
+    cdef Py_ssize_t i, start, stop, first
+    cdef float x, y, z, dist2
+    cdef float radius2 = radius * radius
     cdef float centerX = center[0]
     cdef float centerY = center[1]
     cdef float centerZ = center[2]
+    cdef char *outside
+    cdef int threads = parallel_threads(n, num_threads)
 
-    cdef float x, y, z
-    cdef float dPx, dPy, dPz
+    if threads == 1:
+        with nogil:
+            for i in range(n):
+                x = positions[i, 0]
+                y = positions[i, 1]
+                z = positions[i, 2]
+                dist2 = ritter_dist2(x, y, z, centerX, centerY, centerZ)
+                if dist2 > radius2:
+                    ritter_enlarge(
+                        x, y, z, dist2, &centerX, &centerY, &centerZ, &radius
+                    )
+                    radius2 = radius * radius
 
-    # Next, each point P of S is tested for inclusion in the current ball (by
-    # simply checking that its distance from the center is less than or equal to
-    # the radius).
-    for i in range(positions.shape[0]):
-        x = positions[i, 0]
-        y = positions[i, 1]
-        z = positions[i, 2]
+        return np.array([centerX, centerY, centerZ], dtype=np.float32), radius
 
-        dPx = x - centerX
-        dPy = y - centerY
-        dPz = z - centerZ
+    outside = <char *>malloc(RITTER_BLOCK_SIZE)
+    if outside == NULL:
+        raise MemoryError()
 
-        dist2 = (dPx ** 2) + (dPy ** 2) + (dPz ** 2)
+    try:
+        with nogil:
+            start = 0
+            while start < n:
+                stop = min(start + RITTER_BLOCK_SIZE, n)
+                for i in prange(start, stop, num_threads=threads, schedule='static'):
+                    outside[i - start] = ritter_dist2(
+                        positions[i, 0], positions[i, 1], positions[i, 2],
+                        centerX, centerY, centerZ
+                    ) > radius2
 
-        if dist2 <= radius2:
-            continue
+                # Points before the first one outside the ball are inside of it,
+                # as when testing sequentially
+                first = stop
+                for i in range(start, stop):
+                    if outside[i - start]:
+                        first = i
+                        break
 
-        # Enlarge ball
-        # This is done by drawing a line from Pk+1 to the current center Ck of
-        # Bk and extending it further to intersect the far side of Bk.
+                if first == stop:
+                    start = stop
+                    continue
 
-        # enlarge radius just enough
-        dist = np.sqrt(dist2)
-        radius = (radius + dist) / 2
-        radius2 = radius ** 2
-
-        mult = (dist - radius) / dist
-        centerX += (mult * dPx)
-        centerY += (mult * dPy)
-        centerZ += (mult * dPz)
+                i = first
+                x = positions[i, 0]
+                y = positions[i, 1]
+                z = positions[i, 2]
+                dist2 = ritter_dist2(x, y, z, centerX, centerY, centerZ)
+                ritter_enlarge(x, y, z, dist2, &centerX, &centerY, &centerZ, &radius)
+                radius2 = radius * radius
+                start = i + 1
+    finally:
+        free(outside)
 
     return np.array([centerX, centerY, centerZ], dtype=np.float32), radius
 
 
+cdef struct Sphere:
+    double x, y, z, r2
+
+
+cdef inline bint sphere_contains(const Sphere *s, const double *p) noexcept nogil:
+    cdef double dx = p[0] - s.x
+    cdef double dy = p[1] - s.y
+    cdef double dz = p[2] - s.z
+    return dx * dx + dy * dy + dz * dz <= s.r2 * (1 + SPHERE_EPSILON)
+
+
+cdef inline double dot(const double *a, const double *b) noexcept nogil:
+    return a[0] * b[0] + a[1] * b[1] + a[2] * b[2]
+
+
+cdef inline void cross(const double *a, const double *b, double *out) noexcept nogil:
+    out[0] = a[1] * b[2] - a[2] * b[1]
+    out[1] = a[2] * b[0] - a[0] * b[2]
+    out[2] = a[0] * b[1] - a[1] * b[0]
+
+
+cdef inline Sphere sphere_1(const double *a) noexcept nogil:
+    cdef Sphere s
+    s.x, s.y, s.z, s.r2 = a[0], a[1], a[2], 0
+    return s
+
+
+cdef inline Sphere sphere_2(const double *a, const double *b) noexcept nogil:
+    """Smallest sphere through two points"""
+    cdef Sphere s
+    s.x = (a[0] + b[0]) / 2
+    s.y = (a[1] + b[1]) / 2
+    s.z = (a[2] + b[2]) / 2
+    s.r2 = ((a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 + (a[2] - b[2]) ** 2) / 4
+    return s
+
+
+cdef inline Sphere larger(Sphere a, Sphere b) noexcept nogil:
+    return a if a.r2 >= b.r2 else b
+
+
+@cython.cdivision(True)
+cdef Sphere sphere_3(const double *a, const double *b, const double *c) noexcept nogil:
+    """Smallest sphere through three points
+
+    Its center is the center of the circumscribed circle of the triangle. For
+    collinear points, the sphere through the two farthest points is returned.
+    """
+    cdef double u[3]
+    cdef double v[3]
+    cdef double w[3]
+    cdef double uw[3]
+    cdef double vw[3]
+    cdef double uu, vv, ww
+    cdef Sphere s
+    cdef int k
+
+    for k in range(3):
+        u[k] = b[k] - a[k]
+        v[k] = c[k] - a[k]
+
+    cross(u, v, w)
+    uu, vv, ww = dot(u, u), dot(v, v), dot(w, w)
+    if ww <= SPHERE_EPSILON * uu * vv:
+        return larger(sphere_2(a, b), larger(sphere_2(a, c), sphere_2(b, c)))
+
+    # Center relative to a: (|u|² v × w + |v|² w × u) / 2|w|²
+    cross(v, w, vw)
+    cross(w, u, uw)
+    for k in range(3):
+        w[k] = (uu * vw[k] + vv * uw[k]) / (2 * ww)
+
+    s.x, s.y, s.z, s.r2 = a[0] + w[0], a[1] + w[1], a[2] + w[2], dot(w, w)
+    return s
+
+
+@cython.cdivision(True)
+cdef Sphere sphere_4(
+    const double *a, const double *b, const double *c, const double *d
+) noexcept nogil:
+    """Smallest sphere through four points
+
+    For coplanar points, the smallest sphere through three of the points that
+    contains the fourth is returned.
+    """
+    cdef double u[3]
+    cdef double v[3]
+    cdef double w[3]
+    cdef double vw[3]
+    cdef double wu[3]
+    cdef double uv[3]
+    cdef double uu, vv, ww, det
+    cdef Sphere s, best
+    cdef Sphere candidates[4]
+    cdef const double *points[4]
+    cdef int k
+
+    for k in range(3):
+        u[k] = b[k] - a[k]
+        v[k] = c[k] - a[k]
+        w[k] = d[k] - a[k]
+
+    cross(v, w, vw)
+    cross(w, u, wu)
+    cross(u, v, uv)
+    uu, vv, ww = dot(u, u), dot(v, v), dot(w, w)
+    det = dot(u, vw)
+
+    if det * det <= SPHERE_EPSILON * uu * vv * ww:
+        candidates[0] = sphere_3(b, c, d)
+        candidates[1] = sphere_3(a, c, d)
+        candidates[2] = sphere_3(a, b, d)
+        candidates[3] = sphere_3(a, b, c)
+        points[0], points[1], points[2], points[3] = a, b, c, d
+
+        best = candidates[0]
+        for k in range(1, 4):
+            best = larger(best, candidates[k])
+        for k in range(4):
+            if candidates[k].r2 >= best.r2:
+                continue
+            if sphere_contains(&candidates[k], points[k]):
+                best = candidates[k]
+        return best
+
+    # Center relative to a: (|u|² v × w + |v|² w × u + |w|² u × v) / 2 u·(v × w)
+    for k in range(3):
+        u[k] = (uu * vw[k] + vv * wu[k] + ww * uv[k]) / (2 * det)
+
+    s.x, s.y, s.z, s.r2 = a[0] + u[0], a[1] + u[1], a[2] + u[2], dot(u, u)
+    return s
+
+
+cdef enum:
+    # Number of directions of the EPOS-14 algorithm
+    EPOS_DIRECTIONS = 7
+
+
+cdef inline void epos_projections(float x, float y, float z, float *out) noexcept nogil:
+    """Projections on the coordinate axes and the diagonals of a cube"""
+    out[0] = x
+    out[1] = y
+    out[2] = z
+    out[3] = x + y + z
+    out[4] = x + y - z
+    out[5] = x - y + z
+    out[6] = x - y - z
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def extremal_points(const cython.floating[:, :] positions):
+    """Find the points with the smallest and largest projection on each of the
+    7 directions of the EPOS-14 algorithm
+
+    Returns:
+        ndarray of shape (14,) and dtype np.intp, with the indices of the points
+        with the smallest projection on each direction followed by those with
+        the largest
+    """
+    cdef Py_ssize_t n = positions.shape[0]
+    cdef Py_ssize_t i, k
+    cdef float proj[EPOS_DIRECTIONS]
+    cdef float lo[EPOS_DIRECTIONS]
+    cdef float hi[EPOS_DIRECTIONS]
+    cdef double ox, oy, oz
+
+    assert n > 0, 'positions must not be empty.'
+
+    out_arr = np.zeros(2 * EPOS_DIRECTIONS, dtype=np.intp)
+    cdef np.intp_t[::1] out = out_arr
+
+    with nogil:
+        # Projections of coordinates relative to the first point are precise
+        # enough in single precision
+        ox = positions[0, 0]
+        oy = positions[0, 1]
+        oz = positions[0, 2]
+        epos_projections(0, 0, 0, lo)
+        memcpy(hi, lo, sizeof(lo))
+
+        for i in range(1, n):
+            epos_projections(
+                <float>(positions[i, 0] - ox),
+                <float>(positions[i, 1] - oy),
+                <float>(positions[i, 2] - oz),
+                proj,
+            )
+            for k in range(EPOS_DIRECTIONS):
+                if proj[k] < lo[k]:
+                    lo[k] = proj[k]
+                    out[k] = i
+                elif proj[k] > hi[k]:
+                    hi[k] = proj[k]
+                    out[EPOS_DIRECTIONS + k] = i
+
+    return out_arr
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def grow_sphere(
+    const cython.floating[:, :] positions,
+    const double[:] center,
+    double radius):
+    """Grow a sphere until it contains all positions, in double precision
+
+    As in the second pass of Ritter's algorithm, the sphere is enlarged just
+    enough to contain each point outside of it, in order.
+    """
+    cdef Py_ssize_t n = positions.shape[0]
+    cdef Py_ssize_t i
+    cdef double cx = center[0]
+    cdef double cy = center[1]
+    cdef double cz = center[2]
+    cdef double dx, dy, dz, dist, dist2, mult
+    cdef double radius2 = radius * radius
+
+    with nogil:
+        for i in range(n):
+            dx = positions[i, 0] - cx
+            dy = positions[i, 1] - cy
+            dz = positions[i, 2] - cz
+            dist2 = dx * dx + dy * dy + dz * dz
+            if dist2 > radius2:
+                dist = sqrt(dist2)
+                radius = (radius + dist) / 2
+                mult = (dist - radius) / dist
+                cx += mult * dx
+                cy += mult * dy
+                cz += mult * dz
+                radius2 = radius * radius
+
+    return np.array([cx, cy, cz], dtype=np.float64), radius
+
+
+cdef inline np.uint64_t xorshift64(np.uint64_t *state) noexcept nogil:
+    state[0] ^= state[0] << 13
+    state[0] ^= state[0] >> 7
+    state[0] ^= state[0] << 17
+    return state[0]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def min_sphere(
+    const cython.floating[:, :] positions, const np.intp_t[::1] indices=None):
+    """Exact smallest sphere containing the given positions
+
+    Implements Welzl's randomized incremental algorithm, iteratively: each
+    point outside of the current sphere must be on the boundary of the smallest
+    sphere containing it and the points before it, which is found by the same
+    process with up to four boundary points. Points are shuffled first, with a
+    fixed seed, which gives an expected linear running time and a deterministic
+    result.
+
+    Coordinates are computed in double precision, relative to the first point.
+    The radius is then set to the largest distance from the center to any
+    point, so that rounding errors never leave a point outside.
+
+    Args:
+        - positions: array of shape (-1, 3)
+        - indices: indices of the positions to include. Default: all positions.
+
+    Returns:
+        center, radius: center as an ndarray of shape (3,) and dtype np.float64
+    """
+    cdef Py_ssize_t n_positions = positions.shape[0]
+    cdef Py_ssize_t n = n_positions if indices is None else indices.shape[0]
+    cdef Py_ssize_t i, j, k, l, idx
+    cdef double ox, oy, oz, dx, dy, dz, tmp, max_dist2 = 0
+    cdef double *p
+    cdef np.uint64_t state = 0x9E3779B97F4A7C15
+    cdef Sphere s
+    cdef bint valid = True
+
+    assert n > 0, 'positions must not be empty.'
+
+    if indices is not None:
+        with nogil:
+            for i in range(n):
+                if indices[i] < 0 or indices[i] >= n_positions:
+                    valid = False
+                    break
+
+        assert valid, 'indices must be valid indices into positions.'
+
+    p = <double *>malloc(3 * n * sizeof(double))
+    if p == NULL:
+        raise MemoryError()
+
+    try:
+        with nogil:
+            idx = 0 if indices is None else indices[0]
+            ox = positions[idx, 0]
+            oy = positions[idx, 1]
+            oz = positions[idx, 2]
+            for i in range(n):
+                idx = i if indices is None else indices[i]
+                p[3 * i] = positions[idx, 0] - ox
+                p[3 * i + 1] = positions[idx, 1] - oy
+                p[3 * i + 2] = positions[idx, 2] - oz
+
+            # Fisher-Yates shuffle
+            for i in range(n - 1, 0, -1):
+                j = <Py_ssize_t>(xorshift64(&state) % <np.uint64_t>(i + 1))
+                for k in range(3):
+                    tmp = p[3 * i + k]
+                    p[3 * i + k] = p[3 * j + k]
+                    p[3 * j + k] = tmp
+
+            s = sphere_1(p)
+            for i in range(1, n):
+                if sphere_contains(&s, &p[3 * i]):
+                    continue
+                s = sphere_1(&p[3 * i])
+                for j in range(i):
+                    if sphere_contains(&s, &p[3 * j]):
+                        continue
+                    s = sphere_2(&p[3 * i], &p[3 * j])
+                    for k in range(j):
+                        if sphere_contains(&s, &p[3 * k]):
+                            continue
+                        s = sphere_3(&p[3 * i], &p[3 * j], &p[3 * k])
+                        for l in range(k):
+                            if not sphere_contains(&s, &p[3 * l]):
+                                s = sphere_4(&p[3 * i], &p[3 * j], &p[3 * k], &p[3 * l])
+
+            for i in range(n):
+                dx = p[3 * i] - s.x
+                dy = p[3 * i + 1] - s.y
+                dz = p[3 * i + 2] - s.z
+                max_dist2 = max(max_dist2, dx * dx + dy * dy + dz * dz)
+    finally:
+        free(p)
+
+    center = np.array([ox + s.x, oy + s.y, oz + s.z], dtype=np.float64)
+    return center, sqrt(max_dist2)
+
+
 # Cython implementation of:
 # vertex_normals = np.zeros(positions.shape, dtype=np.float32)
 # for triangle, face_norm in zip(indices, weighted_face_normals):
 #     for pos in triangle:
 #         vertex_normals[pos] += face_norm
+@cython.boundscheck(False)
+@cython.wraparound(False)
 def add_vertex_normals(
-    np.ndarray[np.uint32_t, ndim=2] indices,
-    np.ndarray[np.float64_t, ndim=2] normals,
-    np.ndarray[np.float64_t, ndim=2] out):
+    const np.uint32_t[:, ::1] indices,
+    const np.float64_t[:, :] normals,
+    np.float64_t[:, :] out):
 
-    cdef long long indices_length = indices.shape[0]
     cdef Py_ssize_t i, j, k
-    cdef long long vertex
+    cdef np.uint32_t vertex
+    cdef bint valid
+
+    assert normals.shape[0] == indices.shape[0], 'one normal per triangle required'
+    assert indices.shape[1] == 3 and normals.shape[1] == 3 and out.shape[1] == 3
+
+    with nogil:
+        valid = indices_below(&indices[0, 0], indices.shape[0] * 3, out.shape[0])
+        if valid:
+            for i in range(indices.shape[0]):
+                for j in range(3):
+                    vertex = indices[i, j]
+                    for k in range(3):
+                        out[vertex, k] += normals[i, k]
+
+    assert valid, 'index out of range of out'
+
+
+ctypedef fused normal_t:
+    np.float32_t
+    np.float64_t
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef inline void face_normal(
+    const cython.floating[:, :] positions,
+    np.uint32_t a, np.uint32_t b, np.uint32_t c,
+    normal_t *out
+) noexcept nogil:
+    """Normal of a triangle, scaled by its area, rounded to normal_t"""
+    cdef double abx, aby, abz, acx, acy, acz, nx, ny, nz, area
+
+    abx = <double>positions[b, 0] - <double>positions[a, 0]
+    aby = <double>positions[b, 1] - <double>positions[a, 1]
+    abz = <double>positions[b, 2] - <double>positions[a, 2]
+    acx = <double>positions[c, 0] - <double>positions[a, 0]
+    acy = <double>positions[c, 1] - <double>positions[a, 1]
+    acz = <double>positions[c, 2] - <double>positions[a, 2]
+
+    nx = aby * acz - abz * acy
+    ny = abz * acx - abx * acz
+    nz = abx * acy - aby * acx
+
+    # The cross product has the length of twice the triangle's area
+    area = sqrt(nx * nx + ny * ny + nz * nz) / 2
+    out[0] = <normal_t>(nx * area)
+    out[1] = <normal_t>(ny * area)
+    out[2] = <normal_t>(nz * area)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef inline void normalize(normal_t[:, ::1] out, Py_ssize_t v) noexcept nogil:
+    cdef double x = out[v, 0], y = out[v, 1], z = out[v, 2]
+    cdef double norm = sqrt(x * x + y * y + z * z)
+    out[v, 0] = <normal_t>(x / norm)
+    out[v, 1] = <normal_t>(y / norm)
+    out[v, 2] = <normal_t>(z / norm)
 
-    for i in range(indices_length):
+
+@cython.cdivision(True)
+cdef inline void oct_encode_normal(
+    normal_t x, normal_t y, normal_t z, np.uint8_t *out
+) noexcept nogil:
+    """Oct encode a unit vector to two bytes
+
+    Computed in the precision of the input, in the same order of operations as
+    `normals.oct_encode_numpy`, so that the result is identical. A component
+    of exactly 1 is encoded as 256, which wraps to 0.
+    """
+    cdef normal_t one = 1, half = 0.5, scale = 256
+    cdef normal_t ax = -x if x < 0 else x
+    cdef normal_t ay = -y if y < 0 else y
+    cdef normal_t az = -z if z < 0 else z
+    cdef normal_t l1_norm = ax + ay + az
+    cdef normal_t u = x / l1_norm, v = y / l1_norm, au, av
+
+    if z < 0:
+        au = -u if u < 0 else u
+        av = -v if v < 0 else v
+        u, v = (one - av) * (-one if u < 0 else one), (one - au) * (-one if v < 0 else one)
+
+    if u < -one:
+        u = -one
+    elif u > one:
+        u = one
+    if v < -one:
+        v = -one
+    elif v > one:
+        v = one
+
+    out[0] = <np.uint8_t><int>floor((u * half + half) * scale)
+    out[1] = <np.uint8_t><int>floor((v * half + half) * scale)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def oct_encode(const cython.floating[:, :] normals):
+    """Oct encode unit vectors to two bytes each, in a single pass
+
+    Returns:
+        ndarray of shape (-1, 2) and dtype np.uint8
+    """
+    cdef Py_ssize_t i
+
+    assert normals.shape[1] == 3, 'normals must have shape (-1, 3)'
+
+    out_arr = np.empty((normals.shape[0], 2), dtype=np.uint8)
+    cdef np.uint8_t[:, ::1] out = out_arr
+
+    with nogil:
+        for i in range(normals.shape[0]):
+            oct_encode_normal(normals[i, 0], normals[i, 1], normals[i, 2], &out[i, 0])
+
+    return out_arr
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef void scatter_vertex_normals(
+    const cython.floating[:, :] positions,
+    const np.uint32_t[:, ::1] indices,
+    normal_t[:, ::1] out
+) noexcept nogil:
+    """Sum face normals into vertex normals in one pass over the triangles"""
+    cdef Py_ssize_t t, j
+    cdef np.uint32_t vertex
+    cdef normal_t n[3]
+
+    for t in range(indices.shape[0]):
+        face_normal(positions, indices[t, 0], indices[t, 1], indices[t, 2], n)
         for j in range(3):
-            for k in range(3):
-                vertex = indices[i, j]
-                out[vertex, k] += normals[i, k]
+            vertex = indices[t, j]
+            out[vertex, 0] += n[0]
+            out[vertex, 1] += n[1]
+            out[vertex, 2] += n[2]
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef gather_vertex_normals(
+    const cython.floating[:, :] positions,
+    const np.uint32_t[:, ::1] indices,
+    normal_t[:, ::1] out,
+    int threads
+):
+    """Compute face normals, then gather them into vertex normals in parallel
+
+    Each vertex sums the normals of its faces from a vertex-triangle adjacency
+    list, in the order of the triangles, as `scatter_vertex_normals` does.
+    """
+    cdef Py_ssize_t n_vertices = out.shape[0]
+    cdef Py_ssize_t n_triangles = indices.shape[0]
+    cdef Py_ssize_t i, j, t, v
+    cdef normal_t nx, ny, nz
+
+    if normal_t is np.float32_t:
+        face_normals_arr = np.empty((n_triangles, 3), dtype=np.float32)
+    else:
+        face_normals_arr = np.empty((n_triangles, 3), dtype=np.float64)
+    cdef normal_t[:, ::1] face_normals = face_normals_arr
+
+    # Vertex-triangle adjacency, in compressed sparse row format
+    offsets_arr = np.zeros(n_vertices + 1, dtype=np.intp)
+    adjacency_arr = np.empty(n_triangles * 3, dtype=np.uint32)
+    cursor_arr = np.zeros(n_vertices, dtype=np.intp)
+    cdef Py_ssize_t[::1] offsets = offsets_arr
+    cdef np.uint32_t[::1] adjacency = adjacency_arr
+    cdef Py_ssize_t[::1] cursor = cursor_arr
+
+    with nogil:
+        for t in prange(n_triangles, num_threads=threads, schedule='static'):
+            face_normal(
+                positions,
+                indices[t, 0],
+                indices[t, 1],
+                indices[t, 2],
+                &face_normals[t, 0],
+            )
+
+        for t in range(n_triangles):
+            for j in range(3):
+                offsets[indices[t, j] + 1] += 1
+
+        for v in range(n_vertices):
+            offsets[v + 1] += offsets[v]
+
+        for t in range(n_triangles):
+            for j in range(3):
+                v = indices[t, j]
+                adjacency[offsets[v] + cursor[v]] = t
+                cursor[v] += 1
+
+        for v in prange(n_vertices, num_threads=threads, schedule='static'):
+            nx = 0
+            ny = 0
+            nz = 0
+            for i in range(offsets[v], offsets[v + 1]):
+                t = adjacency[i]
+                nx = nx + face_normals[t, 0]
+                ny = ny + face_normals[t, 1]
+                nz = nz + face_normals[t, 2]
+
+            out[v, 0] = nx
+            out[v, 1] = ny
+            out[v, 2] = nz
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef normals_into(
+    const cython.floating[:, :] positions,
+    const np.uint32_t[:, ::1] indices,
+    normal_t[:, ::1] out,
+    np.uint8_t[:, ::1] encoded,
+    int threads
+):
+    """Sum and normalize vertex normals in out, then oct encode them if encoded
+    is not None
+    """
+    cdef Py_ssize_t v
+    cdef bint encode = encoded is not None
+
+    if threads == 1:
+        with nogil:
+            scatter_vertex_normals(positions, indices, out)
+    else:
+        gather_vertex_normals(positions, indices, out, threads)
+
+    with nogil:
+        for v in prange(out.shape[0], num_threads=threads, schedule='static'):
+            normalize(out, v)
+            if encode:
+                oct_encode_normal(out[v, 0], out[v, 1], out[v, 2], &encoded[v, 0])
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+cdef compute_normals(
+    const cython.floating[:, :] positions,
+    const np.uint32_t[:, ::1] indices,
+    int num_threads,
+    dtype,
+    bint encode
+):
+    """Vertex normals of dtype, and their oct encoding if encode is True"""
+    cdef Py_ssize_t n_vertices = positions.shape[0]
+    cdef Py_ssize_t n_triangles = indices.shape[0]
+    cdef int threads = parallel_threads(max(n_vertices, n_triangles), num_threads)
+    cdef bint valid
+
+    assert indices.shape[1] == 3, 'indices must have shape (-1, 3)'
+    assert dtype in (np.float32, np.float64), 'dtype must be float32 or float64'
+
+    with nogil:
+        valid = indices_below(&indices[0, 0], n_triangles * 3, n_vertices)
+
+    assert valid, 'index out of range of positions'
+
+    out_arr = np.zeros((n_vertices, 3), dtype=dtype)
+    encoded_arr = np.empty((n_vertices, 2), dtype=np.uint8) if encode else None
+    if out_arr.dtype == np.float32:
+        normals_into[cython.floating, np.float32_t](
+            positions, indices, out_arr, encoded_arr, threads
+        )
+    else:
+        normals_into[cython.floating, np.float64_t](
+            positions, indices, out_arr, encoded_arr, threads
+        )
+
+    return encoded_arr if encode else out_arr
+
+
+def vertex_normals(
+    const cython.floating[:, :] positions,
+    const np.uint32_t[:, ::1] indices,
+    int num_threads=1,
+    dtype=np.float64):
+    """Compute unit vertex normals
+
+    Each vertex normal is the sum of the normals of the triangles using it,
+    weighted by their area, in the order of the triangles. Face normals are
+    computed in double precision, and summed in `dtype`.
+
+    With one thread, face normals are summed into vertex normals in a single
+    pass over the triangles, and only the output is allocated. With more
+    threads, face normals are computed in parallel, then each vertex gathers
+    the normals of its faces from a vertex-triangle adjacency list. The sums
+    are in the same order, so the result is the same for any number of
+    threads.
+
+    Args:
+        - positions: array of shape (-1, 3)
+        - indices: array of shape (-1, 3)
+        - num_threads: number of threads. Default: 1.
+        - dtype: np.float32 or np.float64. Default: np.float64.
+
+    Returns:
+        ndarray of shape (-1, 3) and dtype `dtype`
+    """
+    return compute_normals(positions, indices, num_threads, dtype, False)
+
+
+def oct_vertex_normals(
+    const cython.floating[:, :] positions,
+    const np.uint32_t[:, ::1] indices,
+    int num_threads=1,
+    dtype=np.float64):
+    """Compute oct encoded unit vertex normals
+
+    Same as `oct_encode(vertex_normals(...))`, but each normal is encoded in
+    the loop that normalizes it, without allocating the unit normals.
+
+    Returns:
+        ndarray of shape (-1, 2) and dtype np.uint8
+    """
+    return compute_normals(positions, indices, num_threads, dtype, True)
+
+
+@cython.cdivision(True)
+cdef inline double occlusion_magnitude(
+    double x, double y, double z,
+    double center_x, double center_y, double center_z
+) noexcept nogil:
+    """Magnitude of the horizon occlusion point needed to occlude a position
+
+    Position and center must be scaled relative to the ellipsoid.
+    """
+    cdef double magnitude_squared = x * x + y * y + z * z
+    cdef double magnitude = sqrt(magnitude_squared)
+    cdef double cross_x, cross_y, cross_z
+    cdef double cos_alpha, sin_alpha, cos_beta, sin_beta
+
+    # Direction of the position
+    x = x / magnitude
+    y = y / magnitude
+    z = z / magnitude
+
+    magnitude_squared = max(magnitude_squared, 1)
+    magnitude = max(magnitude, 1)
+
+    cos_alpha = x * center_x + y * center_y + z * center_z
+    cross_x = y * center_z - z * center_y
+    cross_y = z * center_x - x * center_z
+    cross_z = x * center_y - y * center_x
+    sin_alpha = sqrt(cross_x * cross_x + cross_y * cross_y + cross_z * cross_z)
+    cos_beta = 1 / magnitude
+    sin_beta = sqrt(magnitude_squared - 1) * cos_beta
+
+    return 1 / (cos_alpha * cos_beta - sin_alpha * sin_beta)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def occlusion_magnitudes(
+    const cython.floating[:, :] positions,
+    double center_x, double center_y, double center_z,
+    int num_threads=1):
+    """Magnitude of the horizon occlusion point needed to occlude each position
+
+    Positions and center must be scaled relative to the ellipsoid.
+
+    Returns:
+        ndarray of dtype np.float64
+    """
+    cdef Py_ssize_t n = positions.shape[0]
+    cdef Py_ssize_t i
+    cdef int threads = parallel_threads(n, num_threads)
+
+    out_arr = np.empty(n, dtype=np.float64)
+    cdef double[::1] out = out_arr
+
+    with nogil:
+        for i in prange(n, num_threads=threads, schedule='static'):
+            out[i] = occlusion_magnitude(
+                positions[i, 0], positions[i, 1], positions[i, 2],
+                center_x, center_y, center_z
+            )
+
+    return out_arr
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def occlusion_max_magnitude(
+    const cython.floating[:, :] positions,
+    double radius_x, double radius_y, double radius_z,
+    double center_x, double center_y, double center_z,
+    int num_threads=1):
+    """Largest magnitude of the horizon occlusion point needed to occlude any
+    position
+
+    Positions are scaled relative to the ellipsoid on the fly, and rounded to
+    their own precision, as when scaled into an array of the same dtype. The
+    center must already be scaled. Nothing is allocated per position.
+
+    Args:
+        - positions: earth-centered, earth-fixed positions of shape (-1, 3)
+        - radius_x, radius_y, radius_z: radii of the ellipsoid along each axis
+        - center_x, center_y, center_z: scaled center of the bounding sphere
+        - num_threads: number of threads. The result is the same for any
+          number of threads.
+
+    Returns:
+        float
+    """
+    cdef Py_ssize_t n = positions.shape[0]
+    cdef Py_ssize_t i, start, stop, chunk
+    cdef int t
+    cdef int threads = parallel_threads(n, num_threads)
+    cdef double best
+    cdef cython.floating x, y, z
+
+    assert n > 0, 'positions must not be empty.'
+
+    # Maximum of each thread's chunk of positions
+    partial_arr = np.full(threads, -np.inf, dtype=np.float64)
+    cdef double[::1] partial = partial_arr
+    chunk = (n + threads - 1) // threads
+
+    with nogil:
+        for t in prange(threads, num_threads=threads, schedule='static'):
+            start = t * chunk
+            stop = min(start + chunk, n)
+            best = -INFINITY
+            for i in range(start, stop):
+                x = <cython.floating>(positions[i, 0] / radius_x)
+                y = <cython.floating>(positions[i, 1] / radius_y)
+                z = <cython.floating>(positions[i, 2] / radius_z)
+                best = max(
+                    best,
+                    occlusion_magnitude(x, y, z, center_x, center_y, center_z),
+                )
+            partial[t] = best
+
+    return float(partial_arr.max())
+
+
+cdef inline int parallel_threads(Py_ssize_t n, int num_threads) noexcept nogil:
+    """Number of threads to use for n items
+
+    Small inputs aren't worth the overhead of starting threads.
+    """
+    if num_threads < 1:
+        return 1
+    return <int>max(1, min(<Py_ssize_t>num_threads, n // MIN_ITEMS_PER_THREAD))
+
+
+cdef inline np.int16_t quantize(double x, double lo, double hi, double slope) noexcept nogil:
+    """Scale x from [lo, hi] to [0, 32767]
+
+    Matches np.interp(x, (lo, hi), (0, 32767)).astype(np.int16) exactly,
+    including when lo == hi.
+    """
+    if x >= hi:
+        return 32767
+    if x <= lo:
+        return 0
+    return <np.int16_t>(slope * (x - lo))
+
+
+cdef inline np.uint16_t zig_zag(int value) noexcept nogil:
+    return <np.uint16_t>((value << 1) ^ (value >> 15))
+
+
+cdef struct EdgeList:
+    np.uint32_t *data
+    Py_ssize_t size
+    Py_ssize_t capacity
+
+
+cdef inline int edge_append(EdgeList *edge, np.uint32_t value) noexcept nogil:
+    """Append value, growing the list if necessary. Returns -1 on failure."""
+    cdef np.uint32_t *data
+    if edge.size == edge.capacity:
+        edge.capacity = 2 * edge.capacity + 16
+        data = <np.uint32_t *>realloc(edge.data, edge.capacity * sizeof(np.uint32_t))
+        if data == NULL:
+            return -1
+        edge.data = data
+
+    edge.data[edge.size] = value
+    edge.size += 1
+    return 0
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def encode_vertices(
+    const np.float32_t[:, :] positions,
+    double minx, double miny, double minh,
+    double maxx, double maxy, double maxh,
+    np.uint16_t[:, ::1] out=None):
+    """Quantize, delta and zig zag encode vertices in a single pass
+
+    Positions are rescaled to the range 0-32767 using the given bounds, and
+    each of the u, v and height streams is written to a row of `out` as zig zag
+    encoded deltas from the previous value.
+
+    If `out` is None, only the edge vertices are computed.
+
+    Returns:
+        Tuple of the (west, south, east, north) edge vertex indices, each as an
+        ndarray of dtype np.uint32
+    """
+    cdef Py_ssize_t n = positions.shape[0]
+    cdef Py_ssize_t i, k
+    cdef bint write = out is not None
+    cdef bint failed = False
+    cdef np.int16_t u, v, h
+    cdef np.int16_t prev_u = 0, prev_v = 0, prev_h = 0
+
+    # Same slopes as np.interp
+    cdef double u_slope = 32767.0 / (maxx - minx) if maxx != minx else 0
+    cdef double v_slope = 32767.0 / (maxy - miny) if maxy != miny else 0
+    cdef double h_slope = 32767.0 / (maxh - minh) if maxh != minh else 0
+
+    cdef EdgeList edges[4]
+    for k in range(4):
+        edges[k].data = NULL
+        edges[k].size = 0
+        edges[k].capacity = 0
+
+    if write:
+        assert out.shape[0] == 3 and out.shape[1] == n, 'out must have shape (3, n)'
+
+    try:
+        with nogil:
+            for i in range(n):
+                u = quantize(positions[i, 0], minx, maxx, u_slope)
+                v = quantize(positions[i, 1], miny, maxy, v_slope)
+
+                if write:
+                    h = quantize(positions[i, 2], minh, maxh, h_slope)
+                    out[0, i] = zig_zag(u - prev_u)
+                    out[1, i] = zig_zag(v - prev_v)
+                    out[2, i] = zig_zag(h - prev_h)
+                    prev_u = u
+                    prev_v = v
+                    prev_h = h
+
+                if u == 0 and edge_append(&edges[0], i) < 0:
+                    failed = True
+                    break
+                if v == 0 and edge_append(&edges[1], i) < 0:
+                    failed = True
+                    break
+                if u == 32767 and edge_append(&edges[2], i) < 0:
+                    failed = True
+                    break
+                if v == 32767 and edge_append(&edges[3], i) < 0:
+                    failed = True
+                    break
+
+        if failed:
+            raise MemoryError()
+
+        return tuple([edge_to_array(&edges[k]) for k in range(4)])
+
+    finally:
+        for k in range(4):
+            free(edges[k].data)
+
+
+cdef edge_to_array(EdgeList *edge):
+    arr = np.empty(edge.size, dtype=np.uint32)
+    cdef np.uint32_t[::1] view = arr
+    if edge.size:
+        memcpy(&view[0], edge.data, edge.size * sizeof(np.uint32_t))
+    return arr
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def tipsify(const np.uint32_t[:, ::1] indices, Py_ssize_t n_vertices, int cache_size):
+    """Reorder triangles for vertex cache locality
+
+    Implements Tipsify from Sander, Nehab and Barczak, "Fast Triangle
+    Reordering for Vertex Locality and Reduced Overdraw", 2007.
+
+    Returns:
+        ndarray of dtype np.uint32 with the new order of triangles
+    """
+    cdef Py_ssize_t n_triangles = indices.shape[0]
+    cdef Py_ssize_t i, j, t, u, v, best, cursor, n_candidates, n_dead_end, n_out
+    cdef long long priority, best_priority, timestamp
+
+    # Vertex-triangle adjacency, in compressed sparse row format
+    offsets_arr = np.zeros(n_vertices + 1, dtype=np.intp)
+    adjacency_arr = np.empty(n_triangles * 3, dtype=np.intp)
+    cdef Py_ssize_t[::1] offsets = offsets_arr
+    cdef Py_ssize_t[::1] adjacency = adjacency_arr
+
+    # Number of triangles using each vertex that haven't been emitted yet
+    live_arr = np.zeros(n_vertices, dtype=np.intp)
+    cdef Py_ssize_t[::1] live = live_arr
+
+    # Time at which each vertex last entered the cache
+    cache_time_arr = np.zeros(n_vertices, dtype=np.int64)
+    cdef long long[::1] cache_time = cache_time_arr
+
+    emitted_arr = np.zeros(n_triangles, dtype=np.uint8)
+    cdef np.uint8_t[::1] emitted = emitted_arr
+
+    dead_end_arr = np.empty(n_triangles * 3, dtype=np.intp)
+    cdef Py_ssize_t[::1] dead_end = dead_end_arr
+
+    candidates_arr = np.empty(n_triangles * 3, dtype=np.intp)
+    cdef Py_ssize_t[::1] candidates = candidates_arr
+
+    out_arr = np.empty(n_triangles, dtype=np.uint32)
+    cdef np.uint32_t[::1] out = out_arr
+
+    cdef bint valid
+
+    assert indices.shape[1] == 3, 'indices must have shape (-1, 3)'
+
+    with nogil:
+        valid = indices_below(&indices[0, 0], n_triangles * 3, n_vertices)
+
+    assert valid, 'index out of range of positions'
+
+    if n_triangles == 0:
+        return out_arr
+
+    with nogil:
+        for t in range(n_triangles):
+            for j in range(3):
+                live[indices[t, j]] += 1
+
+        for v in range(n_vertices):
+            offsets[v + 1] = offsets[v] + live[v]
+
+        # Use cache_time as a temporary fill cursor
+        for t in range(n_triangles):
+            for j in range(3):
+                v = indices[t, j]
+                adjacency[offsets[v] + cache_time[v]] = t
+                cache_time[v] += 1
+
+        for v in range(n_vertices):
+            cache_time[v] = 0
+
+        # Start fanning around the first vertex of the first triangle
+        v = indices[0, 0]
+        timestamp = cache_size + 1
+        cursor = 0
+        n_dead_end = 0
+        n_out = 0
+
+        while v >= 0:
+            n_candidates = 0
+
+            # Emit all remaining triangles around the fanning vertex
+            for i in range(offsets[v], offsets[v + 1]):
+                t = adjacency[i]
+                if emitted[t]:
+                    continue
+
+                for j in range(3):
+                    u = indices[t, j]
+                    dead_end[n_dead_end] = u
+                    n_dead_end += 1
+                    candidates[n_candidates] = u
+                    n_candidates += 1
+                    live[u] -= 1
+
+                    if timestamp - cache_time[u] > cache_size:
+                        cache_time[u] = timestamp
+                        timestamp += 1
+
+                emitted[t] = 1
+                out[n_out] = t
+                n_out += 1
+
+            # Choose the next fanning vertex from the 1-ring: prefer the oldest
+            # vertex that will still be in the cache after fanning
+            best = -1
+            best_priority = -1
+            for i in range(n_candidates):
+                u = candidates[i]
+                if live[u] <= 0:
+                    continue
+
+                priority = 0
+                if timestamp - cache_time[u] + 2 * live[u] <= cache_size:
+                    priority = timestamp - cache_time[u]
+
+                if priority > best_priority:
+                    best_priority = priority
+                    best = u
+
+            # Skip dead end: most recently referenced vertex with triangles
+            # left, otherwise the next vertex in input order
+            if best == -1:
+                while n_dead_end > 0:
+                    n_dead_end -= 1
+                    u = dead_end[n_dead_end]
+                    if live[u] > 0:
+                        best = u
+                        break
+
+            if best == -1:
+                while cursor < n_vertices:
+                    if live[cursor] > 0:
+                        best = cursor
+                        break
+                    cursor += 1
+
+            v = best
+
+    return out_arr
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def first_use_order(const np.uint32_t[::1] indices, Py_ssize_t n_vertices):
+    """Number vertices by their first use in indices
+
+    Vertices that are not used by any triangle are numbered last, in their
+    original order.
+
+    Returns:
+        ndarray of dtype np.uint32 mapping each original vertex index to its new
+        index
+    """
+    cdef Py_ssize_t i, v
+    cdef np.uint32_t n_seen = 0
+    cdef bint valid
+
+    with nogil:
+        valid = indices_below(&indices[0], indices.shape[0], n_vertices)
+
+    assert valid, 'index out of range of positions'
+
+    remap_arr = np.full(n_vertices, n_vertices, dtype=np.uint32)
+    cdef np.uint32_t[::1] remap = remap_arr
+
+    with nogil:
+        for i in range(indices.shape[0]):
+            v = indices[i]
+            if remap[v] == n_vertices:
+                remap[v] = n_seen
+                n_seen += 1
+
+        for v in range(n_vertices):
+            if remap[v] == n_vertices:
+                remap[v] = n_seen
+                n_seen += 1
+
+    return remap_arr
+
+
+cdef inline double edge_function(
+    double ax, double ay, double bx, double by, double px, double py
+) noexcept nogil:
+    """Twice the signed area of the triangle (a, b, p)"""
+    return (bx - ax) * (py - ay) - (by - ay) * (px - ax)
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+def rasterize_water(
+    const cython.floating[:, :] positions,
+    const np.uint32_t[:, ::1] indices,
+    double minx, double miny, double maxx, double maxy,
+    double sea_level,
+    np.uint8_t[:, ::1] out):
+    """Mark the cells of a water mask covered by triangles below sea level
+
+    `out` covers the bounds, with rows from north to south. A cell is set to
+    255 if its center is inside or on the edge of a triangle whose three
+    vertices have heights at or below `sea_level`. Other cells are unchanged.
+    """
+    cdef Py_ssize_t rows = out.shape[0], cols = out.shape[1]
+    cdef Py_ssize_t n_triangles = indices.shape[0]
+    cdef Py_ssize_t t, r, c, r0, r1, c0, c1
+    cdef np.uint32_t a, b, d
+    cdef double ax, ay, bx, by, dx, dy, area, px, py, wa, wb, wd
+    cdef bint valid
+
+    assert indices.shape[1] == 3, 'indices must have shape (-1, 3)'
+    assert maxx > minx and maxy > miny, 'bounds must have a positive area'
+
+    # Cell coordinates, in which the center of cell (r, c) is at (c, r)
+    cdef double sx = cols / (maxx - minx)
+    cdef double sy = rows / (maxy - miny)
+
+    with nogil:
+        valid = indices_below(&indices[0, 0], n_triangles * 3, positions.shape[0])
+
+    assert valid, 'index out of range of positions'
+
+    with nogil:
+        for t in range(n_triangles):
+            a = indices[t, 0]
+            b = indices[t, 1]
+            d = indices[t, 2]
+            if (
+                positions[a, 2] > sea_level
+                or positions[b, 2] > sea_level
+                or positions[d, 2] > sea_level
+            ):
+                continue
+
+            ax = (positions[a, 0] - minx) * sx - 0.5
+            ay = (maxy - positions[a, 1]) * sy - 0.5
+            bx = (positions[b, 0] - minx) * sx - 0.5
+            by = (maxy - positions[b, 1]) * sy - 0.5
+            dx = (positions[d, 0] - minx) * sx - 0.5
+            dy = (maxy - positions[d, 1]) * sy - 0.5
+
+            area = edge_function(ax, ay, bx, by, dx, dy)
+            if area == 0:
+                continue
+
+            # Cells whose centers are in the bounding box of the triangle
+            c0 = <Py_ssize_t>ceil(max(min(ax, bx, dx), 0))
+            c1 = <Py_ssize_t>floor(min(max(ax, bx, dx), cols - 1))
+            r0 = <Py_ssize_t>ceil(max(min(ay, by, dy), 0))
+            r1 = <Py_ssize_t>floor(min(max(ay, by, dy), rows - 1))
+
+            for r in range(r0, r1 + 1):
+                py = r
+                for c in range(c0, c1 + 1):
+                    px = c
+                    wa = edge_function(bx, by, dx, dy, px, py)
+                    wb = edge_function(dx, dy, ax, ay, px, py)
+                    wd = edge_function(ax, ay, bx, by, px, py)
+                    if area > 0 and wa >= 0 and wb >= 0 and wd >= 0:
+                        out[r, c] = 255
+                    elif area < 0 and wa <= 0 and wb <= 0 and wd <= 0:
+                        out[r, c] = 255
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def rtin_coords(Py_ssize_t grid_size):
+    """Corners of every triangle of a right-triangulated irregular network
+
+    Triangles are numbered as in a binary heap: the two triangles covering the
+    grid, then their children, level by level, so that each triangle comes
+    before its children. Each triangle is stored as the corners `a` and `b` of
+    its hypotenuse, as in Martini.
+
+    Returns:
+        ndarray of shape (-1, 4) and dtype np.int32 of `(ax, ay, bx, by)`
+    """
+    cdef Py_ssize_t tile_size = grid_size - 1
+    assert tile_size > 0 and (tile_size & (tile_size - 1)) == 0, 'grid size must be 2^n + 1'
+
+    cdef Py_ssize_t n_triangles = tile_size * tile_size * 2 - 2
+    cdef Py_ssize_t i, tid
+    cdef int ax, ay, bx, by, cx, cy, mx, my
+
+    out_arr = np.empty((n_triangles, 4), dtype=np.int32)
+    cdef np.int32_t[:, ::1] out = out_arr
+
+    with nogil:
+        for i in range(n_triangles):
+            tid = i + 2
+            ax = ay = bx = by = cx = cy = 0
+            if tid & 1:
+                # Bottom-left triangle
+                bx = by = cx = <int>tile_size
+            else:
+                # Top-right triangle
+                ax = ay = cy = <int>tile_size
+
+            tid >>= 1
+            while tid > 1:
+                mx = (ax + bx) >> 1
+                my = (ay + by) >> 1
+                if tid & 1:
+                    # Left half
+                    bx = ax
+                    by = ay
+                    ax = cx
+                    ay = cy
+                else:
+                    # Right half
+                    ax = bx
+                    ay = by
+                    bx = cx
+                    by = cy
+                cx = mx
+                cy = my
+                tid >>= 1
+
+            out[i, 0] = ax
+            out[i, 1] = ay
+            out[i, 2] = bx
+            out[i, 3] = by
+
+    return out_arr
+
+
+@cython.cdivision(True)
+cdef inline Py_ssize_t floor_div(Py_ssize_t a, Py_ssize_t b) noexcept nogil:
+    """a / b rounded down, for b > 0"""
+    cdef Py_ssize_t q = a / b
+    if q * b > a:
+        q -= 1
+    return q
+
+
+cdef inline void clip_span(
+    Py_ssize_t px, Py_ssize_t py, Py_ssize_t qx, Py_ssize_t qy, Py_ssize_t y,
+    Py_ssize_t *lo, Py_ssize_t *hi
+) noexcept nogil:
+    """Clip [lo, hi] to the x on row y left of, or on, the edge from p to q
+
+    Points on the left satisfy `k * x <= m`, with twice the signed area of the
+    triangle (p, q, (x, y)) equal to `m - k * x`.
+    """
+    cdef Py_ssize_t k = qy - py
+    cdef Py_ssize_t m = (qx - px) * (y - py) + k * px
+    if k > 0:
+        hi[0] = min(hi[0], floor_div(m, k))
+    elif k < 0:
+        lo[0] = max(lo[0], -floor_div(m, -k))
+    elif m < 0:
+        hi[0] = lo[0] - 1
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+@cython.cdivision(True)
+cdef double plane_error(
+    const cython.floating[:, ::1] heights,
+    Py_ssize_t ax, Py_ssize_t ay, Py_ssize_t bx, Py_ssize_t by, Py_ssize_t cx, Py_ssize_t cy
+) noexcept nogil:
+    """Largest difference between the grid and the plane of a triangle, over the
+    grid vertices inside or on the edge of the triangle"""
+    cdef Py_ssize_t area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+    cdef Py_ssize_t x, y, lo, hi
+    cdef double ha = heights[ay, ax], hb = heights[by, bx], hc = heights[cy, cx]
+    cdef double error = 0
+
+    # Plane of the triangle, as h = h0 + dx * x + dy * y
+    cdef double dx = ((hb - ha) * (cy - ay) - (hc - ha) * (by - ay)) / area
+    cdef double dy = ((hc - ha) * (bx - ax) - (hb - ha) * (cx - ax)) / area
+    cdef double h0 = ha - dx * ax - dy * ay
+
+    if area < 0:
+        # Orient the triangle counter-clockwise
+        ax, ay, bx, by = bx, by, ax, ay
+
+    for y in range(min(ay, by, cy), max(ay, by, cy) + 1):
+        # Columns inside the triangle on this row
+        lo = min(ax, bx, cx)
+        hi = max(ax, bx, cx)
+        clip_span(ax, ay, bx, by, y, &lo, &hi)
+        clip_span(bx, by, cx, cy, y, &lo, &hi)
+        clip_span(cx, cy, ax, ay, y, &lo, &hi)
+
+        for x in range(lo, hi + 1):
+            error = max(error, fabs(h0 + dx * x + dy * y - <double>heights[y, x]))
+
+    return error
+
+
+@cython.boundscheck(False)
+@cython.wraparound(False)
+def rtin_errors(
+    const cython.floating[:, ::1] heights,
+    const np.int32_t[:, ::1] coords,
+    double[:, ::1] out):
+    """Approximation error of each vertex of a right-triangulated irregular network
+
+    A triangle is split at the midpoint of its hypotenuse, which it shares with
+    the triangle on the other side. The error of the midpoint is the largest
+    difference between the grid and the plane of either triangle, and at least
+    the errors of the midpoints of their children. A mesh that only keeps
+    vertices with an error above the maximum error is then within the maximum
+    error of every grid vertex, and has no cracks.
+
+    Triangles are visited from the smallest to the largest, so that errors of
+    children are known before their parents. Unlike Martini, which measures
+    only the error at the midpoint, every grid vertex of each triangle is
+    compared to its plane, in O(n log n) time for n grid vertices.
+
+    `out` must be filled with zeros.
+    """
+    cdef Py_ssize_t size = heights.shape[0]
+    cdef Py_ssize_t n_triangles = coords.shape[0]
+    cdef Py_ssize_t n_parents = n_triangles - (size - 1) * (size - 1)
+    cdef Py_ssize_t i
+    cdef int ax, ay, bx, by, mx, my, cx, cy
+
+    assert heights.shape[1] == size, 'heights must be square'
+    assert out.shape[0] == size and out.shape[1] == size, 'out must match heights'
+    assert n_triangles == (size - 1) * (size - 1) * 2 - 2, 'coords must match heights'
+
+    with nogil:
+        for i in range(n_triangles - 1, -1, -1):
+            ax = coords[i, 0]
+            ay = coords[i, 1]
+            bx = coords[i, 2]
+            by = coords[i, 3]
+            mx = (ax + bx) >> 1
+            my = (ay + by) >> 1
+            cx = mx + my - ay
+            cy = my + ax - mx
+
+            out[my, mx] = max(
+                out[my, mx], plane_error(heights, ax, ay, bx, by, cx, cy)
+            )
+
+            if i < n_parents:
+                # Errors of the vertices splitting both children
+                out[my, mx] = max(
+                    out[my, mx],
+                    out[(ay + cy) >> 1, (ax + cx) >> 1],
+                    out[(by + cy) >> 1, (bx + cx) >> 1],
+                )
+
+
+cdef struct RtinMesh:
+    const double *errors
+    int size
+    double max_error
+    np.uint32_t *ids
+    np.uint32_t *order
+    np.uint32_t *indices
+    Py_ssize_t n_vertices
+    Py_ssize_t n_triangles
+
+
+cdef inline np.uint32_t rtin_vertex(RtinMesh *m, int x, int y) noexcept nogil:
+    """Index of a grid vertex in the mesh, numbering vertices on first use"""
+    cdef Py_ssize_t cell = <Py_ssize_t>y * m.size + x
+    if m.ids[cell] == 0:
+        m.order[m.n_vertices] = <np.uint32_t>cell
+        m.n_vertices += 1
+        m.ids[cell] = <np.uint32_t>m.n_vertices
+
+    return m.ids[cell] - 1
+
+
+cdef void rtin_split(
+    RtinMesh *m, int ax, int ay, int bx, int by, int cx, int cy
+) noexcept nogil:
+    """Emit a triangle, or its two children if its error is too large"""
+    cdef int mx = (ax + bx) >> 1
+    cdef int my = (ay + by) >> 1
+    cdef Py_ssize_t t
+
+    if (
+        abs(ax - cx) + abs(ay - cy) > 1
+        and m.errors[<Py_ssize_t>my * m.size + mx] > m.max_error
+    ):
+        rtin_split(m, cx, cy, ax, ay, mx, my)
+        rtin_split(m, bx, by, cx, cy, mx, my)
+        return
+
+    t = 3 * m.n_triangles
+    m.indices[t] = rtin_vertex(m, ax, ay)
+    m.indices[t + 1] = rtin_vertex(m, bx, by)
+    m.indices[t + 2] = rtin_vertex(m, cx, cy)
+    m.n_triangles += 1
+
+
+def rtin_mesh(const double[:, ::1] errors, double max_error):
+    """Extract the mesh of a right-triangulated irregular network
+
+    Triangles are split depth first while the error of the vertex splitting
+    them exceeds `max_error`, and vertices are numbered in the order triangles
+    first use them, which is the order high-water mark encoding requires.
+
+    Args:
+        - errors: errors of `rtin_errors`, of shape (size, size)
+        - max_error: maximum error of the mesh
+
+    Returns:
+        order, indices: index in the flattened grid of each vertex of the mesh,
+        as an array of dtype np.uint32, and triangles as an array of shape
+        (-1, 3) and dtype np.uint32, counter-clockwise with rows from north to
+        south
+    """
+    cdef int size = errors.shape[0]
+    cdef int last = size - 1
+    cdef RtinMesh m
+
+    assert errors.shape[1] == size, 'errors must be square'
+    assert size > 1 and (last & (last - 1)) == 0, 'grid size must be 2^n + 1'
+
+    ids_arr = np.zeros(size * size, dtype=np.uint32)
+    order_arr = np.empty(size * size, dtype=np.uint32)
+    indices_arr = np.empty((2 * last * last, 3), dtype=np.uint32)
+    cdef np.uint32_t[::1] ids = ids_arr
+    cdef np.uint32_t[::1] order = order_arr
+    cdef np.uint32_t[:, ::1] indices = indices_arr
+
+    m.errors = &errors[0, 0]
+    m.size = size
+    m.max_error = max_error
+    m.ids = &ids[0]
+    m.order = &order[0]
+    m.indices = &indices[0, 0]
+    m.n_vertices = 0
+    m.n_triangles = 0
+
+    with nogil:
+        rtin_split(&m, 0, 0, last, last, last, 0)
+        rtin_split(&m, last, last, 0, 0, 0, last)
+
+    return order_arr[: m.n_vertices].copy(), indices_arr[: m.n_triangles].copy()
@@ -0,0 +1,101 @@
+"""Build water masks for the water mask extension
+
+A water mask has 256 x 256 cells covering the bounds of a tile, with rows from
+north to south and columns from west to east. Each cell is 0 for land or 255
+for water. Masks that are all land or all water are written as a single byte
+by `WaterMaskExtension`.
+"""
+from typing import Optional
+
+import numpy as np
+
+from .constants import WATER_MASK_LAND, WATER_MASK_SIZE, WATER_MASK_WATER
+from .encode import Bounds
+from .util_cy import rasterize_water
+
+
+def water_mask_from_raster(
+    water: np.ndarray, bounds: Bounds, *, raster_bounds: Optional[Bounds] = None
+) -> np.ndarray:
+    """Resample a land/water raster to the water mask of a tile
+
+    Each cell of the mask takes the value of the raster cell containing its
+    center.
+
+    Args:
+        - water: 2D array of shape (rows, columns) whose non-zero cells are
+          water, with the first row to the north and the first column to the
+          west
+        - bounds: `[minx, miny, maxx, maxy]` of the tile
+
+    Kwargs:
+        - raster_bounds: `[minx, miny, maxx, maxy]` of the outer edges of the
+          raster. Cells of the mask outside the raster are land. Default:
+          `bounds`.
+
+    Returns:
+        ndarray of shape (256, 256) and dtype np.uint8
+    """
+    msg = 'water must be a 2D array.'
+    assert water.ndim == 2, msg
+
+    rows, cols = water.shape
+    minx, miny, maxx, maxy = bounds
+    rminx, rminy, rmaxx, rmaxy = raster_bounds or bounds
+
+    # Centers of the cells of the mask
+    t = (np.arange(WATER_MASK_SIZE) + 0.5) / WATER_MASK_SIZE
+    x = minx + t * (maxx - minx)
+    y = maxy - t * (maxy - miny)
+
+    col = np.floor((x - rminx) / (rmaxx - rminx) * cols).astype(np.intp)
+    row = np.floor((rmaxy - y) / (rmaxy - rminy) * rows).astype(np.intp)
+    valid_col = (col >= 0) & (col < cols)
+    valid_row = (row >= 0) & (row < rows)
+
+    mask = np.full((WATER_MASK_SIZE, WATER_MASK_SIZE), WATER_MASK_LAND, np.uint8)
+    is_water = water[np.ix_(row[valid_row], col[valid_col])] != 0
+    mask[np.ix_(valid_row, valid_col)] = np.where(
+        is_water, WATER_MASK_WATER, WATER_MASK_LAND
+    )
+    return mask
+
+
+def water_mask_from_mesh(
+    positions: np.ndarray,
+    indices: np.ndarray,
+    *,
+    bounds: Optional[Bounds] = None,
+    sea_level: float = 0.0,
+) -> np.ndarray:
+    """Compute the water mask of a mesh from the heights of its vertices
+
+    A cell is water if its center is covered by a triangle whose three vertices
+    are at or below `sea_level`, so land reaches to the first vertex above sea
+    level. Triangles are rasterized in a single Cython pass.
+
+    Args:
+        - positions, indices: see `encode`
+
+    Kwargs:
+        - bounds: `[minx, miny, maxx, maxy]` of the tile. By default, inferred
+          as the minimum and maximum values of `positions`.
+        - sea_level: height at or below which vertices are water. Default: 0.
+
+    Returns:
+        ndarray of shape (256, 256) and dtype np.uint8
+    """
+    positions = positions.reshape(-1, 3)
+    if positions.dtype not in (np.float32, np.float64):
+        positions = positions.astype(np.float64)
+    indices = np.ascontiguousarray(indices.reshape(-1, 3), dtype=np.uint32)
+
+    if bounds:
+        minx, miny, maxx, maxy = bounds
+    else:
+        minx, maxx = positions[:, 0].min(), positions[:, 0].max()
+        miny, maxy = positions[:, 1].min(), positions[:, 1].max()
+
+    mask = np.full((WATER_MASK_SIZE, WATER_MASK_SIZE), WATER_MASK_LAND, np.uint8)
+    rasterize_water(positions, indices, minx, miny, maxx, maxy, sea_level, mask)
+    return mask
@@ -1,9 +1,11 @@
 """Setup for quantized-mesh-encoder."""
 
+import os
+import sys
 from pathlib import Path
 
 import numpy as np
-from setuptools import find_packages, setup
+from setuptools import Extension, find_packages, setup
 
 # setuptools must be before Cython
 from Cython.Build import cythonize  # isort:skip
@@ -15,6 +17,8 @@ with open("README.md") as f:
 inst_reqs = ["numpy", "attrs"]
 
 extra_reqs = {
+    "brotli": ["brotli"],
+    "orjson": ["orjson"],
     "test": ["pytest", "pytest-benchmark", "imageio", "quantized-mesh-tile"],
 }
 
@@ -24,6 +28,35 @@ def find_pyx(path="."):
     return list(map(str, Path(path).glob("**/*.pyx")))
 
 
+def openmp_flags():
+    """Compile and link flags for OpenMP
+
+    Apple's clang doesn't support OpenMP without extra setup, so kernels are
+    built without it, and run on a single thread. Set QME_DISABLE_OPENMP=1 to
+    disable OpenMP on other platforms.
+    """
+    if os.environ.get("QME_DISABLE_OPENMP") or sys.platform == "darwin":
+        return [], []
+
+    if sys.platform == "win32":
+        return ["/openmp"], []
+
+    return ["-fopenmp"], ["-fopenmp"]
+
+
+def extensions():
+    compile_args, link_args = openmp_flags()
+    return [
+        Extension(
+            pyx.replace(os.sep, ".")[: -len(".pyx")],
+            [pyx],
+            extra_compile_args=compile_args,
+            extra_link_args=link_args,
+        )
+        for pyx in find_pyx()
+    ]
+
+
 setup(
     name="quantized-mesh-encoder",
     version="0.5.0",
@@ -50,7 +83,7 @@ setup(
     zip_safe=False,
     install_requires=inst_reqs,
     extras_require=extra_reqs,
-    ext_modules=cythonize(find_pyx(), language_level=3),
+    ext_modules=cythonize(extensions(), language_level=3),
     # Include Numpy headers
     include_dirs=[np.get_include()],
 )
@@ -0,0 +1,85 @@
+"""Fixtures shared by the tests"""
+from io import BytesIO
+from typing import Callable, List, Optional, Tuple
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.encode import encode
+
+
+@pytest.fixture
+def quad_mesh() -> Tuple[np.ndarray, np.ndarray]:
+    """Positions and indices of a mesh of two triangles"""
+    positions = np.array([0, 0, 0, 1, 0, 1, 0, 1, 2, 1, 1, 3], dtype=np.float32)
+    indices = np.array([0, 1, 2, 2, 1, 3], dtype=np.uint32)
+    return positions, indices
+
+
+@pytest.fixture
+def tile_data() -> Callable[[int], bytes]:
+    """Function returning stand-in tile bytes, equal for equal values"""
+
+    def make(value: int) -> bytes:
+        return bytes([value]) * 20
+
+    return make
+
+
+@pytest.fixture
+def make_jobs() -> Callable[..., List[Tuple]]:
+    """Function returning `n` jobs of `encode_many`, one per tile of a row
+
+    Each job is a `(positions, indices, bounds, extensions)` tuple. With
+    `metadata=True`, each tile has a metadata extension with its index.
+    """
+
+    def make(n: int, *, metadata: bool = False) -> List[Tuple]:
+        rng = np.random.default_rng(0)
+        triangles = np.array([0, 1, 2, 1, 2, 3, 2, 3, 4, 3, 4, 5], dtype=np.uint32)
+
+        jobs = []
+        for i in range(n):
+            positions = rng.uniform(0, 1, size=18).astype(np.float32)
+            positions[0::3] += i
+            bounds = (float(i), 0.0, float(i + 1), 1.0)
+            exts = [extensions.MetadataExtension(data={'tile': i})] if metadata else []
+            jobs.append((positions, triangles, bounds, exts))
+
+        return jobs
+
+    return make
+
+
+@pytest.fixture
+def encode_job() -> Callable[..., bytes]:
+    """Function encoding a job of `make_jobs` with `encode`"""
+
+    def run(positions, indices, bounds=None, exts=()) -> bytes:
+        with BytesIO() as f:
+            encode(f, positions, indices, bounds=bounds, extensions=exts)
+            return f.getvalue()
+
+    return run
+
+
+@pytest.fixture
+def smooth_heights() -> Callable[..., np.ndarray]:
+    """Function returning a float32 heightmap of smooth hills
+
+    `smooth_heights(rows, cols=rows, *, noise=0.0, seed=0)`, with normal noise
+    of standard deviation `noise` added to the heights.
+    """
+
+    def make(
+        rows: int, cols: Optional[int] = None, *, noise: float = 0.0, seed: int = 0
+    ) -> np.ndarray:
+        cols = rows if cols is None else cols
+        y, x = np.mgrid[0:rows, 0:cols]
+        heights = 1000 + 200 * np.sin(x / (cols - 1) * 5) * np.cos(y / (rows - 1) * 3)
+        if noise:
+            heights += np.random.default_rng(seed).normal(0, noise, heights.shape)
+        return heights.astype(np.float32)
+
+    return make
@@ -0,0 +1,117 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.aio import AsyncEncoder, encode_async, encode_many_async
+
+
+class CountingExecutor(ThreadPoolExecutor):
+    """Thread pool recording the largest number of jobs submitted at once"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    def submit(self, fn, *args, **kwargs):
+        with self.lock:
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+
+        future = super().submit(fn, *args, **kwargs)
+        future.add_done_callback(self.done)
+        return future
+
+    def done(self, _):
+        with self.lock:
+            self.in_flight -= 1
+
+
+def test_encode_async(make_jobs, encode_job):
+    positions, indices, bounds, _ = make_jobs(1)[0]
+    data = asyncio.run(encode_async(positions, indices, bounds=bounds))
+    assert data == encode_job(positions, indices, bounds)
+
+
+def test_encode_concurrent(make_jobs, encode_job):
+    jobs = make_jobs(20)
+    expected = [encode_job(*job) for job in jobs]
+
+    async def run(encoder):
+        return await asyncio.gather(
+            *(encoder.encode(p, i, bounds=b) for p, i, b, _ in jobs)
+        )
+
+    with CountingExecutor(max_workers=4) as executor:
+        encoder = AsyncEncoder(executor=executor, max_pending=3)
+        assert asyncio.run(run(encoder)) == expected
+        assert 1 <= executor.max_in_flight <= 3
+
+        # Works again in a new event loop
+        assert asyncio.run(run(encoder)) == expected
+
+
+@pytest.mark.parametrize('ordered', [True, False])
+def test_encode_many_async(ordered, make_jobs, encode_job):
+    jobs = make_jobs(10)
+    expected = [encode_job(*job) for job in jobs]
+
+    async def run():
+        async with AsyncEncoder(max_workers=2, max_pending=2) as encoder:
+            return [
+                data async for data in encoder.encode_many(iter(jobs), ordered=ordered)
+            ]
+
+    out = asyncio.run(run())
+    if ordered:
+        assert out == expected
+    else:
+        assert sorted(i for i, _ in out) == list(range(10))
+        assert [data for _, data in sorted(out)] == expected
+
+
+def test_encode_many_async_iterable(make_jobs, encode_job):
+    jobs = make_jobs(5)
+
+    async def job_stream():
+        for job in jobs:
+            await asyncio.sleep(0)
+            yield job
+
+    async def run():
+        return [data async for data in encode_many_async(job_stream())]
+
+    assert asyncio.run(run()) == [encode_job(*job) for job in jobs]
+
+
+def test_encode_many_async_close_early(make_jobs, encode_job):
+    jobs = make_jobs(10)
+
+    async def run(executor):
+        encoder = AsyncEncoder(executor=executor, max_pending=2)
+        stream = encoder.encode_many(jobs)
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    with CountingExecutor(max_workers=1) as executor:
+        assert asyncio.run(run(executor)) == encode_job(*jobs[0])
+        assert executor.max_in_flight <= 2
+
+
+def test_encode_async_error(make_jobs):
+    positions = make_jobs(1)[0][0]
+    indices = np.array([[0, 1, 99]], dtype=np.uint32)
+    normals = extensions.VertexNormalsExtension(positions=positions, indices=indices)
+
+    async def run():
+        async with AsyncEncoder(max_workers=1) as encoder:
+            await encoder.encode(positions, indices, extensions=[normals])
+
+    with pytest.raises(AssertionError, match='index out of range'):
+        asyncio.run(run())
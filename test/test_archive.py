@@ -0,0 +1,106 @@
+import gzip
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder import decode, encode
+from quantized_mesh_encoder.archive import (
+    ARCHIVE_HEADER,
+    TileArchiveReader,
+    TileArchiveWriter,
+    tile_keys,
+)
+from quantized_mesh_encoder.tiling import layer_json
+
+
+def test_tile_keys():
+    keys = tile_keys([0, 1, 0, 1, 0], [0, 0, 1, 1, 0], [1, 1, 1, 1, 2])
+    assert keys.dtype == np.uint64
+    assert keys.tolist() == [(1 << 56) + i for i in range(4)] + [2 << 56]
+
+
+def test_archive(tmp_path, tile_data):
+    path = tmp_path / 'layer.qmta'
+    layer = layer_json({0: ([0, 1], [0, 0])}, name='test')
+    with TileArchiveWriter(path, metadata=layer) as writer:
+        for x in range(10):
+            writer.write(x, 3, 4, tile_data(x % 3))
+        writer.write(1, 0, 0, tile_data(5))
+        writer.write(0, 0, 0, tile_data(6))
+        writer.write(1, 0, 0, tile_data(7))
+
+    assert writer.n_tiles == 12
+    assert writer.n_unique == 6
+    size = ARCHIVE_HEADER.size + 6 * 20
+    assert path.stat().st_size > size
+
+    with TileArchiveReader(path) as reader:
+        assert len(reader) == 12
+        assert reader.metadata == layer
+        assert reader.compression is None
+        assert np.all(np.diff(reader.keys.astype(np.int64)) > 0)
+
+        tile = reader.get(4, 3, 4)
+        assert isinstance(tile, memoryview) and tile.readonly
+        assert tile == tile_data(1)
+        assert reader.get(1, 0, 0) == tile_data(7)
+        assert reader.get(0, 0, 0) == tile_data(6)
+        assert reader.get(10, 3, 4) is None
+        assert reader.get(0, 0, 30) is None
+        assert (9, 3, 4) in reader
+
+        tiles = list(reader.tiles())
+        assert [t[:3] for t in tiles[:2]] == [(0, 0, 0), (1, 0, 0)]
+        assert sorted(t[:3] for t in tiles[2:]) == [(x, 3, 4) for x in range(10)]
+
+        available = reader.available()
+        assert sorted(available) == [0, 4]
+        assert available[4][0].tolist() == sorted(available[4][0].tolist())
+        assert set(available[4][1].tolist()) == {3}
+        del tile, tiles
+
+
+def test_archive_empty(tmp_path):
+    path = tmp_path / 'empty.qmta'
+    TileArchiveWriter(path).close()
+
+    with TileArchiveReader(path) as reader:
+        assert len(reader) == 0
+        assert reader.get(0, 0, 0) is None
+        assert reader.metadata == {}
+        assert reader.available() == {}
+
+
+def test_archive_encoded_tiles(tmp_path, quad_mesh):
+    positions, indices = quad_mesh
+    path = tmp_path / 'layer.qmta'
+    with BytesIO() as f:
+        encode(f, positions, indices)
+        data = f.getvalue()
+
+    with TileArchiveWriter(path, compression='gzip') as writer:
+        writer.write(0, 0, 0, data)
+        writer.write(1, 0, 0, data)
+
+    assert writer.n_unique == 1
+    reader = TileArchiveReader(path)
+    assert reader.compression == 'gzip'
+    assert gzip.decompress(reader.get(1, 0, 0)) == data
+    assert np.array_equal(
+        decode(gzip.decompress(reader.get(0, 0, 0))).indices.ravel(), indices
+    )
+
+    # The map can't be closed while tiles are referenced
+    tile = reader.get(0, 0, 0)
+    with pytest.raises(BufferError):
+        reader.close()
+    tile.release()
+    reader.close()
+
+
+def test_archive_invalid(tmp_path):
+    path = tmp_path / 'layer.qmta'
+    path.write_bytes(bytes(ARCHIVE_HEADER.size))
+    with pytest.raises(AssertionError, match='not a tile archive'):
+        TileArchiveReader(path)
@@ -0,0 +1,133 @@
+import json
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.availability import (
+    MAX_ZOOM,
+    AvailabilityIndex,
+    morton_decode,
+    morton_encode,
+)
+from quantized_mesh_encoder.tiling import compact_ranges, layer_json, tiles_in_range
+
+
+def full_levels(max_zoom):
+    return {
+        z: tiles_in_range(0, 0, (2 << z) - 1, (1 << z) - 1) for z in range(max_zoom + 1)
+    }
+
+
+def random_level(z, fraction, seed=0):
+    x, y = tiles_in_range(0, 0, (2 << z) - 1, (1 << z) - 1)
+    keep = np.random.default_rng(seed).uniform(size=x.size) < fraction
+    return x[keep], y[keep]
+
+
+def test_morton():
+    x = np.array([0, 1, 0, 1, 2, 0xFFFFFFFF, 12345])
+    y = np.array([0, 0, 1, 1, 0, 0x7FFFFFFF, 678])
+    codes = morton_encode(x, y)
+    assert codes.dtype == np.uint64
+    assert codes[:5].tolist() == [0, 1, 2, 3, 4]
+
+    dx, dy = morton_decode(codes)
+    assert np.array_equal(dx, x) and np.array_equal(dy, y)
+
+    # Children of a tile follow its code
+    parent = int(morton_encode(5, 3))
+    children = morton_encode([10, 11, 10, 11], [6, 6, 7, 7])
+    assert children.tolist() == [(parent << 2) + i for i in range(4)]
+
+
+def test_availability_full():
+    index = AvailabilityIndex.from_tiles(full_levels(4))
+    assert index.max_zoom == 4
+    assert index.available(1, 0, 0, 2) == [
+        [{'startX': 2, 'startY': 0, 'endX': 3, 'endY': 1}],
+        [{'startX': 4, 'startY': 0, 'endX': 7, 'endY': 3}],
+    ]
+
+    # Levels past the index are empty
+    assert index.metadata(3, 2, 2, 3) == {
+        'available': [
+            [{'startX': 6, 'startY': 4, 'endX': 7, 'endY': 5}],
+            [{'startX': 12, 'startY': 8, 'endX': 15, 'endY': 11}],
+            [],
+        ]
+    }
+
+
+def test_availability_max_zoom():
+    index = AvailabilityIndex.from_tiles(
+        {30: ([0], [0]), MAX_ZOOM: ([0, 1, 0, 1], [0, 0, 1, 1])}
+    )
+
+    # Levels past MAX_ZOOM are left out
+    assert index.available(0, 0, 30, 3) == [
+        [{'startX': 0, 'startY': 0, 'endX': 1, 'endY': 1}]
+    ]
+    assert index.available(0, 0, MAX_ZOOM, 3) == []
+
+
+@pytest.mark.parametrize('tile', [(0, 0, 0), (1, 0, 0), (5, 2, 3), (21, 9, 5)])
+def test_availability_partial(tile):
+    available = {z: random_level(z, 0.8, seed=z) for z in range(9)}
+    index = AvailabilityIndex.from_tiles(available)
+
+    x, y, z = tile
+    result = index.available(x, y, z, 3)
+    assert len(result) == 3
+    for level, ranges in enumerate(result, start=z + 1):
+        ax, ay = available[level]
+        shift = level - z
+        below = ((ax >> shift) == x) & ((ay >> shift) == y)
+        assert ranges == compact_ranges(ax[below], ay[below])
+
+        dx, dy = index.descendants(x, y, z, level)
+        assert sorted(zip(dx.tolist(), dy.tolist())) == sorted(
+            zip(ax[below].tolist(), ay[below].tolist())
+        )
+
+
+def test_availability_contains():
+    x, y = random_level(6, 0.5)
+    index = AvailabilityIndex.from_tiles(
+        {6: (np.append(x, x[:5]), np.append(y, y[:5]))}
+    )
+    assert index.codes[6].size == x.size
+
+    all_x, all_y = tiles_in_range(0, 0, 127, 63)
+    expected = np.zeros((64, 128), dtype=bool)
+    expected[y, x] = True
+    assert np.array_equal(index.contains(all_x, all_y, 6), expected.ravel())
+    assert not index.contains(0, 0, 5)
+
+
+def test_availability_metadata_extension():
+    index = AvailabilityIndex.from_tiles(
+        {0: ([0, 1], [0, 0]), 1: ([0, 1, 2], [0, 1, 1]), 2: ([0, 1], [0, 0])}
+    )
+    data = index.metadata(0, 0, 0, 2)
+    assert data == {
+        'available': [
+            [
+                {'startX': 0, 'startY': 0, 'endX': 0, 'endY': 0},
+                {'startX': 1, 'startY': 1, 'endX': 1, 'endY': 1},
+            ],
+            [{'startX': 0, 'startY': 0, 'endX': 1, 'endY': 0}],
+        ]
+    }
+
+    ext = extensions.MetadataExtension(data=data)
+    assert json.loads(ext.encode()[5:]) == data
+
+
+def test_availability_layer_json():
+    index = AvailabilityIndex.from_tiles(full_levels(3))
+    layer = layer_json(index.as_mapping(max_zoom=1), metadata_availability=2)
+    assert layer['metadataAvailability'] == 2
+    assert layer['maxzoom'] == 1
+    assert layer['available'][1] == [{'startX': 0, 'startY': 0, 'endX': 3, 'endY': 1}]
+    assert 'metadataAvailability' not in layer_json(index.as_mapping())
@@ -0,0 +1,35 @@
+from quantized_mesh_encoder.batch import encode_many
+
+
+def test_encode_many_ordered(make_jobs, encode_job):
+    jobs = make_jobs(10, metadata=True)
+    expected = [encode_job(*job) for job in jobs]
+
+    out = list(encode_many(iter(jobs), max_workers=2))
+    assert out == expected, 'Batch output differs from encode()'
+
+
+def test_encode_many_unordered(make_jobs, encode_job):
+    jobs = make_jobs(10, metadata=True)
+    expected = [encode_job(*job) for job in jobs]
+
+    out = dict(encode_many(jobs, max_workers=2, ordered=False))
+    assert sorted(out.keys()) == list(range(10)), 'Missing jobs'
+    assert [out[i] for i in range(10)] == expected, 'Batch output differs'
+
+
+def test_encode_many_short_jobs(make_jobs, encode_job):
+    positions, triangles, _, _ = make_jobs(1, metadata=True)[0]
+    out = list(encode_many([(positions, triangles)], max_workers=1))
+    assert out == [encode_job(positions, triangles, None, ())]
+
+
+def test_encode_many_threads(make_jobs, encode_job):
+    jobs = make_jobs(10, metadata=True)
+    expected = [encode_job(*job) for job in jobs]
+
+    out = list(encode_many(iter(jobs), max_workers=4, backend='thread'))
+    assert out == expected, 'Batch output differs from encode()'
+
+    out = dict(encode_many(jobs, max_workers=4, backend='thread', ordered=False))
+    assert [out[i] for i in range(10)] == expected, 'Batch output differs'
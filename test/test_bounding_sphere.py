@@ -1,7 +1,9 @@
 import numpy as np
 import pytest
 
-from quantized_mesh_encoder.bounding_sphere import bounding_sphere
+from quantized_mesh_encoder.bounding_sphere import auto_method, bounding_sphere
+from quantized_mesh_encoder.ecef import to_ecef
+from quantized_mesh_encoder.heightmap import grid_positions
 
 
 def test_bounding_sphere_unit_cube():
@@ -71,3 +73,73 @@ def test_bounding_sphere_containment_ritter(positions):
 
     # All distances to the center must be <= the radius
     assert (distances <= radius).all(), 'A position outside bounding sphere'
+
+
+def sphere_cases():
+    rng = np.random.default_rng(0)
+    heights = rng.uniform(0, 300, (65, 65))
+    tile = to_ecef(grid_positions(heights, (10, 45, 10.1, 45.1))).astype(np.float32)
+    line = np.outer(np.arange(10), [1, 2, 3])
+    plane = np.column_stack([rng.uniform(size=(50, 2)), np.zeros(50)])
+    return {
+        'single': np.array([[1, 2, 3]]),
+        'duplicates': np.repeat([[1, 2, 3], [4, 5, 6]], 5, axis=0),
+        'collinear': line,
+        'coplanar': plane,
+        'random': rng.normal(size=(1000, 3)),
+        'tile': tile,
+    }
+
+
+@pytest.mark.parametrize('method', ['epos', 'welzl', 'auto'])
+@pytest.mark.parametrize('case', list(sphere_cases()))
+def test_bounding_sphere_containment_methods(method, case):
+    positions = sphere_cases()[case].astype(np.float32)
+    center, radius = bounding_sphere(positions, method=method)
+
+    distances = np.linalg.norm(positions.astype(np.float64) - center, axis=1)
+    assert (distances <= radius * (1 + 1e-12)).all(), 'A position outside sphere'
+
+
+@pytest.mark.parametrize('case', list(sphere_cases()))
+def test_bounding_sphere_welzl_smallest(case):
+    positions = sphere_cases()[case].astype(np.float32)
+    _, radius = bounding_sphere(positions, method='welzl')
+
+    for method in ['bounding_box', 'naive', 'ritter', 'epos', None]:
+        _, other = bounding_sphere(positions, method=method)
+        assert radius <= other * (1 + 1e-6), f'Larger than {method} sphere'
+
+
+# fmt: off
+MINIMAL_SPHERE_CASES = [
+    # Two points
+    ([[0, 0, 0], [2, 0, 0]], [1, 0, 0], 1),
+    # Right triangle, with the hypotenuse as diameter
+    ([[0, 0, 0], [2, 0, 0], [0, 2, 0]], [1, 1, 0], np.sqrt(2)),
+    # Equilateral triangle
+    ([[1, 0, 0], [-0.5, 0.75 ** 0.5, 0], [-0.5, -0.75 ** 0.5, 0]], [0, 0, 0], 1),
+    # Regular tetrahedron, with an interior point
+    (
+        [[1, 1, 1], [1, -1, -1], [-1, 1, -1], [-1, -1, 1], [0, 0, 0.5]],
+        [0, 0, 0],
+        np.sqrt(3),
+    ),
+]
+# fmt: on
+
+
+@pytest.mark.parametrize('positions,center,radius', MINIMAL_SPHERE_CASES)
+def test_bounding_sphere_welzl_exact(positions, center, radius):
+    positions = np.array(positions, dtype=np.float32)
+    actual_center, actual_radius = bounding_sphere(positions, method='welzl')
+    assert np.allclose(actual_center, center, atol=1e-6)
+    assert np.isclose(actual_radius, radius)
+
+
+def test_auto_method():
+    assert auto_method(100) == 'welzl'
+    assert auto_method(30000) == 'epos'
+    assert auto_method(65000) == 'ritter'
+    assert auto_method(10**6) == 'bounding_box'
+    assert auto_method(10**6, time_budget=1) == 'welzl'
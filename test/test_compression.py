@@ -0,0 +1,46 @@
+import gzip
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder.batch import encode_many
+from quantized_mesh_encoder.compression import compress
+from quantized_mesh_encoder.encode import encode
+
+POSITIONS = np.array(
+    [0, 0, 0, 1, 1, 1, 0, 1, 4, 2, 3, 4, 8, 9, 10, 12, 13, 14], dtype=np.float32
+)
+TRIANGLES = np.array([0, 1, 2, 1, 2, 3, 2, 3, 4, 3, 4, 5], dtype=np.uint32)
+
+
+def encode_bytes(**kwargs):
+    with BytesIO() as f:
+        encode(f, POSITIONS, TRIANGLES, **kwargs)
+        return f.getvalue()
+
+
+@pytest.mark.parametrize("level", [None, 1, 9])
+def test_encode_gzip(level):
+    expected = encode_bytes()
+    data = encode_bytes(compression='gzip', compression_level=level)
+    assert gzip.decompress(data) == expected, 'Incorrect gzip output'
+
+
+def test_gzip_deterministic():
+    data = bytearray(b'quantized mesh' * 100)
+    assert compress(data, 'gzip') == compress(bytes(data), 'gzip')
+
+
+def test_encode_brotli():
+    brotli = pytest.importorskip('brotli')
+    expected = encode_bytes()
+    data = encode_bytes(compression='brotli', compression_level=5)
+    assert brotli.decompress(data) == expected, 'Incorrect brotli output'
+
+
+def test_encode_many_gzip():
+    expected = encode_bytes()
+    jobs = [(POSITIONS, TRIANGLES)] * 3
+    out = list(encode_many(jobs, max_workers=2, compression='gzip'))
+    assert [gzip.decompress(data) for data in out] == [expected] * 3
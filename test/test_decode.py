@@ -0,0 +1,93 @@
+import mmap
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.decode import decode
+from quantized_mesh_encoder.ecef import to_ecef
+from quantized_mesh_encoder.encode import compute_header, encode, interp_positions
+from quantized_mesh_encoder.normals import compute_vertex_normals
+
+
+def strip_mesh(n):
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, 1, size=(n, 3)).astype(np.float32)
+    triangles = np.arange(n - 2)[:, None] + np.array([0, 1, 2])
+    return positions, triangles.astype(np.uint32)
+
+
+@pytest.mark.parametrize("n", [6, 70001])
+def test_decode(n):
+    positions, triangles = strip_mesh(n)
+    water_mask = np.zeros((256, 256), dtype=np.uint8)
+    water_mask[:128] = 255
+    exts = [
+        extensions.VertexNormalsExtension(positions=positions, indices=triangles),
+        extensions.WaterMaskExtension(data=water_mask),
+        extensions.MetadataExtension(data={'hello': 'world'}),
+    ]
+
+    f = BytesIO()
+    encode(f, positions, triangles, extensions=exts)
+    tile = decode(f.getvalue())
+
+    header = compute_header(positions, None)
+    assert tile.header == pytest.approx(header), 'Incorrect header'
+
+    u, v, h = interp_positions(positions).T
+    assert np.array_equal(tile.u, u), 'Incorrect vertices'
+    assert np.array_equal(tile.v, v), 'Incorrect vertices'
+    assert np.array_equal(tile.height, h), 'Incorrect vertices'
+    assert np.array_equal(tile.indices, triangles), 'Incorrect indices'
+
+    assert np.array_equal(tile.west, np.where(u == 0)[0])
+    assert np.array_equal(tile.south, np.where(v == 0)[0])
+    assert np.array_equal(tile.east, np.where(u == 32767)[0])
+    assert np.array_equal(tile.north, np.where(v == 32767)[0])
+
+    # Oct encoding uses 8 bits per component, so normals are only approximate
+    normals = compute_vertex_normals(to_ecef(positions), triangles)
+    assert np.allclose(normals, tile.normals(), atol=0.05, rtol=0)
+    assert np.array_equal(tile.water_mask, water_mask), 'Incorrect water mask'
+    assert tile.metadata == {'hello': 'world'}, 'Incorrect metadata'
+
+    bounds = (positions[:, 0].min(), positions[:, 1].min()) + (
+        positions[:, 0].max(),
+        positions[:, 1].max(),
+    )
+    assert np.allclose(tile.positions(bounds), positions, atol=1e-4)
+
+
+def test_decode_zero_copy():
+    positions, triangles = strip_mesh(6)
+    exts = [extensions.WaterMaskExtension(data=0)]
+
+    f = BytesIO()
+    encode(f, positions, triangles, extensions=exts)
+    data = f.getvalue()
+
+    with mmap.mmap(-1, len(data)) as mm:
+        mm[:] = data
+        tile = decode(memoryview(mm))
+        assert np.array_equal(tile.water_mask, [0])
+
+        # Undecoded arrays are views on the input
+        mm[-1] = 255
+        assert np.array_equal(tile.water_mask, [255])
+        del tile
+
+
+def test_decode_gzip_magic():
+    # centerX is a float64 whose low bytes can be anything, including the gzip
+    # magic bytes
+    positions, triangles = strip_mesh(6)
+    f = BytesIO()
+    encode(f, positions, triangles)
+    buf = bytearray(f.getvalue())
+    buf[:2] = b'\x1f\x8b'
+
+    tile = decode(buf)
+    assert tile.indices.tolist() == triangles.tolist()
+    assert tile.header['centerX'] != 0
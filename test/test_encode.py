@@ -1,7 +1,10 @@
+import importlib
+import mmap
 from io import BytesIO
 from numbers import Number
 
 import numpy as np
+import pytest
 from quantized_mesh_tile import TerrainTile
 
 from quantized_mesh_encoder import extensions
@@ -10,10 +13,15 @@ from quantized_mesh_encoder.encode import (
     compute_header,
     encode,
     encode_header,
+    encode_into,
+    encoded_size,
     interp_positions,
 )
 from quantized_mesh_encoder.normals import compute_vertex_normals
 
+# The package exports an `encode` function that shadows the module
+encode_module = importlib.import_module('quantized_mesh_encoder.encode')
+
 
 def test_compute_header():
     positions = np.array([0, 0, 0, 1, 1, 1, 0, 1, 4], dtype=np.float32).reshape(-1, 3)
@@ -101,3 +109,133 @@ def test_encode_decode():
     assert np.allclose(
         normals, tile.vLight, atol=0.01, rtol=0
     ), 'VertexNormals incorrect'
+
+
+def test_vertex_normals_extension_float32():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, 1, size=(1000, 3)).astype(np.float32)
+    triangles = (np.arange(998)[:, None] + np.array([0, 1, 2])).astype(np.uint32)
+
+    encoded = {}
+    for dtype in (np.float32, np.float64):
+        ext = extensions.VertexNormalsExtension(
+            positions=positions, indices=triangles, dtype=dtype
+        )
+        encoded[dtype] = np.frombuffer(ext.encode()[5:], dtype=np.uint8)
+
+    diff = encoded[np.float32].astype(np.int16) - encoded[np.float64]
+    assert np.abs(diff).max() <= 1
+
+
+def test_encode_into():
+    rng = np.random.default_rng(0)
+    # An odd number of vertices above 65536 requires padding before the indices
+    n = 70001
+    positions = rng.uniform(0, 1, size=(n, 3)).astype(np.float32)
+    triangles = np.arange(n - 2)[:, None] + np.array([0, 1, 2])
+    triangles = triangles.astype(np.uint32)
+    exts = [
+        extensions.VertexNormalsExtension(positions=positions, indices=triangles),
+        extensions.WaterMaskExtension(data=np.zeros((256, 256), dtype=np.uint8)),
+        extensions.MetadataExtension(data={'hello': 'world'}),
+    ]
+
+    f = BytesIO()
+    encode(f, positions, triangles, extensions=exts)
+    expected = f.getvalue()
+
+    size = encoded_size(positions, triangles, extensions=exts)
+    assert size == len(expected), 'Incorrect encoded size'
+
+    buf = bytearray(size + 3)
+    written = encode_into(buf, positions, triangles, offset=3, extensions=exts)
+    assert written == size
+    assert buf[3:] == expected, 'encode_into differs from encode'
+
+    with mmap.mmap(-1, size) as mm:
+        assert encode_into(mm, positions, triangles, extensions=exts) == size
+        assert mm[:] == expected, 'encode_into differs from encode'
+
+
+def test_encode_into_too_small(monkeypatch):
+    positions = np.random.default_rng(0).uniform(0, 1, size=(100, 3))
+    triangles = (np.arange(98)[:, None] + np.array([0, 1, 2])).astype(np.uint32)
+    size = encoded_size(positions, triangles)
+
+    # Checked before computing the header and vertices
+    def fail(*args, **kwargs):
+        raise RuntimeError('computed')
+
+    monkeypatch.setattr(encode_module, '_prepare', fail)
+    with pytest.raises(AssertionError, match='buffer too small'):
+        encode_into(bytearray(100), positions, triangles)
+    with pytest.raises(AssertionError, match='buffer too small'):
+        encode_into(bytearray(size), positions, triangles, offset=size + 1)
+    monkeypatch.undo()
+
+    # The exact size, with edge indices, is checked once computed
+    with pytest.raises(AssertionError, match='buffer too small'):
+        encode_into(bytearray(size - 1), positions, triangles)
+    assert encode_into(bytearray(size), positions, triangles) == size
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+@pytest.mark.parametrize('shape', [(-1,), (-1, 3)])
+def test_encode_shared_cartesian_positions(monkeypatch, dtype, shape):
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, 1, size=(100, 3)).astype(dtype).reshape(shape)
+    triangles = np.arange(98)[:, None] + np.array([0, 1, 2])
+    triangles = triangles.astype(np.uint32)
+    exts = [extensions.VertexNormalsExtension(positions=positions, indices=triangles)]
+
+    f = BytesIO()
+    encode(f, positions, triangles, extensions=exts)
+    expected = f.getvalue()
+
+    # Normals are the same as those of the extension on its own
+    assert expected.endswith(exts[0].encode())
+
+    # Positions are converted once, by encode, and shared with the extension
+    calls = []
+
+    def counting_to_ecef(*args, **kwargs):
+        calls.append(1)
+        return to_ecef(*args, **kwargs)
+
+    monkeypatch.setattr(encode_module, 'to_ecef', counting_to_ecef)
+    monkeypatch.setattr(extensions, 'to_ecef', counting_to_ecef)
+
+    f = BytesIO()
+    encode(f, positions, triangles, extensions=exts)
+    assert f.getvalue() == expected
+    assert len(calls) == 1, 'ECEF positions computed more than once'
+
+    cartesian_positions = to_ecef(positions.reshape(-1, 3))
+    calls.clear()
+    f = BytesIO()
+    encode(
+        f,
+        positions,
+        triangles,
+        extensions=exts,
+        cartesian_positions=cartesian_positions,
+    )
+    assert f.getvalue() == expected
+    assert not calls, 'Precomputed ECEF positions not used'
+
+
+def test_encode_num_threads():
+    rng = np.random.default_rng(0)
+    n = 100_000
+    positions = rng.uniform(0, 1, size=(n, 3)).astype(np.float32)
+    triangles = np.arange(n - 2)[:, None] + np.array([0, 1, 2])
+    triangles = triangles.astype(np.uint32)
+    exts = [extensions.VertexNormalsExtension(positions=positions, indices=triangles)]
+
+    outputs = set()
+    for num_threads in (1, 4, None):
+        f = BytesIO()
+        encode(f, positions, triangles, extensions=exts, num_threads=num_threads)
+        outputs.add(f.getvalue())
+
+    assert len(outputs) == 1, 'Output depends on the number of threads'
@@ -0,0 +1,103 @@
+import json
+import threading
+
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.extensions import (
+    METADATA_CACHE,
+    EncodedCache,
+    MetadataExtension,
+)
+
+
+def availability(level):
+    return {
+        'available': [
+            [{'startX': 0, 'startY': 0, 'endX': 2**i - 1, 'endY': 2**i - 1}]
+            for i in range(level)
+        ]
+    }
+
+
+def decode_metadata(encoded):
+    assert encoded[0] == extensions.ExtensionId.METADATA
+    length = int.from_bytes(encoded[1:5], 'little')
+    assert len(encoded) == 5 + length
+    return json.loads(encoded[5:])
+
+
+def test_metadata_cache():
+    METADATA_CACHE.clear()
+
+    # Equal dictionaries, from different objects
+    encoded = [MetadataExtension(data=availability(8)).encode() for _ in range(3)]
+    assert encoded[0] == encoded[1] == encoded[2]
+    assert decode_metadata(encoded[0]) == availability(8)
+    assert METADATA_CACHE.misses == 1 and METADATA_CACHE.hits == 2
+
+    other = MetadataExtension(data=availability(9)).encode()
+    assert decode_metadata(other) == availability(9)
+    assert METADATA_CACHE.misses == 2
+
+    uncached = MetadataExtension(data=availability(8), cache=False).encode()
+    assert uncached == encoded[0]
+    assert METADATA_CACHE.misses == 2 and METADATA_CACHE.hits == 2
+
+
+def test_metadata_cache_content():
+    METADATA_CACHE.clear()
+
+    data = {'a': 1}
+    assert decode_metadata(MetadataExtension(data=data).encode()) == {'a': 1}
+
+    # A modified dictionary is encoded again
+    data['a'] = 2
+    assert decode_metadata(MetadataExtension(data=data).encode()) == {'a': 2}
+
+    # The extension id is part of the encoded bytes
+    other_id = MetadataExtension(id=extensions.ExtensionId.WATER_MASK, data=data)
+    assert other_id.encode()[0] == extensions.ExtensionId.WATER_MASK
+
+    # 1 and True are different JSON values
+    assert MetadataExtension(data={'a': True}).encode().endswith(b'true}')
+    assert MetadataExtension(data={'a': 1}).encode().endswith(b'1}')
+
+
+def test_encoded_cache_eviction():
+    cache = EncodedCache(maxsize=2)
+    cache.get('a', lambda: b'a')
+    cache.get('b', lambda: b'b')
+    assert cache.get('a', lambda: b'x') == b'a'
+
+    # Least recently used entry is evicted
+    cache.get('c', lambda: b'c')
+    assert len(cache) == 2
+    assert cache.get('b', lambda: b'y') == b'y'
+    assert cache.get('a', lambda: b'z') == b'z'
+    assert cache.get('c', lambda: b'w') == b'w'
+
+
+def test_encoded_cache_threads():
+    cache = EncodedCache(maxsize=8)
+    results = []
+
+    def lookup(i):
+        results.append(cache.get(i % 16, lambda: bytes([i % 16])))
+
+    threads = [threading.Thread(target=lookup, args=(i,)) for i in range(200)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(cache) == 8
+    assert cache.hits + cache.misses == 200
+
+
+def test_metadata_orjson():
+    pytest.importorskip('orjson')
+
+    data = availability(8)
+    ext = MetadataExtension(data=data, json_backend='orjson')
+    assert ext.encode() == MetadataExtension(data=data).encode()
@@ -0,0 +1,125 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.decode import decode
+from quantized_mesh_encoder.ecef import to_ecef
+from quantized_mesh_encoder.encode import encode
+from quantized_mesh_encoder.heightmap import (
+    encode_heightmap,
+    grid_positions,
+    grid_topology,
+    grid_vertex_normals,
+)
+from quantized_mesh_encoder.normals import compute_vertex_normals
+
+BOUNDS = (10.0, 45.0, 10.5, 45.25)
+
+
+@pytest.mark.parametrize('shape', [(2, 2), (5, 7), (65, 65)])
+def test_encode_heightmap(shape):
+    heights = np.random.default_rng(0).uniform(0, 500, shape).astype(np.float32)
+    metadata = extensions.MetadataExtension(data={'hello': 'world'})
+
+    f = BytesIO()
+    encode_heightmap(f, heights, bounds=BOUNDS, extensions=[metadata])
+    tile = decode(f.getvalue())
+
+    assert len(tile.indices) == 2 * (shape[0] - 1) * (shape[1] - 1)
+    assert tile.metadata == {'hello': 'world'}
+
+    # Same vertices and triangles as encoding the triangulated grid directly
+    positions = grid_positions(heights, BOUNDS, topology=grid_topology(*shape))
+    expected = BytesIO()
+    encode(expected, positions, tile.indices, bounds=BOUNDS, extensions=[metadata])
+    expected_tile = decode(expected.getvalue())
+    for name in ('u', 'v', 'height', 'indices', 'west', 'south', 'east', 'north'):
+        assert np.array_equal(getattr(tile, name), getattr(expected_tile, name))
+
+    decoded = tile.positions(BOUNDS)
+    assert np.allclose(decoded[:, 2], positions[:, 2], atol=0.05)
+
+
+@pytest.mark.parametrize(
+    'bounds',
+    [
+        (10.1, 45.2, 10.2, 45.3),
+        (-122.1240234375, 47.1240234375, -122.12127685546875, 47.12677001953125),
+    ],
+)
+def test_encode_heightmap_bounds(bounds, smooth_heights):
+    # Bounds that float32 can't represent exactly
+    rows, cols = 65, 33
+    heights = smooth_heights(rows, cols)
+    topology = grid_topology(rows, cols)
+
+    f = BytesIO()
+    encode_heightmap(f, heights, bounds=bounds)
+    tile = decode(f.getvalue())
+
+    # u and v are the exact quantization of the grid
+    assert np.array_equal(tile.u, topology.cols * 32767 // (cols - 1))
+    assert np.array_equal(tile.v, (rows - 1 - topology.rows) * 32767 // (rows - 1))
+
+    positions = grid_positions(heights, bounds, topology=topology, dtype=np.float64)
+    minx, miny, maxx, maxy = bounds
+    step = np.array([maxx - minx, maxy - miny]) / 32767
+    assert np.all(np.abs(tile.positions(bounds)[:, :2] - positions[:, :2]) <= step)
+
+    # The bounding sphere contains the grid, up to float32 precision
+    header = tile.header
+    center = np.array(
+        [header[f'boundingSphereCenter{axis}'] for axis in 'XYZ'], dtype=np.float64
+    )
+    dist = np.linalg.norm(to_ecef(positions) - center, axis=1)
+    assert dist.max() <= header['boundingSphereRadius'] + 1
+
+
+def test_encode_heightmap_winding(smooth_heights):
+    heights = smooth_heights(9, 9)
+    f = BytesIO()
+    encode_heightmap(f, heights, bounds=BOUNDS)
+    tile = decode(f.getvalue())
+
+    u, v = tile.u.astype(np.int64), tile.v.astype(np.int64)
+    a, b, c = tile.indices.T
+    cross = (u[b] - u[a]) * (v[c] - v[a]) - (v[b] - v[a]) * (u[c] - u[a])
+    assert np.all(cross > 0), 'Triangles must be counter-clockwise'
+
+
+def test_encode_heightmap_vertex_normals(smooth_heights):
+    heights = smooth_heights(33, 33)
+    f = BytesIO()
+    encode_heightmap(f, heights, bounds=BOUNDS, vertex_normals=True)
+    tile = decode(f.getvalue())
+
+    positions = grid_positions(heights, BOUNDS, topology=grid_topology(33, 33))
+    expected = compute_vertex_normals(to_ecef(positions), tile.indices)
+    # Normals are encoded with 8 bits per component
+    assert np.allclose(tile.normals(), expected, atol=0.02)
+
+
+def test_grid_vertex_normals_flat():
+    heights = np.zeros((3, 3))
+    normals = grid_vertex_normals(heights, BOUNDS).reshape(-1, 3)
+    up = to_ecef(grid_positions(heights, BOUNDS).astype(np.float64) + [0, 0, 1])
+    up -= to_ecef(grid_positions(heights, BOUNDS).astype(np.float64))
+    assert np.allclose(normals, up, atol=1e-6)
+
+
+def test_encode_heightmap_duplicate_extension(smooth_heights):
+    heights = smooth_heights(3, 3)
+    positions = grid_positions(heights, BOUNDS)
+    normals = extensions.VertexNormalsExtension(
+        positions=positions, indices=np.array([0, 1, 2], dtype=np.uint32)
+    )
+    with pytest.raises(AssertionError):
+        encode_heightmap(
+            BytesIO(),
+            heights,
+            bounds=BOUNDS,
+            vertex_normals=True,
+            extensions=[normals],
+        )
@@ -0,0 +1,105 @@
+import gzip
+import sqlite3
+import threading
+
+import pytest
+
+from quantized_mesh_encoder import decode, encode_many
+from quantized_mesh_encoder.mbtiles import MBTILES_FORMAT, MBTilesReader, MBTilesWriter
+from quantized_mesh_encoder.tiling import layer_json
+
+
+def test_mbtiles_dedup(tmp_path, tile_data):
+    path = tmp_path / 'layer.mbtiles'
+    with MBTilesWriter(path, batch_size=3, metadata={'name': 'test'}) as writer:
+        for x in range(10):
+            writer.write(x, 0, 4, tile_data(x % 2))
+        writer.write_many([(0, 1, 4, tile_data(2))])
+
+    assert writer.n_tiles == 11
+    assert writer.n_unique == 3
+
+    with sqlite3.connect(path) as conn:
+        assert conn.execute('SELECT COUNT(*) FROM images').fetchone() == (3,)
+        assert conn.execute('SELECT COUNT(*) FROM tiles').fetchone() == (11,)
+        assert conn.execute('PRAGMA journal_mode').fetchone() == ('delete',)
+
+    with MBTilesReader(path) as reader:
+        assert reader.metadata == {'name': 'test', 'format': MBTILES_FORMAT}
+        assert reader.compression is None
+        assert reader.get(3, 0, 4) == tile_data(1)
+        assert reader.get(0, 1, 4) == tile_data(2)
+        assert reader.get(0, 2, 4) is None
+        assert (4, 0, 4) in reader
+        assert len(list(reader.tiles())) == 11
+
+        available = reader.available()
+        assert list(available) == [4]
+        assert sorted(zip(*(a.tolist() for a in available[4]))) == sorted(
+            [(x, 0) for x in range(10)] + [(0, 1)]
+        )
+
+
+def test_mbtiles_append_replace(tmp_path, tile_data):
+    path = tmp_path / 'layer.mbtiles'
+    with MBTilesWriter(path) as writer:
+        writer.write(0, 0, 0, tile_data(0))
+        writer.write(1, 0, 0, tile_data(1))
+
+    with MBTilesWriter(path, metadata={'bounds': [0, 0, 1, 1]}) as writer:
+        writer.write(1, 0, 0, tile_data(0))
+        writer.write(0, 0, 1, tile_data(2))
+
+    assert writer.n_unique == 1
+    with MBTilesReader(path) as reader:
+        assert reader.get(1, 0, 0) == tile_data(0)
+        assert reader.get(0, 0, 1) == tile_data(2)
+        assert reader.metadata['bounds'] == '[0, 0, 1, 1]'
+
+
+def test_mbtiles_compression(tmp_path, quad_mesh):
+    positions, indices = quad_mesh
+    path = tmp_path / 'layer.mbtiles'
+    layer = layer_json({0: ([0, 1], [0, 0])}, name='test')
+    jobs = [(positions, indices), (positions[::-1].copy(), indices)]
+
+    with MBTilesWriter(path, compression='gzip', metadata={'json': layer}) as writer:
+        writer.write(0, 0, 0, encode_many(jobs[:1], backend='thread').__next__())
+        for x, data in enumerate(
+            encode_many(jobs, backend='thread', compression='gzip')
+        ):
+            writer.write(x, 0, 1, data, compressed=True)
+
+    with MBTilesReader(path) as reader:
+        assert reader.compression == 'gzip'
+        assert reader.get(0, 0, 0) == reader.get(0, 0, 1)
+        assert writer.n_unique == 2
+
+        tile = decode(gzip.decompress(reader.get(1, 0, 1)))
+        assert tile.u.shape == (4,)
+
+
+def test_mbtiles_reader_threads(tmp_path, tile_data):
+    path = tmp_path / 'layer.mbtiles'
+    with MBTilesWriter(path) as writer:
+        for x in range(50):
+            writer.write(x, 0, 6, tile_data(x))
+
+    reader = MBTilesReader(path)
+    results = {}
+
+    def read(x):
+        results[x] = reader.get(x, 0, 6)
+        reader.close()
+
+    threads = [threading.Thread(target=read, args=(x,)) for x in range(50)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert results == {x: tile_data(x) for x in range(50)}
+
+    # Read-only
+    with pytest.raises(sqlite3.OperationalError):
+        reader._conn().execute('DELETE FROM map')
@@ -0,0 +1,83 @@
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder.bounding_sphere import bounding_sphere
+from quantized_mesh_encoder.ecef import to_ecef
+from quantized_mesh_encoder.encode import compute_header
+from quantized_mesh_encoder.occlusion import occlusion_point
+from quantized_mesh_encoder.tiling import tile_bounds
+
+OCCLUSION_POINT_KEYS = [
+    'horizonOcclusionPointX',
+    'horizonOcclusionPointY',
+    'horizonOcclusionPointZ',
+]
+
+
+def test_occlusion_point_inputs_unchanged():
+    rng = np.random.default_rng(0)
+    positions = rng.uniform(0, 1, size=(100, 3)).astype(np.float32)
+    cartesian_positions = to_ecef(positions)
+    center, _ = bounding_sphere(cartesian_positions)
+
+    original_positions = cartesian_positions.copy()
+    original_center = center.copy()
+    point = occlusion_point(cartesian_positions, center)
+
+    assert np.array_equal(cartesian_positions, original_positions)
+    assert np.array_equal(center, original_center)
+
+    # The occlusion point is along the direction of the bounding sphere center
+    assert np.allclose(np.cross(point, center), 0, atol=1e-3 * np.dot(center, center))
+    assert np.linalg.norm(point) > np.linalg.norm(center)
+
+
+@pytest.mark.parametrize('z', [1, 4, 9, 15])
+def test_occlusion_point_from_bounds_conservative(z):
+    rng = np.random.default_rng(z)
+    bounds = tuple(tile_bounds(2**z // 3, 2**z // 2, z))
+    n = 1000
+    positions = np.column_stack(
+        [
+            rng.uniform(bounds[0], bounds[2], n),
+            rng.uniform(bounds[1], bounds[3], n),
+            rng.uniform(-100, 4000, n),
+        ]
+    )
+    # Corners of the tile at the maximum height are the hardest to occlude
+    positions[:4, :2] = [[bounds[x], bounds[y]] for x in (0, 2) for y in (1, 3)]
+    positions[:4, 2] = 4000
+    positions = positions.astype(np.float32)
+
+    exact = compute_header(positions, None)
+    header = compute_header(positions, None, occlusion_method='bounds', bounds=bounds)
+    exact_point = np.array([exact[k] for k in OCCLUSION_POINT_KEYS])
+    point = np.array([header[k] for k in OCCLUSION_POINT_KEYS])
+
+    # Along the same direction, and at most slightly farther out
+    ratio = np.linalg.norm(point) / np.linalg.norm(exact_point)
+    assert 1 <= ratio < 1.001
+    assert np.allclose(point / ratio, exact_point, rtol=1e-6)
+
+
+def test_occlusion_point_from_bounds_hemisphere():
+    # Falls back to the exact point for a tile spanning a hemisphere
+    lon, lat = np.meshgrid(np.linspace(-180, 0, 9), np.linspace(-90, 90, 9))
+    positions = np.column_stack([lon.ravel(), lat.ravel(), np.zeros(lon.size)])
+    positions = positions.astype(np.float32)
+
+    header = compute_header(
+        positions, None, occlusion_method='bounds', bounds=(-180, -90, 0, 90)
+    )
+    assert header == compute_header(positions, None)
+
+
+def test_compute_header_occlusion_method():
+    positions = np.array([[10, 45, 0], [10.1, 45, 10], [10, 45.1, 20]], np.float32)
+    header = compute_header(positions, None, occlusion_method='bounds')
+    exact = compute_header(positions, None)
+    for key in OCCLUSION_POINT_KEYS:
+        assert header[key] != exact[key]
+
+    with pytest.raises(AssertionError):
+        compute_header(positions, None, occlusion_method='unknown')
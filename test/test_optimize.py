@@ -0,0 +1,77 @@
+from collections import deque
+
+import numpy as np
+
+from quantized_mesh_encoder.optimize import optimize_mesh
+from quantized_mesh_encoder.util_cy import encode_indices
+
+
+def grid_mesh(n, seed=0):
+    rng = np.random.default_rng(seed)
+    xs, ys = np.meshgrid(np.linspace(0, 1, n), np.linspace(0, 1, n))
+    heights = rng.uniform(0, 10, n * n)
+    positions = np.column_stack([xs.ravel(), ys.ravel(), heights]).astype(np.float32)
+
+    grid = np.arange(n * n).reshape(n, n)
+    nw, ne = grid[:-1, :-1].ravel(), grid[:-1, 1:].ravel()
+    sw, se = grid[1:, :-1].ravel(), grid[1:, 1:].ravel()
+    triangles = np.concatenate(
+        [np.column_stack([nw, ne, sw]), np.column_stack([ne, se, sw])]
+    )
+
+    # Shuffle triangles and vertices
+    triangles = triangles[rng.permutation(len(triangles))]
+    perm = rng.permutation(n * n)
+    new_positions = np.empty_like(positions)
+    new_positions[perm] = positions
+    return new_positions, perm[triangles].astype(np.uint32)
+
+
+def cache_miss_ratio(indices, cache_size=16):
+    cache = deque(maxlen=cache_size)
+    misses = 0
+    for v in indices.ravel():
+        if v not in cache:
+            misses += 1
+            cache.append(v)
+    return misses / len(indices)
+
+
+def test_optimize_mesh_same_triangles():
+    positions, triangles = grid_mesh(20)
+    new_positions, new_triangles = optimize_mesh(positions, triangles)
+
+    assert new_positions.shape == positions.shape
+    assert new_triangles.shape == triangles.shape
+
+    # Compare each triangle by the coordinates of its vertices, which preserves
+    # winding
+    before = sorted(map(tuple, positions[triangles].reshape(-1, 9).tolist()))
+    after = sorted(map(tuple, new_positions[new_triangles].reshape(-1, 9).tolist()))
+    assert before == after, 'Triangles changed'
+
+
+def test_optimize_mesh_first_use_order():
+    positions, triangles = grid_mesh(20)
+    _, new_triangles = optimize_mesh(positions.ravel(), triangles.ravel())
+
+    # Each vertex is introduced as the next highest index, so every new vertex
+    # is encoded as a 0
+    encoded = encode_indices(new_triangles.ravel())
+    assert (encoded == 0).sum() == len(positions), 'Not in first use order'
+
+
+def test_optimize_mesh_cache_locality():
+    positions, triangles = grid_mesh(20)
+    _, new_triangles = optimize_mesh(positions, triangles)
+    assert cache_miss_ratio(new_triangles) < 0.8
+    assert cache_miss_ratio(new_triangles) < cache_miss_ratio(triangles) / 2
+
+
+def test_optimize_mesh_unused_vertices():
+    positions = np.arange(15, dtype=np.float32).reshape(-1, 3)
+    triangles = np.array([[4, 2, 3]], dtype=np.uint32)
+    new_positions, new_triangles = optimize_mesh(positions, triangles)
+
+    assert new_triangles.tolist() == [[0, 1, 2]]
+    assert np.array_equal(new_positions, positions[[4, 2, 3, 0, 1]])
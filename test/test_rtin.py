@@ -0,0 +1,142 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder.decode import decode
+from quantized_mesh_encoder.encode import encode
+from quantized_mesh_encoder.rtin import (
+    heightmap_errors,
+    simplify_heightmap,
+    triangle_coords,
+)
+
+BOUNDS = (10.0, 45.0, 10.5, 45.5)
+
+
+def mesh_heights(positions, indices, size):
+    """Height of the mesh at every grid vertex, by barycentric interpolation"""
+    minx, miny, maxx, maxy = BOUNDS
+    col = np.rint((positions[:, 0] - minx) / (maxx - minx) * (size - 1))
+    row = np.rint((maxy - positions[:, 1]) / (maxy - miny) * (size - 1))
+    out = np.full((size, size), np.nan)
+
+    for a, b, c in indices:
+        ax, ay, bx, by, cx, cy = col[a], row[a], col[b], row[b], col[c], row[c]
+        r, k = np.mgrid[
+            min(ay, by, cy) : max(ay, by, cy) + 1,
+            min(ax, bx, cx) : max(ax, bx, cx) + 1,
+        ]
+        area = (bx - ax) * (cy - ay) - (by - ay) * (cx - ax)
+        wa = ((bx - k) * (cy - r) - (by - r) * (cx - k)) / area
+        wb = ((cx - k) * (ay - r) - (cy - r) * (ax - k)) / area
+        wc = 1 - wa - wb
+        inside = (wa >= -1e-9) & (wb >= -1e-9) & (wc >= -1e-9)
+        h = wa * positions[a, 2] + wb * positions[b, 2] + wc * positions[c, 2]
+        out[r[inside].astype(int), k[inside].astype(int)] = h[inside]
+
+    return out
+
+
+def test_triangle_coords():
+    coords = triangle_coords(5)
+    assert coords.shape == (4 * 4 * 2 - 2, 4)
+    assert coords[:2].tolist() == [[4, 4, 0, 0], [0, 0, 4, 4]]
+    assert triangle_coords(5) is coords
+    assert not coords.flags.writeable
+
+    with pytest.raises(AssertionError):
+        triangle_coords(6)
+
+
+@pytest.mark.parametrize('shape', [(64, 64), (65, 33), (65,), (1, 1)])
+def test_simplify_invalid_heights(shape):
+    heights = np.zeros(shape)
+    with pytest.raises(AssertionError, match=r'2\^n \+ 1'):
+        heightmap_errors(heights)
+
+    # Also checked when errors are passed
+    with pytest.raises(AssertionError, match=r'2\^n \+ 1'):
+        simplify_heightmap(heights, BOUNDS, errors=np.zeros(shape))
+
+
+def test_simplify_flat():
+    positions, indices = simplify_heightmap(np.full((65, 65), 10.0), BOUNDS)
+    assert len(positions) == 4 and len(indices) == 2
+    assert np.array_equal(
+        np.unique(positions[:, :2], axis=0),
+        [[10.0, 45.0], [10.0, 45.5], [10.5, 45.0], [10.5, 45.5]],
+    )
+    assert np.all(positions[:, 2] == 10)
+
+
+@pytest.mark.parametrize(
+    'size, plane, dtype',
+    [
+        (65, (3, 2, 0.1), np.float64),
+        (257, (0.1, 0, 0), np.float64),
+        (257, (0.37, -1.3, 8000), np.float64),
+        (129, (0.1, 0.7, 1000), np.float32),
+    ],
+)
+def test_simplify_sloped(size, plane, dtype):
+    # Rounding errors of sloped planes don't prevent merging triangles
+    a, b, c = plane
+    y, x = np.mgrid[0:size, 0:size]
+    heights = (a * x + b * y + c).astype(dtype)
+    positions, indices = simplify_heightmap(heights, BOUNDS)
+    assert len(positions) == 4 and len(indices) == 2
+
+
+def test_simplify_full_resolution():
+    heights = np.random.default_rng(0).uniform(0, 100, (17, 17))
+    positions, indices = simplify_heightmap(heights, BOUNDS)
+    assert len(positions) == 17 * 17
+    assert len(indices) == 2 * 16 * 16
+    assert np.allclose(mesh_heights(positions, indices, 17), heights, atol=1e-4)
+
+
+@pytest.mark.parametrize('max_error', [0.5, 2, 10, 50])
+def test_simplify_max_error(max_error, smooth_heights):
+    heights = smooth_heights(33, noise=2)
+    errors = heightmap_errors(heights)
+    positions, indices = simplify_heightmap(
+        heights, BOUNDS, max_error=max_error, errors=errors
+    )
+    assert len(positions) < 33 * 33
+
+    # Every grid vertex is covered once and within max_error of the mesh
+    interpolated = mesh_heights(positions, indices, 33)
+    assert not np.isnan(interpolated).any()
+    assert np.abs(interpolated - heights).max() <= max_error + 1e-3
+
+    # Reusing errors gives the same mesh
+    p, i = simplify_heightmap(heights, BOUNDS, max_error=max_error)
+    assert np.array_equal(p, positions) and np.array_equal(i, indices)
+
+
+def test_simplify_order_and_winding(smooth_heights):
+    heights = smooth_heights(65, noise=2)
+    positions, indices = simplify_heightmap(heights, BOUNDS, max_error=1)
+
+    # Vertices are numbered in first use order, for high-water mark encoding
+    flat = indices.ravel().astype(np.int64)
+    highest = np.maximum.accumulate(np.concatenate([[-1], flat]))[:-1]
+    assert np.all(flat <= highest + 1)
+    assert flat.max() == len(positions) - 1
+
+    x, y = positions[:, 0].astype(np.float64), positions[:, 1].astype(np.float64)
+    a, b, c = indices.T
+    cross = (x[b] - x[a]) * (y[c] - y[a]) - (y[b] - y[a]) * (x[c] - x[a])
+    assert np.all(cross > 0), 'Triangles must be counter-clockwise'
+
+
+def test_simplify_encode(smooth_heights):
+    heights = smooth_heights(65, noise=2)
+    positions, indices = simplify_heightmap(heights, BOUNDS, max_error=2)
+
+    f = BytesIO()
+    encode(f, positions, indices, bounds=BOUNDS)
+    tile = decode(f.getvalue())
+    assert np.array_equal(tile.indices, indices)
+    assert np.allclose(tile.positions(BOUNDS)[:, 2], positions[:, 2], atol=0.05)
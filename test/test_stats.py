@@ -0,0 +1,142 @@
+import gzip
+import tracemalloc
+from io import BytesIO
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.encode import encode, encode_into, encoded_size
+from quantized_mesh_encoder.stats import EncodeStats
+
+WRITE_STAGES = [
+    'write_header',
+    'write_vertices',
+    'write_indices',
+    'write_edge_indices',
+    'write_extensions',
+]
+
+
+def make_extensions(positions, indices):
+    return [
+        extensions.VertexNormalsExtension(positions=positions, indices=indices),
+        extensions.MetadataExtension(data={'a': 1}),
+    ]
+
+
+def test_encode_stats(quad_mesh):
+    positions, indices = quad_mesh
+    stats = EncodeStats()
+    with BytesIO() as f:
+        encode(
+            f,
+            positions,
+            indices,
+            extensions=make_extensions(positions, indices),
+            stats=stats,
+        )
+        data = f.getvalue()
+
+    names = [stage.name for stage in stats.stages]
+    assert names == [
+        'to_ecef',
+        'compute_header',
+        'bounding_sphere',
+        'occlusion_point',
+        'encode_vertices',
+        'extension:vertex_normals',
+        'extension:metadata',
+        *WRITE_STAGES,
+        'write',
+    ]
+    assert stats.n_vertices == 4
+    assert stats.n_triangles == 2
+    assert stats.nbytes == len(data)
+
+    by_name = {stage.name: stage for stage in stats.stages}
+    assert sum(by_name[name].nbytes for name in WRITE_STAGES) == len(data)
+    assert by_name['write'].nbytes == len(data)
+    assert by_name['write_header'].nbytes == 88
+    assert by_name['extension:vertex_normals'].nbytes == 5 + 2 * 4
+    assert by_name['write_extensions'].nbytes == (
+        by_name['extension:vertex_normals'].nbytes
+        + by_name['extension:metadata'].nbytes
+    )
+
+    assert all(stage.seconds >= 0 for stage in stats.stages)
+    assert stats.seconds == sum(stage.seconds for stage in stats.stages)
+    assert all(stage.allocated is None for stage in stats.stages)
+
+    # Recording stats doesn't change the output
+    with BytesIO() as f:
+        encode(f, positions, indices, extensions=make_extensions(positions, indices))
+        assert f.getvalue() == data
+
+
+def test_encode_stats_compression(quad_mesh):
+    positions, indices = quad_mesh
+    stats = EncodeStats()
+    with BytesIO() as f:
+        encode(f, positions, indices, compression='gzip', stats=stats)
+        data = f.getvalue()
+
+    by_name = {stage.name: stage for stage in stats.stages}
+    assert by_name['compress'].nbytes == len(data)
+    assert by_name['write'].nbytes == len(data)
+    assert stats.nbytes == len(data)
+    assert by_name['write_header'].nbytes + by_name['write_vertices'].nbytes < len(
+        gzip.decompress(data)
+    )
+
+
+def test_encode_into_stats(quad_mesh):
+    positions, indices = quad_mesh
+    stats = EncodeStats()
+    size = encoded_size(positions, indices)
+    buf = bytearray(size + 8)
+    n_bytes = encode_into(buf, positions, indices, offset=8, stats=stats)
+
+    names = [stage.name for stage in stats.stages]
+    assert 'write' not in names
+    assert names[-len(WRITE_STAGES) :] == WRITE_STAGES
+    assert stats.nbytes == n_bytes == size
+
+    # Stats are cleared on each call
+    encode_into(buf, positions, indices, stats=stats)
+    assert len(stats.stages) == len(names)
+
+
+def test_stats_allocated(quad_mesh):
+    positions, indices = quad_mesh
+    stats = EncodeStats()
+    tracemalloc.start()
+    try:
+        # The caller's peak isn't reset by stages
+        buf = bytearray(10**6)
+        del buf
+        with BytesIO() as f:
+            encode(f, positions, indices, stats=stats)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    assert peak >= 10**6
+    assert all(isinstance(stage.allocated, int) for stage in stats.stages)
+    # Arrays computed by the stage are still held at its end
+    by_name = {stage.name: stage for stage in stats.stages}
+    assert by_name['encode_vertices'].allocated > 0
+
+
+def test_stats_as_dict(quad_mesh):
+    positions, indices = quad_mesh
+    stats = EncodeStats()
+    with BytesIO() as f:
+        encode(f, positions, indices, stats=stats)
+
+    by_name = {stage.name: stage for stage in stats.stages}
+    d = stats.as_dict()
+    assert d['n_vertices'] == 4
+    assert d['nbytes'] == stats.nbytes
+    assert d['stages']['write_vertices'] == {
+        'seconds': by_name['write_vertices'].seconds,
+        'nbytes': 4 + 3 * 2 * 4,
+        'allocated': None,
+    }
@@ -0,0 +1,131 @@
+import io
+import json
+
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.tiling import (
+    GEOGRAPHIC,
+    MAX_MERCATOR_LATITUDE,
+    WEB_MERCATOR,
+    child_tiles,
+    compact_ranges,
+    layer_json,
+    parent_tiles,
+    tile_bounds,
+    tile_counts,
+    tile_range,
+    tiles_in_range,
+    write_layer_json,
+)
+
+
+def test_tile_bounds_geographic():
+    bounds = tile_bounds([0, 1], 0, 0)
+    assert np.array_equal(bounds, [[-180, -90, 0, 90], [0, -90, 180, 90]])
+
+    assert np.array_equal(tile_bounds(3, 1, 1), [90, 0, 180, 90])
+
+
+def test_tile_bounds_web_mercator():
+    bounds = tile_bounds(0, 0, 0, projection=WEB_MERCATOR)
+    expected = [-180, -MAX_MERCATOR_LATITUDE, 180, MAX_MERCATOR_LATITUDE]
+    assert np.allclose(bounds, expected)
+
+    # Northeast tile at level 1
+    bounds = tile_bounds(1, 1, 1, projection=WEB_MERCATOR)
+    assert np.allclose(bounds, [0, 0, 180, MAX_MERCATOR_LATITUDE])
+
+
+@pytest.mark.parametrize('projection', [GEOGRAPHIC, WEB_MERCATOR])
+def test_tile_bounds_tile_the_world(projection):
+    z = 5
+    n_x, n_y = tile_counts(z, projection=projection)
+    x, y = tiles_in_range(0, 0, n_x - 1, n_y - 1)
+    bounds = tile_bounds(x, y, z, projection=projection).reshape(n_y, n_x, 4)
+
+    # Neighboring tiles share edges
+    assert np.allclose(bounds[:, 1:, 0], bounds[:, :-1, 2])
+    assert np.allclose(bounds[1:, :, 1], bounds[:-1, :, 3])
+
+    # Each tile is within the bounds of its parent
+    parent = tile_bounds(*parent_tiles(x, y, z), projection=projection)
+    bounds = bounds.reshape(-1, 4)
+    assert np.all(bounds[:, :2] >= parent[:, :2] - 1e-9)
+    assert np.all(bounds[:, 2:] <= parent[:, 2:] + 1e-9)
+
+
+@pytest.mark.parametrize('projection', [GEOGRAPHIC, WEB_MERCATOR])
+def test_tile_range(projection):
+    z = 8
+    bounds = (10.2, 45.1, 11.7, 46.3)
+    min_x, min_y, max_x, max_y = tile_range(z, bounds, projection=projection)
+
+    x, y = tiles_in_range(min_x - 1, min_y - 1, max_x + 1, max_y + 1)
+    tiles = tile_bounds(x, y, z, projection=projection)
+    intersects = (
+        (tiles[:, 0] < bounds[2])
+        & (tiles[:, 2] > bounds[0])
+        & (tiles[:, 1] < bounds[3])
+        & (tiles[:, 3] > bounds[1])
+    )
+    in_range = (x >= min_x) & (x <= max_x) & (y >= min_y) & (y <= max_y)
+    assert np.array_equal(intersects, in_range)
+
+
+def test_tile_range_edge():
+    # Bounds of a single tile don't include its neighbors
+    bounds = tile_bounds(5, 3, 3)
+    assert tile_range(3, bounds) == (5, 3, 5, 3)
+
+
+def test_parent_child_tiles():
+    x, y, z = child_tiles([3, 10], [1, 4], 4)
+    assert x.shape == (2, 4)
+    assert np.array_equal(x[0], [6, 7, 6, 7])
+    assert np.array_equal(y[0], [2, 2, 3, 3])
+    assert np.all(z == 5)
+
+    px, py, pz = parent_tiles(x, y, z)
+    assert np.array_equal(px, [[3] * 4, [10] * 4])
+    assert np.array_equal(py, [[1] * 4, [4] * 4])
+    assert np.all(pz == 4)
+
+
+def test_compact_ranges():
+    rng = np.random.default_rng(0)
+    mask = rng.uniform(size=(20, 30)) < 0.7
+    y, x = np.nonzero(mask)
+    ranges = compact_ranges(np.concatenate([x, x[:10]]), np.concatenate([y, y[:10]]))
+
+    covered = np.zeros_like(mask, dtype=int)
+    for r in ranges:
+        covered[r['startY'] : r['endY'] + 1, r['startX'] : r['endX'] + 1] += 1
+
+    assert np.array_equal(covered, mask.astype(int)), 'Ranges differ from tiles'
+
+    assert compact_ranges([], []) == []
+    x, y = tiles_in_range(2, 3, 9, 7)
+    assert compact_ranges(x, y) == [{'startX': 2, 'startY': 3, 'endX': 9, 'endY': 7}]
+
+
+def test_layer_json():
+    x, y = tiles_in_range(4, 2, 5, 3)
+    exts = [extensions.MetadataExtension(data={}), extensions.ExtensionId.WATER_MASK]
+    layer = layer_json({0: ([0, 1], [0, 0]), 2: (x, y)}, name='test', extensions=exts)
+
+    assert layer['format'] == 'quantized-mesh-1.0'
+    assert layer['scheme'] == 'tms'
+    assert layer['projection'] == 'EPSG:4326'
+    assert layer['extensions'] == ['metadata', 'watermask']
+    assert layer['maxzoom'] == 2
+    assert layer['available'] == [
+        [{'startX': 0, 'startY': 0, 'endX': 1, 'endY': 0}],
+        [],
+        [{'startX': 4, 'startY': 2, 'endX': 5, 'endY': 3}],
+    ]
+
+    f = io.StringIO()
+    write_layer_json(f, {0: ([0, 1], [0, 0])}, name='test')
+    assert json.loads(f.getvalue())['name'] == 'test'
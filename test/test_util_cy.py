@@ -1,7 +1,23 @@
 import numpy as np
 import pytest
 
-from quantized_mesh_encoder.util_cy import encode_indices
+from quantized_mesh_encoder.constants import WGS84
+from quantized_mesh_encoder.ecef import to_ecef
+from quantized_mesh_encoder.encode import interp_positions, quantization_range
+from quantized_mesh_encoder.normals import sign_not_zero
+from quantized_mesh_encoder.occlusion import squared_norm
+from quantized_mesh_encoder.util import zig_zag_encode
+from quantized_mesh_encoder.util_cy import (
+    add_vertex_normals,
+    encode_indices,
+    encode_vertices,
+    occlusion_magnitudes,
+    occlusion_max_magnitude,
+    oct_encode,
+    oct_vertex_normals,
+    ritter_second_pass,
+    vertex_normals,
+)
 
 
 # From quantized_mesh_tile.utils
@@ -15,6 +31,98 @@ def decode_indices(indices):
     return out
 
 
+def compute_vertex_normals_numpy(positions, indices):
+    """NumPy reference implementation of `compute_vertex_normals`"""
+    # Make sure indices and positions are both arrays of shape (-1, 3)
+    positions = positions.reshape(-1, 3).astype('float64')
+    indices = indices.reshape(-1, 3)
+
+    # Perform coordinate lookup in positions using indices
+    # positions and indices are both arrays of shape (-1, 3)
+    # `coords` is then an array of shape (-1, 3, 3) where each block of (i, 3,
+    # 3) represents all the coordinates of a single triangle
+    tri_coords = positions[indices]
+
+    # a, b, and c represent a single vertex for every triangle
+    a = tri_coords[:, 0, :]
+    b = tri_coords[:, 1, :]
+    c = tri_coords[:, 2, :]
+
+    # This computes the normal for each triangle "face". So there's one normal
+    # vector for each triangle.
+    face_normals = np.cross(b - a, c - a)
+
+    # The magnitude of the cross product of b - a and c - a is the area of the
+    # parallellogram spanned by these vectors; the triangle has half the area
+    # https://math.stackexchange.com/q/3103543
+    tri_areas = np.linalg.norm(face_normals, axis=1) / 2
+
+    # Multiply each face normal by the area of that triangle
+    weighted_face_normals = np.multiply(face_normals, tri_areas[:, np.newaxis])
+
+    # Sum up each vertex normal
+    # According to the implementation this is ported from, since you weight the
+    # face normals by the area, you can just sum up the vectors.
+    vertex_normals = np.zeros(positions.shape, dtype=np.float64)
+    add_vertex_normals(indices, weighted_face_normals, vertex_normals)
+
+    # Normalize vertex normals by dividing by each vector's length
+    normalized_vertex_normals = (
+        vertex_normals / np.linalg.norm(vertex_normals, axis=1)[:, np.newaxis]
+    )
+
+    return normalized_vertex_normals
+
+
+def compute_magnitude_numpy(positions, bounding_center):
+    """NumPy reference implementation of `compute_magnitude`"""
+    magnitude_squared = squared_norm(positions)
+    magnitude = np.sqrt(magnitude_squared)
+
+    # Can make this cleaner by broadcasting division
+    direction = positions.copy()
+    direction[:, 0] /= magnitude
+    direction[:, 1] /= magnitude
+    direction[:, 2] /= magnitude
+
+    magnitude_squared = np.maximum(magnitude_squared, 1)
+    magnitude = np.maximum(magnitude, 1)
+
+    cos_alpha = np.dot(direction, bounding_center.T)
+    sin_alpha = np.linalg.norm(np.cross(direction, bounding_center), axis=1)
+    cos_beta = 1 / magnitude
+    sin_beta = np.sqrt(magnitude_squared - 1.0) * cos_beta
+
+    return 1 / (cos_alpha * cos_beta - sin_alpha * sin_beta)
+
+
+def oct_encode_numpy(vec):
+    """
+    NumPy reference implementation of `oct_encode`
+
+    Compress x, y, z 96-bit floating point into x, z 16-bit representation (2 snorm values)
+    https://github.com/AnalyticalGraphicsInc/cesium/blob/b161b6429b9201c99e5fb6f6e6283f3e8328b323/Source/Core/AttributeCompression.js#L43
+    https://github.com/loicgasser/quantized-mesh-tile/blob/750125d3885fd89e3e12dce8fe075fbdc0adc323/quantized_mesh_tile/utils.py#L90-L108
+
+    This assumes input vectors are normalized
+    """
+
+    l1_norm = np.linalg.norm(vec, ord=1, axis=1)
+    result = vec[:, 0:2] / l1_norm[:, np.newaxis]
+
+    negative = vec[:, 2] < 0.0
+    x = np.copy(result[:, 0])
+    y = np.copy(result[:, 1])
+    result[:, 0] = np.where(negative, (1 - np.abs(y)) * sign_not_zero(x), result[:, 0])
+    result[:, 1] = np.where(negative, (1 - np.abs(x)) * sign_not_zero(y), result[:, 1])
+
+    # Converts a scalar value in the range [-1.0, 1.0] to a 8-bit 2's complement
+    # number.
+    oct_encoded = np.floor((np.clip(result, -1, 1) * 0.5 + 0.5) * 256).astype(np.uint8)
+
+    return oct_encoded
+
+
 ENCODE_INDICES_CASES = [[0, 1, 2, 1, 2, 3, 3, 4, 5, 2, 3, 4]]
 
 
@@ -23,3 +131,147 @@ def test_encode_indices(indices):
     arr = np.array(indices, dtype=np.uint32)
     out = decode_indices(encode_indices(arr))
     assert indices == out, 'Incorrect index encoding'
+
+
+ENCODE_VERTICES_CASES = [
+    # Random positions, with bounds inferred
+    (np.random.default_rng(0).uniform(-5, 5, size=(1000, 3)), None),
+    # Some positions outside of bounds
+    (np.random.default_rng(1).uniform(-5, 5, size=(1000, 3)), (-4, -4.5, 4, 4.2)),
+    # Flat heights
+    (np.array([[0, 0, 7], [1, 0, 7], [0, 1, 7], [1, 1, 7]]), None),
+]
+
+
+@pytest.mark.parametrize("positions,bounds", ENCODE_VERTICES_CASES)
+def test_encode_vertices(positions, bounds):
+    positions = positions.astype(np.float32)
+    quantized = interp_positions(positions, bounds=bounds)
+
+    out = np.empty((3, positions.shape[0]), dtype=np.uint16)
+    edges = encode_vertices(
+        positions, *quantization_range(positions, bounds=bounds), out=out
+    )
+
+    for i in range(3):
+        deltas = np.diff(quantized[:, i], prepend=np.int16(0))
+        assert np.array_equal(out[i], zig_zag_encode(deltas)), 'Incorrect vertices'
+
+    u, v = quantized[:, 0], quantized[:, 1]
+    expected = [u == 0, v == 0, u == 32767, v == 32767]
+    for edge, mask in zip(edges, expected):
+        assert np.array_equal(edge, np.where(mask)[0]), 'Incorrect edge indices'
+
+
+def grid_mesh(n):
+    rng = np.random.default_rng(0)
+    y, x = np.mgrid[0:n, 0:n] / (n - 1)
+    h = rng.uniform(0, 100, size=(n, n))
+    positions = np.column_stack([x.ravel(), y.ravel(), h.ravel()])
+    grid = np.arange(n * n).reshape(n, n)
+    sw, se = grid[:-1, :-1].ravel(), grid[:-1, 1:].ravel()
+    nw, ne = grid[1:, :-1].ravel(), grid[1:, 1:].ravel()
+    triangles = np.concatenate(
+        [np.column_stack([sw, se, ne]), np.column_stack([sw, ne, nw])]
+    )
+    return to_ecef(positions.astype(np.float32)), triangles.astype(np.uint32)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_vertex_normals(dtype):
+    positions, triangles = grid_mesh(300)
+    positions = positions.astype(dtype)
+
+    expected = compute_vertex_normals_numpy(positions, triangles)
+    assert np.array_equal(vertex_normals(positions, triangles), expected)
+
+    # Same result for any number of threads
+    assert np.array_equal(vertex_normals(positions, triangles, 4), expected)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_vertex_normals_float32(dtype):
+    positions, triangles = grid_mesh(300)
+    positions = positions.astype(dtype)
+
+    expected = compute_vertex_normals_numpy(positions, triangles)
+    normals = vertex_normals(positions, triangles, dtype=np.float32)
+    assert normals.dtype == np.float32
+    assert np.allclose(normals, expected, atol=1e-6, rtol=0)
+
+    # Same result for any number of threads
+    assert np.array_equal(vertex_normals(positions, triangles, 4, np.float32), normals)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_oct_encode(dtype):
+    rng = np.random.default_rng(0)
+    normals = rng.normal(size=(10000, 3))
+    normals /= np.linalg.norm(normals, axis=1)[:, np.newaxis]
+
+    # Axes, components of exactly 1 which wrap to 0, and negative zeros
+    axes = np.vstack([np.eye(3), -np.eye(3), [[-0.0, -0.0, -1], [0.6, 0.8, 0]]])
+    normals = np.vstack([normals, axes]).astype(dtype)
+
+    assert np.array_equal(oct_encode(normals), oct_encode_numpy(normals))
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_oct_vertex_normals(dtype):
+    positions, triangles = grid_mesh(300)
+
+    expected = oct_encode(vertex_normals(positions, triangles, dtype=dtype))
+    assert np.array_equal(oct_vertex_normals(positions, triangles, 1, dtype), expected)
+    assert np.array_equal(oct_vertex_normals(positions, triangles, 4, dtype), expected)
+
+
+def test_ritter_second_pass_threads():
+    positions, _ = grid_mesh(300)
+    center = positions[0].copy()
+
+    expected = ritter_second_pass(positions, center, 1.0)
+    for num_threads in (2, 4):
+        center_t, radius_t = ritter_second_pass(positions, center, 1.0, num_threads)
+        assert np.array_equal(center_t, expected[0])
+        assert radius_t == expected[1]
+
+    distances = np.linalg.norm(positions - expected[0], axis=1)
+    assert np.all(distances <= expected[1] * (1 + 1e-6))
+
+
+def test_occlusion_magnitudes():
+    positions, _ = grid_mesh(300)
+    ellipsoid = np.array([WGS84.a, WGS84.a, WGS84.b])
+    scaled = positions.astype(np.float64) / ellipsoid
+    center = scaled.mean(axis=0)
+
+    expected = compute_magnitude_numpy(scaled, center)
+    out = occlusion_magnitudes(scaled, *center)
+    assert np.allclose(out, expected, rtol=1e-12, atol=0)
+    assert np.array_equal(occlusion_magnitudes(scaled, *center, 4), out)
+
+
+@pytest.mark.parametrize('dtype', [np.float32, np.float64])
+def test_occlusion_max_magnitude(dtype):
+    positions, _ = grid_mesh(300)
+    positions = positions.astype(dtype)
+    ellipsoid = np.array([WGS84.a, WGS84.a, WGS84.b])
+    # Scaled into an array of the input dtype, as before the fused kernel
+    scaled = np.divide(positions, ellipsoid, out=np.empty_like(positions))
+    center = scaled.astype(np.float64).mean(axis=0)
+
+    expected = occlusion_magnitudes(scaled, *center).max()
+    out = occlusion_max_magnitude(positions, *ellipsoid, *center)
+    assert out == expected
+    assert occlusion_max_magnitude(positions, *ellipsoid, *center, 4) == out
+
+
+def test_kernels_accept_read_only_arrays():
+    positions, triangles = grid_mesh(10)
+    positions.flags.writeable = False
+    triangles.flags.writeable = False
+
+    indices = np.array(ENCODE_INDICES_CASES[0], dtype=np.uint32)
+    indices.flags.writeable = False
+    assert decode_indices(encode_indices(indices)) == ENCODE_INDICES_CASES[0]
+    assert vertex_normals(positions, triangles).shape == positions.shape
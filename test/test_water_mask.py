@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+
+from quantized_mesh_encoder import extensions
+from quantized_mesh_encoder.water_mask import (
+    water_mask_from_mesh,
+    water_mask_from_raster,
+)
+
+BOUNDS = (10.0, 45.0, 10.5, 45.25)
+
+
+@pytest.mark.parametrize('value', [0, 255])
+def test_water_mask_uniform(value):
+    ext = extensions.WaterMaskExtension(data=np.full((256, 256), value, np.uint8))
+    encoded = ext.encode()
+    assert encoded == extensions.WaterMaskExtension(data=value).encode()
+    assert len(encoded) == ext.encoded_size() == 5 + 1
+
+
+@pytest.mark.parametrize('value', [0, 255])
+def test_water_mask_mixed(value):
+    mask = np.full((256, 256), value, np.uint8)
+    mask[128, 3] = 255 - value
+    ext = extensions.WaterMaskExtension(data=mask)
+    encoded = ext.encode()
+    assert encoded[5:] == mask.tobytes()
+    assert len(encoded) == ext.encoded_size() == 5 + 256 * 256
+
+    # Uniform masks of partial water are not land or water
+    mask = np.full((256, 256), 128, np.uint8)
+    assert len(extensions.WaterMaskExtension(data=mask).encode()) == 5 + 256 * 256
+
+
+def test_water_mask_from_raster():
+    # Western half of the raster is water
+    water = np.zeros((10, 20), dtype=bool)
+    water[:, :10] = True
+
+    mask = water_mask_from_raster(water, BOUNDS)
+    assert mask.shape == (256, 256) and mask.dtype == np.uint8
+    assert (mask[:, :128] == 255).all()
+    assert (mask[:, 128:] == 0).all()
+
+    # Raster covering the northern half of the tile
+    minx, miny, maxx, maxy = BOUNDS
+    raster_bounds = (minx, (miny + maxy) / 2, maxx, maxy)
+    mask = water_mask_from_raster(
+        np.ones((4, 4), np.uint8), BOUNDS, raster_bounds=raster_bounds
+    )
+    assert (mask[:128] == 255).all()
+    assert (mask[128:] == 0).all()
+
+
+def grid_mesh(heights, bounds):
+    rows, cols = heights.shape
+    minx, miny, maxx, maxy = bounds
+    lat, lon = np.meshgrid(
+        np.linspace(maxy, miny, rows), np.linspace(minx, maxx, cols), indexing='ij'
+    )
+    positions = np.column_stack([lon.ravel(), lat.ravel(), heights.ravel()])
+
+    grid = np.arange(rows * cols, dtype=np.uint32).reshape(rows, cols)
+    nw, ne = grid[:-1, :-1].ravel(), grid[:-1, 1:].ravel()
+    sw, se = grid[1:, :-1].ravel(), grid[1:, 1:].ravel()
+    indices = np.concatenate(
+        [np.column_stack([sw, se, ne]), np.column_stack([sw, ne, nw])]
+    )
+    return positions.astype(np.float32), indices
+
+
+def test_water_mask_from_mesh():
+    # Southern half of the grid is at sea level
+    heights = np.full((9, 9), 100.0)
+    heights[4:] = 0
+    positions, indices = grid_mesh(heights, BOUNDS)
+
+    mask = water_mask_from_mesh(positions, indices, bounds=BOUNDS)
+    assert mask.shape == (256, 256) and mask.dtype == np.uint8
+    assert (mask[:128] == 0).all()
+    assert (mask[128:] == 255).all()
+
+    # Same result with reversed triangles and inferred bounds
+    mask_reversed = water_mask_from_mesh(positions, indices[:, ::-1])
+    assert np.array_equal(mask, mask_reversed)
+
+    # Higher sea level
+    mask = water_mask_from_mesh(positions, indices, bounds=BOUNDS, sea_level=100)
+    assert (mask == 255).all()
+    ext = extensions.WaterMaskExtension(data=mask)
+    assert ext.encode() == extensions.WaterMaskExtension(data=255).encode()
+
+
+def test_water_mask_from_mesh_outside_bounds():
+    heights = np.zeros((3, 3))
+    positions, indices = grid_mesh(heights, (0.0, 0.0, 1.0, 1.0))
+
+    # Mesh covering the north-western quarter of the tile, and beyond
+    mask = water_mask_from_mesh(positions, indices, bounds=(0.5, -0.5, 1.5, 0.5))
+    expected = np.zeros((256, 256), np.uint8)
+    expected[:128, :128] = 255
+    assert np.array_equal(mask, expected)
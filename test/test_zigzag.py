@@ -1,7 +1,7 @@
 import numpy as np
 import pytest
 
-from quantized_mesh_encoder.util import zig_zag_encode
+from quantized_mesh_encoder.util import zig_zag_decode, zig_zag_encode
 
 ZIG_ZAG_ENCODE_TEST_CASES = [
     (-1, 1),
@@ -19,3 +19,9 @@ def test_zig_zag_encode(value, expected):
         assert np.array_equal(zig_zag_encode(value), expected)
     else:
         assert zig_zag_encode(value) == expected
+
+
+def test_zig_zag_decode():
+    values = np.array([0, 5, 32767, 1, 1, 0, 300], dtype=np.int16)
+    deltas = np.diff(values, prepend=np.int16(0))
+    assert np.array_equal(zig_zag_decode(zig_zag_encode(deltas)), values)